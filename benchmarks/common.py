@@ -0,0 +1,74 @@
+"""
+Shared helpers for the benchmarks
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Any, Dict, List, Optional
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_fixture_collections() -> List[Dict[str, Any]]:
+    """The fixture catalog, as a list of STAC collection dicts"""
+    with open(os.path.join(FIXTURES_PATH, "collections.json")) as f:
+        return json.load(f)
+
+
+def collection_texts() -> List[str]:
+    """The texts that get embedded for the fixture collections"""
+    return [f"{c['title']} {c['description']}" for c in load_fixture_collections()]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds for samples in seconds"""
+    samples = sorted(samples)
+    quantiles = (
+        statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+    )
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": round(quantiles[49] * 1000, 3),
+        "p90_ms": round(quantiles[89] * 1000, 3),
+        "p99_ms": round(quantiles[98] * 1000, 3),
+    }
+
+
+def timed(fn, *args, **kwargs) -> float:
+    """Wall-clock seconds for a single call"""
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run_metadata() -> Dict[str, Any]:
+    """The commit and interpreter a run was made with, to compare runs"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_results(results: Dict[str, Any], output: Optional[str]) -> None:
+    """Print the results as JSON, and also write them to `output` if given"""
+    text = json.dumps(results, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,225 @@
+"""
+Offline benchmarks of the search components
+
+Usage:
+    python -m benchmarks.components [--repeats 50] [--output results.json]
+
+The fixture catalog is served by a local mock STAC API and indexed into a
+temporary directory, locations are resolved by a local mock Geodini and
+every agent is replaced by the fake models of benchmarks.fake_llm, so only
+the embedding model has to be available locally. Reports, as JSON with the
+commit it ran on:
+
+- generate_embeddings throughput on texts that are not in the embedding store
+- query embedding latency, from the model and from the embedding store
+- Chroma query latency
+- async_cached overhead for hits and misses, against calling the function
+- item_search latency with cold and warm caches, with the mean of each stage
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+import pystac
+
+# sets up the environment, so it comes before the stac_search imports
+from benchmarks.offline import (
+    add_service_arguments,
+    offline_services,
+    remove_data_path,
+    service_settings,
+)
+from benchmarks.common import (
+    load_fixture_collections,
+    run_metadata,
+    summarize,
+    write_results,
+)
+from stac_search import geocoding
+from stac_search.agents.collections_search import _vector_search
+from stac_search.agents.items_search import Context, item_search
+from stac_search.async_stac import ITEM_SEARCH_ENGINE, close_async_search
+from stac_search.cache import MemoryBackend, async_cached, aclear_all_caches
+from stac_search.catalog_manager import close_catalog_managers, get_catalog_manager
+from stac_search.stac_client import close_stac_clients
+from stac_search.timing import start_request_timings
+
+QUERIES = [
+    "sentinel-2 imagery over France",
+    "land cover maps of Africa",
+    "wildfire burn scars in California",
+    "elevation data for the Alps",
+    "NAIP aerial imagery of Washington",
+    "flooding radar imagery",
+    "snow cover in the Rockies",
+    "methane concentrations",
+]
+
+ITEM_QUERIES = [
+    "cloudless imagery over Paris from 2023",
+    "sentinel-2 imagery of Kenya with less than 20% cloud cover",
+    "landsat images of Colorado between 2019 and 2021",
+    "burn scar imagery in California in 2020",
+    "radar imagery over the Netherlands last 3 months",
+    "imagery of Lake Tahoe in summer 2022",
+    "land cover data for Brazil",
+    "show me relatively cloudless images",
+]
+
+
+async def bench_generate_embeddings(catalog_manager, repeats: int) -> dict:
+    # generate_embeddings reads the fields of pystac collections, and descriptions
+    # suffixed with the run and repeat miss the embedding store, so the model runs
+    run = time.time_ns()
+    collections = [
+        pystac.Collection.from_dict(
+            {**collection, "description": f"{collection['description']} ({run} {i})"}
+        )
+        for i in range(repeats)
+        for collection in load_fixture_collections()
+    ]
+    texts = {catalog_manager._collection_text(c) for c in collections}
+    assert len(texts) == len(collections), "benchmark texts must be distinct"
+    start = time.perf_counter()
+    await catalog_manager.generate_embeddings(collections)
+    seconds = time.perf_counter() - start
+    return {
+        "texts": len(collections),
+        "seconds": round(seconds, 3),
+        "texts_per_second": round(len(collections) / seconds, 1),
+    }
+
+
+async def bench_query_embedding(catalog_manager, repeats: int) -> dict:
+    async def sample(query: str) -> float:
+        start = time.perf_counter()
+        await catalog_manager.encode([query])
+        return time.perf_counter() - start
+
+    model = [await sample(f"{QUERIES[i % len(QUERIES)]} {i}") for i in range(repeats)]
+    store = [await sample(QUERIES[i % len(QUERIES)]) for i in range(repeats)]
+    return {"model": summarize(model), "embedding_store": summarize(store)}
+
+
+async def bench_chroma_query(catalog_manager, catalog_url: str, repeats: int) -> dict:
+    collection = catalog_manager.get_catalog_collection(catalog_url)
+    embeddings = [await catalog_manager.encode([query]) for query in QUERIES]
+    samples = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        await _vector_search(collection, embeddings[i % len(embeddings)], 10)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def bench_async_cached(calls: int) -> dict:
+    async def compute(value: int) -> int:
+        return value
+
+    def per_call_us(seconds: float) -> float:
+        return round(seconds / calls * 1e6, 3)
+
+    async def run(fn, keys) -> float:
+        start = time.perf_counter()
+        for key in keys:
+            await fn(key)
+        return time.perf_counter() - start
+
+    results = {"calls": calls, "bare_us": per_call_us(await run(compute, range(calls)))}
+    for name, serialize in (("memory", False), ("serialized", True)):
+        cache = MemoryBackend(f"benchmark_{name}", calls * 2, 3600, serialize)
+        cached = async_cached(cache)(compute)
+        results[f"{name}_miss_us"] = per_call_us(await run(cached, range(calls)))
+        results[f"{name}_hit_us"] = per_call_us(await run(cached, range(calls)))
+    return results
+
+
+async def bench_item_search(catalog_url: str, repeats: int) -> dict:
+    async def sample(query: str, stages: dict) -> float:
+        timings = start_request_timings()
+        start = time.perf_counter()
+        await item_search(Context(query=query, catalog_url=catalog_url))
+        seconds = time.perf_counter() - start
+        for stage, duration in timings:
+            stages[stage].append(duration)
+        return seconds
+
+    results = {"engine": ITEM_SEARCH_ENGINE}
+    for name in ("cold", "warm"):
+        if name == "warm":
+            for query in ITEM_QUERIES:
+                await sample(query, defaultdict(list))
+        samples, stages = [], defaultdict(list)
+        for i in range(repeats):
+            if name == "cold":
+                await aclear_all_caches()
+            samples.append(await sample(ITEM_QUERIES[i % len(ITEM_QUERIES)], stages))
+        results[name] = {
+            **summarize(samples),
+            "stage_mean_ms": {
+                stage: round(sum(durations) / len(durations) * 1000, 3)
+                for stage, durations in sorted(stages.items())
+            },
+        }
+    return results
+
+
+async def main_async(args) -> dict:
+    results = {
+        **run_metadata(),
+        "settings": {
+            "repeats": args.repeats,
+            "index_repeats": args.index_repeats,
+            **service_settings(args),
+        },
+    }
+    with offline_services(args) as (stac, _):
+        catalog_manager = get_catalog_manager()
+
+        start = time.perf_counter()
+        load_result = await catalog_manager.load_catalog(stac.url)
+        if not load_result["success"]:
+            raise RuntimeError(load_result["error"])
+        results["index_catalog_s"] = round(time.perf_counter() - start, 3)
+
+        results["generate_embeddings"] = await bench_generate_embeddings(
+            catalog_manager, args.index_repeats
+        )
+        results["query_embedding"] = await bench_query_embedding(
+            catalog_manager, args.repeats
+        )
+        results["chroma_query"] = await bench_chroma_query(
+            catalog_manager, stac.url, args.repeats
+        )
+        results["async_cached"] = await bench_async_cached(args.cached_calls)
+        results["item_search"] = await bench_item_search(stac.url, args.repeats)
+
+        await geocoding.close_geocoding_client()
+        await close_async_search()
+    close_stac_clients()
+    close_catalog_managers()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--index-repeats", type=int, default=10)
+    parser.add_argument("--cached-calls", type=int, default=10000)
+    add_service_arguments(parser)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    # the per-request logs would drown the results
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        results = asyncio.run(main_async(args))
+    finally:
+        remove_data_path()
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare embedding backends on indexing throughput and single-query latency
+
+Usage:
+    python -m benchmarks.embedding_backends [--backends torch onnx onnx-int8]
+
+For every backend this reports collections encoded per second when indexing
+the fixture catalog, the latency distribution of single-query encodes and,
+for non-torch backends, the cosine parity of its vectors with torch.
+"""
+
+import argparse
+import json
+
+from benchmarks.common import collection_texts, summarize, timed
+from stac_search.embeddings import (
+    EMBEDDING_BACKENDS,
+    MODEL_NAME,
+    check_parity,
+    get_model,
+    warmup_model,
+)
+
+QUERIES = [
+    "sentinel-2 imagery over France",
+    "land cover maps of Africa",
+    "wildfire burn scars in California",
+    "elevation data for the Alps",
+    "NAIP aerial imagery of Washington",
+    "flooding radar imagery",
+    "snow cover in the Rockies",
+    "methane concentrations",
+]
+
+
+def run(backend: str, repeats: int, queries: int) -> dict:
+    texts = collection_texts() * repeats
+    warmup_model(MODEL_NAME, backend)
+    model = get_model(MODEL_NAME, backend)
+
+    index_seconds = timed(model.encode, texts)
+    query_samples = [
+        timed(model.encode, [QUERIES[i % len(QUERIES)]]) for i in range(queries)
+    ]
+    result = {
+        "backend": backend,
+        "indexing": {
+            "texts": len(texts),
+            "seconds": round(index_seconds, 3),
+            "texts_per_second": round(len(texts) / index_seconds, 1),
+        },
+        "query_encode": summarize(query_samples),
+    }
+    if backend != "torch":
+        result["parity"] = check_parity(collection_texts() + QUERIES, backend=backend)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    results = [run(backend, args.repeats, args.queries) for backend in args.backends]
+    baseline = next((r for r in results if r["backend"] == "torch"), None)
+    if baseline:
+        for result in results:
+            result["indexing_speedup"] = round(
+                result["indexing"]["texts_per_second"]
+                / baseline["indexing"]["texts_per_second"],
+                2,
+            )
+            result["query_p50_speedup"] = round(
+                baseline["query_encode"]["p50_ms"] / result["query_encode"]["p50_ms"],
+                2,
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
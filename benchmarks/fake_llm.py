@@ -0,0 +1,153 @@
+"""
+Deterministic stand-ins for the LLM agents of the benchmarks
+
+Every agent is overridden with a pydantic-ai FunctionModel that answers from
+the prompt after a fixed latency, without any network call. The item search
+agent calls its tools like the real model does, so the fast path, geocoding
+and filter code still runs.
+"""
+
+import asyncio
+import re
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, List
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from stac_search.agents import collections_search, items_search
+
+LOCATION = re.compile(
+    r"\b(?:over|of|in|around|near|for)\s+((?:the\s+)?[A-Z][\w.'-]*(?:[ ,]+[A-Z][\w.'-]*)*)"
+)
+SPECIFIC_TERMS = (
+    "sentinel",
+    "landsat",
+    "naip",
+    "modis",
+    "land cover",
+    "burn",
+    "wildfire",
+    "elevation",
+    "dem",
+    "radar",
+    "sar",
+    "biomass",
+    "snow",
+    "water",
+)
+
+
+def _prompt(messages: List[ModelMessage]) -> str:
+    for part in messages[0].parts:
+        if isinstance(part, UserPromptPart):
+            return part.content
+    return ""
+
+
+def _tool_returns(messages: List[ModelMessage]) -> Dict[str, Any]:
+    return {
+        part.tool_name: part.content
+        for message in messages
+        if isinstance(message, ModelRequest)
+        for part in message.parts
+        if isinstance(part, ToolReturnPart)
+    }
+
+
+def _result(info: AgentInfo, args: Dict[str, Any]) -> ModelResponse:
+    return ModelResponse(parts=[ToolCallPart(info.result_tools[0].name, args)])
+
+
+def _get(value: Any, name: str) -> Any:
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+
+def location_of(query: str) -> str:
+    match = LOCATION.search(query)
+    return match.group(1).strip(" ,") if match else ""
+
+
+def search_items(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+    returns = _tool_returns(messages)
+    if not returns:
+        return ModelResponse(
+            parts=[ToolCallPart(tool.name, {}) for tool in info.function_tools]
+        )
+    cql2_filter = returns.get("construct_cql2_filter")
+    if cql2_filter is not None and hasattr(cql2_filter, "model_dump"):
+        cql2_filter = cql2_filter.model_dump()
+    return _result(
+        info,
+        {
+            "location": _get(returns.get("set_spatial_extent"), "location") or None,
+            "datetime": _get(returns.get("set_temporal_range"), "datetime"),
+            "filter": cql2_filter,
+        },
+    )
+
+
+def collection_query_framing(
+    messages: List[ModelMessage], info: AgentInfo
+) -> ModelResponse:
+    query = _prompt(messages)
+    is_specific = any(term in query.lower() for term in SPECIFIC_TERMS)
+    return _result(info, {"query": query, "is_specific": is_specific})
+
+
+def geocoding(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+    return _result(info, {"location": location_of(_prompt(messages))})
+
+
+def temporal_range(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+    return _result(info, {"datetime": None})
+
+
+def cql2_filter(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+    return _result(info, {"op": "lte", "args": [{"property": "eo:cloud_cover"}, 20]})
+
+
+def rerank(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+    collection_ids = re.findall(r"^Collection ID: (\S+)", _prompt(messages), re.M)
+    results = [
+        {"collection_id": collection_id, "explanation": "Relevant to the query."}
+        for collection_id in collection_ids[:5]
+    ]
+    return _result(info, {"results": results})
+
+
+AGENTS = [
+    (items_search.search_items_agent, search_items),
+    (items_search.collection_query_framing_agent, collection_query_framing),
+    (items_search.geocoding_agent, geocoding),
+    (items_search.temporal_range_agent, temporal_range),
+    (items_search.cql2_filter_agent, cql2_filter),
+    (collections_search.rerank_agent, rerank),
+]
+
+
+def _with_latency(function, latency: float):
+    async def respond(messages: List[ModelMessage], info: AgentInfo):
+        await asyncio.sleep(latency)
+        return function(messages, info)
+
+    return respond
+
+
+@contextmanager
+def fake_agents(latency: float = 0.0):
+    """Override every agent with a FunctionModel taking `latency` per request"""
+    with ExitStack() as stack:
+        for agent, function in AGENTS:
+            model = FunctionModel(_with_latency(function, latency))
+            stack.enter_context(agent.override(model=model))
+        yield
@@ -0,0 +1,72 @@
+"""
+Measure the import-time cost of the stac_search entry points
+
+Usage:
+    python -m benchmarks.import_time [--top 10]
+
+Each module is imported in a fresh interpreter with `-X importtime`. The
+report lists the total import time, the slowest top-level imports, and
+whether any of the heavy optional modules (torch, sentence_transformers,
+chromadb) were pulled in, which should never happen at import.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = [
+    "stac_search",
+    "stac_search.catalog_manager",
+    "stac_search.load",
+    "stac_search.agents.items_search",
+    "stac_search.api",
+]
+HEAVY_MODULES = ["torch", "sentence_transformers", "chromadb"]
+
+
+def measure(module: str, top: int) -> dict:
+    """Import `module` in a fresh interpreter and summarize -X importtime"""
+    code = (
+        f"import sys, json, {module}; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        return {"module": module, "error": proc.stderr.strip().splitlines()[-1]}
+
+    # lines look like "import time:   self [us] | cumulative | imported package"
+    cumulative = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:") :].split("|")
+        # nested imports are indented below their parent
+        name = name[1:]
+        if not name.startswith(" "):
+            cumulative.append((int(cumulative_us), name))
+    total_us = sum(us for us, _ in cumulative)
+    cumulative.sort(reverse=True)
+    return {
+        "module": module,
+        "total_ms": round(total_us / 1000, 1),
+        "slowest": [
+            {"module": name, "ms": round(us / 1000, 1)} for us, name in cumulative[:top]
+        ],
+        "heavy_modules_imported": json.loads(proc.stdout.strip().splitlines()[-1]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps([measure(module, args.top) for module in MODULES], indent=2))
+
+
+if __name__ == "__main__":
+    main()
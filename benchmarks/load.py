@@ -0,0 +1,261 @@
+"""
+Load test the API in-process, sweeping the number of concurrent clients
+
+Usage:
+    python -m benchmarks.load [--concurrency 1 2 4 8 16 32] [--requests 200]
+
+Serves the FastAPI app with uvicorn from a background thread, against the
+offline services of benchmarks.offline (mock STAC API and Geodini, fake
+agents). For each concurrency level, that many clients send `--requests`
+requests in total to /search and /items/search. Queries come from
+fixtures/load_queries.json with Zipf-distributed popularity, so popular
+queries repeat like real traffic does, and a `--unique` share of them are
+never-seen variants that miss every cache. Caches are cleared before each
+level. For every level this reports the throughput, latency percentiles,
+error rate and mean Server-Timing of each stage, overall and per endpoint,
+and the first level where adding clients stopped adding throughput.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import aiohttp
+import uvicorn
+
+# sets up the environment, so it comes before the stac_search imports
+from benchmarks.offline import (
+    add_service_arguments,
+    offline_services,
+    remove_data_path,
+    service_settings,
+)
+from benchmarks.common import FIXTURES_PATH, run_metadata, summarize, write_results
+from stac_search.api import app
+from stac_search.cache import aclear_all_caches
+
+# adding clients must add at least this much throughput to not be saturated
+SATURATION_GAIN = 1.1
+
+
+def load_queries() -> Dict[str, List[str]]:
+    with open(os.path.join(FIXTURES_PATH, "load_queries.json")) as f:
+        return json.load(f)
+
+
+def query_mix(
+    requests: int, items_share: float, unique: float, seed: int
+) -> List[Tuple[str, str]]:
+    """(endpoint, query) pairs, with Zipf popularity within each endpoint"""
+    queries = load_queries()
+    rng = random.Random(seed)
+    mix = []
+    for i in range(requests):
+        endpoint = "/items/search" if rng.random() < items_share else "/search"
+        pool = queries["items" if endpoint == "/items/search" else "collections"]
+        query = rng.choices(
+            pool, weights=[1 / rank for rank in range(1, len(pool) + 1)]
+        )[0]
+        if rng.random() < unique:
+            query = f"{query} (request {i})"
+        mix.append((endpoint, query))
+    return mix
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """Milliseconds per stage from a Server-Timing header"""
+    stages = {}
+    for entry in filter(None, (e.strip() for e in header.split(","))):
+        name, *params = entry.split(";")
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "dur":
+                stages[name.strip()] = float(value)
+    return stages
+
+
+class ApiServer:
+    """The API served by uvicorn from a background thread"""
+
+    def __init__(self):
+        config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.server.serve())
+
+    @property
+    def url(self) -> str:
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def call(self, coroutine):
+        """Run a coroutine on the server's event loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def __enter__(self) -> "ApiServer":
+        self._thread.start()
+        while not self.server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("The API server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self._thread.join()
+
+
+def summarize_samples(samples: List[dict], seconds: float) -> dict:
+    latencies = [sample["seconds"] for sample in samples if sample["ok"]]
+    errors = sum(not sample["ok"] for sample in samples)
+    stages = defaultdict(float)
+    for sample in samples:
+        for stage, ms in sample["stages"].items():
+            stages[stage] += ms
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / seconds, 2),
+        "error_rate": round(errors / len(samples), 4),
+        **(summarize(latencies) if latencies else {}),
+        "stage_mean_ms": {
+            stage: round(total / len(samples), 3)
+            for stage, total in sorted(stages.items())
+        },
+    }
+
+
+async def run_level(
+    session: aiohttp.ClientSession,
+    url: str,
+    catalog_url: str,
+    mix: List[Tuple[str, str]],
+    concurrency: int,
+) -> dict:
+    queue = iter(mix)
+    samples = []
+
+    async def client():
+        for endpoint, query in queue:
+            start = time.perf_counter()
+            sample = {"endpoint": endpoint, "ok": False, "stages": {}}
+            try:
+                async with session.post(
+                    f"{url}{endpoint}",
+                    json={"query": query, "catalog_url": catalog_url},
+                ) as response:
+                    await response.read()
+                    sample["ok"] = response.status == 200
+                    sample["stages"] = parse_server_timing(
+                        response.headers.get("Server-Timing", "")
+                    )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"{endpoint} failed for {query!r}: {e!r}")
+            sample["seconds"] = time.perf_counter() - start
+            samples.append(sample)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample["endpoint"]].append(sample)
+    return {
+        "concurrency": concurrency,
+        **summarize_samples(samples, seconds),
+        "endpoints": {
+            endpoint: summarize_samples(endpoint_samples, seconds)
+            for endpoint, endpoint_samples in sorted(by_endpoint.items())
+        },
+    }
+
+
+def saturation_level(levels: List[dict]) -> int | None:
+    """The first concurrency level that didn't add enough throughput"""
+    for previous, level in zip(levels, levels[1:]):
+        if level["throughput_rps"] < previous["throughput_rps"] * SATURATION_GAIN:
+            return level["concurrency"]
+    return None
+
+
+async def main_async(args, api: ApiServer, catalog_url: str) -> dict:
+    mix = query_mix(args.requests, args.items_share, args.unique, args.seed)
+    levels = []
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        # load the model and index the catalog before measuring
+        while True:
+            async with session.get(f"{api.url}/ready") as response:
+                if response.status == 200:
+                    break
+            await asyncio.sleep(0.1)
+        for endpoint in ("/search", "/items/search"):
+            async with session.post(
+                f"{api.url}{endpoint}",
+                json={"query": "warmup imagery", "catalog_url": catalog_url},
+            ) as response:
+                await response.read()
+                response.raise_for_status()
+
+        for concurrency in args.concurrency:
+            # the caches belong to the server's event loop
+            await asyncio.to_thread(api.call, aclear_all_caches())
+            level = await run_level(session, api.url, catalog_url, mix, concurrency)
+            logging.warning(
+                f"concurrency {concurrency}: {level['throughput_rps']} req/s, "
+                f"p50 {level.get('p50_ms')} ms, errors {level['error_rate']:.1%}"
+            )
+            levels.append(level)
+    return {
+        **run_metadata(),
+        "settings": {
+            "requests": args.requests,
+            "items_share": args.items_share,
+            "unique": args.unique,
+            "seed": args.seed,
+            "cpu_count": os.cpu_count(),
+            **service_settings(args),
+        },
+        "saturation_concurrency": saturation_level(levels),
+        "levels": levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32]
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--items-share", type=float, default=0.5)
+    parser.add_argument("--unique", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60)
+    add_service_arguments(parser)
+    parser.set_defaults(llm_latency=0.05, stac_latency=0.05, geodini_latency=0.05)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    # the per-request logs would drown the results
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        with offline_services(args) as (stac, _), ApiServer() as api:
+            results = asyncio.run(main_async(args, api, stac.url))
+    finally:
+        remove_data_path()
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
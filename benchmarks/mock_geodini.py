@@ -0,0 +1,81 @@
+"""
+Local mock Geodini geocoder for the benchmarks
+
+GET /search?query=... answers with a square polygon derived from the query,
+after a fixed latency, so the same location always gets the same geometry.
+Locations in `unknown` have no results, and `fail` makes the server
+misbehave, to test the client's retries and circuit breaker.
+"""
+
+import asyncio
+import hashlib
+from typing import Iterable, Optional
+
+from aiohttp import web
+
+from benchmarks.mock_server import BackgroundServer
+
+
+class MockGeodiniServer(BackgroundServer):
+    def __init__(
+        self, latency: float = 0.05, unknown: Iterable[str] = (), port: int = 0
+    ):
+        super().__init__(latency, port)
+        self.unknown = {location.lower() for location in unknown}
+        self.failure: Optional[str] = None
+        self.failures_left: Optional[int] = None
+
+    def fail(self, failure: Optional[str], times: Optional[int] = None) -> None:
+        """
+        Answer the next `times` requests, or all of them, with a failure:
+        "error" (503), "bad-request" (400), "malformed" (a body that isn't
+        JSON) or "slow" (ten times the latency). None stops failing.
+        """
+        self.failure = failure
+        self.failures_left = times
+
+    def _next_failure(self) -> Optional[str]:
+        failure = self.failure
+        if failure and self.failures_left is not None:
+            self.failures_left -= 1
+            if self.failures_left <= 0:
+                self.failure = None
+        return failure
+
+    @staticmethod
+    def polygon(location: str) -> dict:
+        digest = hashlib.sha256(location.lower().encode()).digest()
+        lon = digest[0] / 255 * 300 - 150
+        lat = digest[1] / 255 * 120 - 60
+        return {
+            "type": "Polygon",
+            "coordinates": [
+                [
+                    [lon, lat],
+                    [lon + 2, lat],
+                    [lon + 2, lat + 2],
+                    [lon, lat + 2],
+                    [lon, lat],
+                ]
+            ],
+        }
+
+    async def _search(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        failure = self._next_failure()
+        await asyncio.sleep(self.latency * (10 if failure == "slow" else 1))
+        if failure == "error":
+            return web.json_response({"detail": "unavailable"}, status=503)
+        if failure == "bad-request":
+            return web.json_response({"detail": "bad query"}, status=400)
+        if failure == "malformed":
+            return web.Response(text="{not json", content_type="application/json")
+        location = request.query.get("query", "")
+        if not location or location.lower() in self.unknown:
+            return web.json_response({"results": []})
+        return web.json_response(
+            {"results": [{"name": location, "geometry": self.polygon(location)}]}
+        )
+
+    def add_routes(self, app: web.Application) -> None:
+        app.router.add_get("/search", self._search)
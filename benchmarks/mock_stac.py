@@ -0,0 +1,140 @@
+"""
+Local mock STAC API for the benchmarks
+
+Serves a landing page, the fixture collections and a paginated POST /search
+with a fixed per-request latency, from a background thread so both
+pystac-client and aiohttp clients can use it. Every collection has
+`items_per_collection` items with descending datetimes.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from benchmarks.common import load_fixture_collections
+from benchmarks.mock_server import BackgroundServer
+
+CONFORMANCE = [
+    "https://api.stacspec.org/v1.0.0/core",
+    "https://api.stacspec.org/v1.0.0/collections",
+    "https://api.stacspec.org/v1.0.0/item-search",
+    "https://api.stacspec.org/v1.0.0/item-search#filter",
+    "http://www.opengis.net/spec/cql2/1.0/conf/cql2-json",
+]
+
+
+class MockStacServer(BackgroundServer):
+    def __init__(
+        self,
+        latency: float = 0.05,
+        items_per_collection: int = 100,
+        collections: Optional[List[Dict[str, Any]]] = None,
+        port: int = 0,
+    ):
+        super().__init__(latency, port)
+        self.items_per_collection = items_per_collection
+        self.collections = collections or load_fixture_collections()
+        # search requests being served, and the most at any one time
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _item(self, collection_id: str, index: int) -> Dict[str, Any]:
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        return {
+            "type": "Feature",
+            "stac_version": "1.0.0",
+            "id": f"{collection_id}-{index:05d}",
+            "collection": collection_id,
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]],
+            },
+            "bbox": [0, 0, 1, 1],
+            "properties": {
+                "datetime": (start - timedelta(days=index)).isoformat(),
+                "eo:cloud_cover": index % 100,
+            },
+            "links": [],
+            "assets": {},
+        }
+
+    async def _landing_page(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "type": "Catalog",
+                "id": "mock",
+                "description": "Mock STAC API",
+                "stac_version": "1.0.0",
+                "conformsTo": CONFORMANCE,
+                "links": [
+                    {"rel": "self", "href": f"{self.url}/"},
+                    {"rel": "root", "href": f"{self.url}/"},
+                    {"rel": "data", "href": f"{self.url}/collections"},
+                    {
+                        "rel": "search",
+                        "type": "application/geo+json",
+                        "href": f"{self.url}/search",
+                        "method": "POST",
+                    },
+                ],
+            }
+        )
+
+    async def _collections(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        collections = [
+            {
+                "type": "Collection",
+                "stac_version": "1.0.0",
+                "license": "proprietary",
+                "links": [],
+                **collection,
+            }
+            for collection in self.collections
+        ]
+        return web.json_response({"collections": collections, "links": []})
+
+    async def _search(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        try:
+            body = await request.json()
+        except ConnectionResetError:
+            # the client cancelled a prefetched page
+            return web.Response(status=499)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        collection_ids = body.get("collections") or [c["id"] for c in self.collections]
+        limit = int(body.get("limit") or 10)
+        offset = int(body.get("token") or 0)
+        # interleave the collections, like a search sorted by datetime
+        items = [
+            self._item(collection_id, index)
+            for index in range(self.items_per_collection)
+            for collection_id in collection_ids
+        ]
+        page = items[offset : offset + limit]
+        links = []
+        if offset + limit < len(items):
+            links.append(
+                {
+                    "rel": "next",
+                    "href": f"{self.url}/search",
+                    "method": "POST",
+                    "body": {"token": offset + limit},
+                    "merge": True,
+                }
+            )
+        return web.json_response(
+            {"type": "FeatureCollection", "features": page, "links": links}
+        )
+
+    def add_routes(self, app: web.Application) -> None:
+        app.router.add_get("/", self._landing_page)
+        app.router.add_get("/collections", self._collections)
+        app.router.add_post("/search", self._search)
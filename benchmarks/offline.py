@@ -0,0 +1,55 @@
+"""
+Offline environment for the benchmarks
+
+Import this module before any stac_search module: stac_search reads its
+settings at import, and the benchmarks index into a scratch directory, keep
+the caches in process and give the agents an OpenAI key they never use.
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+DATA_PATH = tempfile.mkdtemp(prefix="stac-search-benchmark-")
+os.environ["DATA_PATH"] = DATA_PATH
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ.pop("EMBEDDING_CACHE_PATH", None)
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+
+from benchmarks.fake_llm import fake_agents  # noqa: E402
+from benchmarks.mock_geodini import MockGeodiniServer  # noqa: E402
+from benchmarks.mock_stac import MockStacServer  # noqa: E402
+from stac_search import geocoding  # noqa: E402
+
+
+def add_service_arguments(parser) -> None:
+    """Latencies of the mock services and fake agents"""
+    parser.add_argument("--stac-latency", type=float, default=0.02)
+    parser.add_argument("--geodini-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+
+
+def service_settings(args) -> dict:
+    return {
+        "stac_latency_s": args.stac_latency,
+        "geodini_latency_s": args.geodini_latency,
+        "llm_latency_s": args.llm_latency,
+    }
+
+
+@contextmanager
+def offline_services(args):
+    """Run the mock STAC API and Geodini, with the fake agents, in the block"""
+    with (
+        MockStacServer(latency=args.stac_latency) as stac,
+        MockGeodiniServer(latency=args.geodini_latency) as geodini,
+        fake_agents(latency=args.llm_latency),
+    ):
+        # the process-wide client would call the real Geodini
+        geocoding._geocoding_client = geocoding.GeocodingClient(base_url=geodini.url)
+        yield stac, geodini
+
+
+def remove_data_path() -> None:
+    shutil.rmtree(DATA_PATH, ignore_errors=True)
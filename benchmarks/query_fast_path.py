@@ -0,0 +1,76 @@
+"""
+Measure how often the rule-based query parser answers without the LLM agents
+
+Usage:
+    python -m benchmarks.query_fast_path [--show-fallbacks]
+
+Runs the date and cloud cover rules over the labelled query corpus in
+fixtures/query_fast_path.json. For each field this reports the share of
+queries the rules parsed to a value (the LLM skip rate, as the agents still
+run when the rules find nothing), how many of those matched the label, and
+the parse latency. A parsed value that doesn't match its label is
+a wrong answer the agents would not have given, so it should stay at zero.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import date
+
+from benchmarks.common import FIXTURES_PATH, summarize
+from stac_search.query_parser import parse_cloud_filter, parse_temporal_range
+
+
+def load_corpus() -> dict:
+    with open(os.path.join(FIXTURES_PATH, "query_fast_path.json")) as f:
+        return json.load(f)
+
+
+def run(corpus: dict, show_fallbacks: bool) -> dict:
+    today = date.fromisoformat(corpus["today"])
+    parsers = {
+        "datetime": lambda query: parse_temporal_range(query, today),
+        "filter": parse_cloud_filter,
+    }
+    results = {}
+    for name, parse in parsers.items():
+        parsed = correct = 0
+        samples, mismatches, fallbacks = [], [], []
+        for entry in corpus["queries"]:
+            start = time.perf_counter()
+            ok, value = parse(entry["query"])
+            samples.append(time.perf_counter() - start)
+            if not ok or value is None:
+                fallbacks.append(entry["query"])
+                continue
+            parsed += 1
+            if value == entry[name]:
+                correct += 1
+            else:
+                mismatches.append(
+                    {"query": entry["query"], "expected": entry[name], "parsed": value}
+                )
+        total = len(corpus["queries"])
+        results[name] = {
+            "queries": total,
+            "parsed": parsed,
+            "llm_skip_rate": round(parsed / total, 3),
+            "precision": round(correct / parsed, 3) if parsed else None,
+            "mismatches": mismatches,
+            "latency": summarize(samples),
+        }
+        if show_fallbacks:
+            results[name]["fallbacks"] = fallbacks
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--show-fallbacks", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(run(load_corpus(), args.show_fallbacks), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare the item search engines against a local mock STAC API
+
+Usage:
+    python -m benchmarks.stac_search_engines [--latency 0.05] [--collections 4]
+
+Runs the same search with pystac-client (in a thread, as item_search does
+with ITEM_SEARCH_ENGINE=pystac) and with AsyncStacSearch, which fans out
+per collection and prefetches pages, and reports the latency of each.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import load_fixture_collections, summarize
+from benchmarks.mock_stac import MockStacServer
+from stac_search.async_stac import AsyncStacSearch
+from stac_search.stac_client import close_stac_clients, open_client
+
+
+async def run_pystac(url: str, params: dict, repeats: int) -> list:
+    client = open_client(url)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        items = await asyncio.to_thread(
+            lambda: list(client.search(**params).items_as_dicts())
+        )
+        samples.append(time.perf_counter() - start)
+    assert len(items) == params["max_items"], len(items)
+    return samples
+
+
+async def run_async(url: str, params: dict, repeats: int, page_size: int) -> list:
+    search = AsyncStacSearch(page_size=page_size)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        items = await search.search(
+            f"{url}/search", params["collections"], max_items=params["max_items"]
+        )
+        samples.append(time.perf_counter() - start)
+    await search.close()
+    assert len(items) == params["max_items"], len(items)
+    return samples
+
+
+async def main_async(args) -> dict:
+    collection_ids = [c["id"] for c in load_fixture_collections()][: args.collections]
+    params = {
+        "collections": collection_ids,
+        "max_items": args.max_items,
+        "limit": args.page_size,
+    }
+    results = {
+        "latency_s": args.latency,
+        "collections": len(collection_ids),
+        "max_items": args.max_items,
+        "page_size": args.page_size,
+    }
+    with MockStacServer(latency=args.latency) as server:
+        await run_async(server.url, params, 1, args.page_size)
+        results["pystac"] = summarize(
+            await run_pystac(server.url, params, args.repeats)
+        )
+        requests_before = server.requests
+        results["async"] = summarize(
+            await run_async(server.url, params, args.repeats, args.page_size)
+        )
+        results["async"]["requests_per_search"] = (
+            server.requests - requests_before
+        ) / args.repeats
+    close_stac_clients()
+    results["p50_speedup"] = round(
+        results["pystac"]["p50_ms"] / results["async"]["p50_ms"], 2
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--collections", type=int, default=4)
+    parser.add_argument("--max-items", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
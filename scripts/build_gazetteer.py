@@ -0,0 +1,271 @@
+"""
+Build the offline gazetteer bundled with stac_search
+
+Usage:
+    python scripts/build_gazetteer.py \
+        --countries ne_110m_admin_0_countries.geojson \
+        --states us_states.geojson \
+        --geonames-cities cities15000.json \
+        --geonames-countries countries.json \
+        [--output stac_search/data/gazetteer.json.gz]
+
+Inputs:
+- countries: Natural Earth 1:110m admin 0 countries as GeoJSON, with the
+  `name`, `iso_a3` and `continent` properties
+- states: US state boundaries as GeoJSON, with the `name` and `code` (USPS
+  abbreviation) properties
+- geonames cities and countries: the JSON dumps of the geonamescache package
+  (GeoNames cities with more than 15000 inhabitants, and country info)
+
+Continents are the union of their countries, countries and states keep their
+boundaries, simplified, and cities with at least `--min-population`
+inhabitants are a box around their center sized by population. A city is
+left out when another city with the same name has at least
+`--dominance` of its population, so "Cordoba" or "Birmingham" still go to
+Geodini.
+"""
+
+import argparse
+import gzip
+import json
+import math
+import os
+import sys
+from collections import Counter, defaultdict
+
+import numpy as np
+import shapely
+from shapely.geometry import box, mapping, shape
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from stac_search.gazetteer import normalize  # noqa: E402
+
+DEFAULT_OUTPUT = os.path.join(
+    os.path.dirname(__file__), "..", "stac_search", "data", "gazetteer.json.gz"
+)
+
+SOURCES = [
+    {
+        "name": "Natural Earth 1:110m Admin 0 - Countries",
+        "url": "https://www.naturalearthdata.com/",
+        "license": "Public domain",
+    },
+    {
+        "name": "US states (Bokeh sample data)",
+        "url": "https://github.com/bokeh/bokeh_sampledata",
+        "license": "BSD-3-Clause",
+    },
+    {
+        "name": "GeoNames cities15000 and country info (via geonamescache)",
+        "url": "https://www.geonames.org/",
+        "license": "CC BY 4.0",
+    },
+]
+
+COUNTRY_ALIASES = {
+    "US": ["USA", "United States of America", "U.S.A."],
+    "GB": ["UK", "U.K.", "Great Britain", "Britain"],
+    "AE": ["UAE", "U.A.E."],
+    "CD": ["DRC", "DR Congo", "Congo-Kinshasa"],
+    "CG": ["Congo-Brazzaville"],
+    "CI": ["Cote d'Ivoire"],
+    "CZ": ["Czech Republic", "Czechia"],
+    "MM": ["Burma"],
+    "NL": ["Netherlands", "Holland"],
+    "SZ": ["Swaziland"],
+    "MK": ["Macedonia"],
+    "TL": ["East Timor"],
+    "PS": ["Palestine"],
+    "KR": ["South Korea"],
+    "KP": ["North Korea"],
+}
+CITY_ALIASES = {
+    # "New York" alone is as often the city as the state
+    ("US", "New York City"): ["NYC", "New York"],
+    ("US", "Washington"): ["Washington DC", "Washington D.C."],
+    ("IN", "Mumbai"): ["Bombay"],
+    ("IN", "Kolkata"): ["Calcutta"],
+    ("IN", "Chennai"): ["Madras"],
+    ("VN", "Ho Chi Minh City"): ["Saigon"],
+}
+# ids that don't resolve through the ISO codes of Natural Earth
+EXTRA_COUNTRIES = {"Kosovo": "XK"}
+
+
+def rounded(geometry, decimals: int):
+    geometry = shapely.transform(geometry, lambda xy: np.round(xy, decimals))
+    if geometry.is_valid:
+        return geometry
+    # rounding can collapse slivers into lines, keep the polygons only
+    parts = shapely.get_parts(shapely.make_valid(geometry))
+    polygons = [
+        polygon
+        for part in parts
+        for polygon in shapely.get_parts(part)
+        if polygon.geom_type == "Polygon"
+    ]
+    return shapely.unary_union(polygons)
+
+
+def city_box(lon: float, lat: float, population: int):
+    """A box around a city, from 0.1 to 0.5 degrees either way"""
+    half = min(0.5, max(0.1, 0.15 * math.sqrt(population / 1e6)))
+    return box(lon - half, lat - half, lon + half, lat + half)
+
+
+def load_countries(path: str, geonames_countries: dict, tolerance: float):
+    by_iso3 = {c["iso3"]: c for c in geonames_countries.values()}
+    places, continents = [], defaultdict(list)
+    with open(path) as f:
+        features = json.load(f)["features"]
+    for feature in features:
+        properties = feature["properties"]
+        geometry = shape(feature["geometry"])
+        continents[properties["continent"]].append(geometry)
+        geonames = by_iso3.get(properties["iso_a3"])
+        code = geonames["iso"] if geonames else EXTRA_COUNTRIES.get(properties["name"])
+        if code is None:
+            # disputed areas without an ISO code, like Somaliland
+            continue
+        name = geonames["name"] if geonames else properties["name"]
+        aliases = [properties["name"], *COUNTRY_ALIASES.get(code, [])]
+        places.append(
+            {
+                "name": name,
+                "kind": "country",
+                "country": code,
+                "aliases": sorted(set(aliases) - {name}),
+                "population": geonames["population"] if geonames else 0,
+                "geometry": rounded(geometry.simplify(tolerance), 3),
+            }
+        )
+    for continent, geometries in continents.items():
+        if continent.startswith("Seven seas"):
+            continue
+        places.append(
+            {
+                "name": continent,
+                "kind": "continent",
+                "geometry": rounded(
+                    shapely.union_all(geometries).simplify(tolerance * 10), 2
+                ),
+            }
+        )
+    return places
+
+
+def load_states(path: str, tolerance: float):
+    with open(path) as f:
+        features = json.load(f)["features"]
+    return [
+        {
+            "name": feature["properties"]["name"],
+            "kind": "state",
+            "country": "US",
+            "state": feature["properties"]["code"],
+            "geometry": rounded(shape(feature["geometry"]).simplify(tolerance), 3),
+        }
+        for feature in features
+    ]
+
+
+def load_cities(path: str, min_population: int, dominance: float, countries: set):
+    with open(path) as f:
+        cities = list(json.load(f).values())
+    by_name = defaultdict(list)
+    for city in cities:
+        by_name[" ".join(normalize(city["name"]))].append(city)
+    places = []
+    for name, namesakes in by_name.items():
+        namesakes.sort(key=lambda city: city["population"], reverse=True)
+        for city in namesakes:
+            if city["population"] < min_population:
+                break
+            others = [other for other in namesakes if other is not city]
+            if any(o["population"] >= city["population"] * dominance for o in others):
+                continue
+            city_name = city["name"]
+            aliases = CITY_ALIASES.get((city["countrycode"], city_name), [])
+            # "Panama" is the country, the city is "Panama City"
+            if name in countries:
+                city_name = f"{city_name} City"
+            places.append(
+                {
+                    "name": city_name,
+                    "kind": "city",
+                    "country": city["countrycode"],
+                    "state": (
+                        city["admin1code"] if city["countrycode"] == "US" else None
+                    ),
+                    "aliases": aliases,
+                    "population": city["population"],
+                    "geometry": rounded(
+                        city_box(
+                            city["longitude"], city["latitude"], city["population"]
+                        ),
+                        3,
+                    ),
+                }
+            )
+    return places
+
+
+def add_labels(places: list, geonames_countries: dict) -> list:
+    """Unique labels, qualified by state or country for shared names"""
+    country_names = {c["iso"]: c["name"] for c in geonames_countries.values()}
+    state_names = {p["state"]: p["name"] for p in places if p["kind"] == "state"}
+    counts = Counter(" ".join(normalize(p["name"])) for p in places)
+    labels = set()
+    labelled = []
+    # countries and continents keep their bare name
+    for place in sorted(
+        places, key=lambda p: p["kind"] not in ("country", "continent")
+    ):
+        label = place["name"]
+        if counts[" ".join(normalize(label))] > 1 and place["kind"] == "state":
+            label = f"{label}, United States"
+        elif counts[" ".join(normalize(label))] > 1 and place["kind"] == "city":
+            if place["country"] == "US":
+                label = f"{label}, {state_names[place['state']]}"
+            else:
+                label = f"{label}, {country_names[place['country']]}"
+        key = " ".join(normalize(label))
+        if key in labels:
+            continue
+        labels.add(key)
+        labelled.append({**place, "label": label})
+    return labelled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--countries", required=True)
+    parser.add_argument("--states", required=True)
+    parser.add_argument("--geonames-cities", required=True)
+    parser.add_argument("--geonames-countries", required=True)
+    parser.add_argument("--min-population", type=int, default=500_000)
+    parser.add_argument("--dominance", type=float, default=0.1)
+    parser.add_argument("--tolerance", type=float, default=0.01)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    with open(args.geonames_countries) as f:
+        geonames_countries = json.load(f)
+    places = load_countries(args.countries, geonames_countries, args.tolerance)
+    countries = {" ".join(normalize(p["name"])) for p in places}
+    places += load_states(args.states, args.tolerance)
+    places += load_cities(
+        args.geonames_cities, args.min_population, args.dominance, countries
+    )
+    places = add_labels(places, geonames_countries)
+    for place in places:
+        place["geometry"] = mapping(place["geometry"])
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with gzip.open(args.output, "wt", encoding="utf-8") as f:
+        json.dump({"sources": SOURCES, "places": places}, f, separators=(",", ":"))
+    print(f"Wrote {len(places)} places to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,28 @@ Search module for STAC Natural Query
 import asyncio
 import logging
 import os
-import time
 from dataclasses import dataclass
 from pprint import pformat
 from typing import List, Dict, Any
 
+import numpy as np
 from pydantic_ai import Agent
-from stac_search.catalog_manager import CatalogManager
-from stac_search.cache import async_cached, embedding_cache, agent_cache
-
+from stac_search.catalog_manager import get_catalog_manager
+from stac_search.lexical import EXACT_MATCH_WEIGHT, reciprocal_rank_fusion
+from stac_search.rerank import (
+    RERANK_MODE,
+    RERANK_MODES,
+    cross_encoder_rerank,
+    fusion_rerank,
+)
+from stac_search.cache import (
+    MISSING,
+    async_cached,
+    embedding_cache,
+    agent_cache,
+    rerank_semantic_cache,
+)
+from stac_search.timing import stage_timer, timed
 
 logger = logging.getLogger(__name__)
 
@@ -60,43 +73,103 @@ For each collection, provide:
 )
 
 
-@async_cached(embedding_cache)
+@async_cached(
+    embedding_cache,
+    key=lambda catalog_manager, query: (catalog_manager.model_id, query),
+)
 async def _generate_query_embedding(catalog_manager, query: str):
     """Generate cached embedding for query string"""
-    return await asyncio.to_thread(catalog_manager.model.encode, [query])
+    return await catalog_manager.encode([query])
 
 
 @async_cached(agent_cache)
+@timed("agent.rerank")
 async def _run_rerank_agent(user_prompt: str) -> RankedCollections:
     """Run the rerank agent with caching"""
     result = await rerank_agent.run(user_prompt)
     return result.data
 
 
-async def collection_search(
-    query: str,
-    top_k: int = 5,
-    model_name: str = MODEL_NAME,
-    data_path: str = DATA_PATH,
-    catalog_url: str = None,
-) -> List[CollectionWithExplanation]:
-    """
-    Search for collections and rerank results with explanations
+async def _vector_search(collection, query_embeddings, n_results: int):
+    """Chroma candidates for one or more query embeddings, in a single query"""
+    with stage_timer("chroma_query"):
+        return await asyncio.to_thread(
+            collection.query,
+            query_embeddings=query_embeddings.tolist(),
+            n_results=n_results,
+        )
 
-    Args:
-        query: The user's natural language query
-        top_k: Maximum number of results to return
-        model_name: Name of the sentence transformer model to use
-        data_path: Path to the vector database
-        catalog_url: URL of the STAC catalog
 
-    Returns:
-        Ranked results with relevance explanations
+async def _fuse_candidates(
+    collection, lexical_index, query: str, query_embedding, results, n_results: int
+):
     """
-    start_time = time.time()
+    Fuse the vector candidates of one query with BM25 by reciprocal rank.
+
+    Collections the query names by id or distinctive acronym (NAIP, HLS) are
+    boosted as a third ranking. `results` are the Chroma metadatas and
+    distances of the query. Returns the metadatas of the fused candidates and
+    their vector distances.
+    """
+    metadatas, distances = results
+    metadata_by_id = {m["collection_id"]: m for m in metadatas}
+    distance_by_id = dict(zip(metadata_by_id, distances))
+    with stage_timer("lexical_search"):
+        lexical_ids = [i for i, _ in lexical_index.search(query, n_results)]
+        exact_ids = lexical_index.exact_matches(query)
+
+    fused = reciprocal_rank_fusion(
+        [list(metadata_by_id), lexical_ids, exact_ids],
+        weights=[1.0, 1.0, EXACT_MATCH_WEIGHT],
+    )[:n_results]
+
+    # lexical-only candidates still need a vector distance for local reranking
+    lexical_only = [i for i in fused if i not in metadata_by_id]
+    if lexical_only:
+        stored = await asyncio.to_thread(
+            collection.get,
+            where={"collection_id": {"$in": lexical_only}},
+            include=["metadatas", "embeddings"],
+        )
+        for metadata, embedding in zip(stored["metadatas"], stored["embeddings"]):
+            metadata_by_id[metadata["collection_id"]] = metadata
+            distance_by_id[metadata["collection_id"]] = float(
+                np.sum((np.asarray(embedding) - query_embedding[0]) ** 2)
+            )
+
+    fused = [i for i in fused if i in metadata_by_id]
+    return [metadata_by_id[i] for i in fused], [distance_by_id[i] for i in fused]
+
+
+async def _hybrid_search(
+    collection, lexical_index, query: str, query_embedding, n_results: int
+):
+    """Retrieve candidates with vector search and BM25, fused by reciprocal rank"""
+    results = await _vector_search(collection, query_embedding, n_results)
+    return await _fuse_candidates(
+        collection,
+        lexical_index,
+        query,
+        query_embedding,
+        (results["metadatas"][0], results["distances"][0]),
+        n_results,
+    )
+
+
+def _validate_rerank(rerank: str | None) -> str:
+    rerank = rerank or RERANK_MODE
+    if rerank not in RERANK_MODES:
+        raise ValueError(
+            f"Unknown rerank mode {rerank!r}, expected one of {RERANK_MODES}"
+        )
+    return rerank
 
-    # Initialize catalog manager
-    catalog_manager = CatalogManager(data_path=data_path, model_name=model_name)
+
+@timed("catalog_open")
+async def _open_catalog(catalog_url: str, model_name: str, data_path: str):
+    """The catalog manager, Chroma collection and BM25 index of a catalog"""
+    # Reuse the process-wide catalog manager
+    catalog_manager = get_catalog_manager(data_path=data_path, model_name=model_name)
 
     # If catalog_url is provided, ensure it's loaded
     if catalog_url:
@@ -107,25 +180,61 @@ async def collection_search(
 
     # Get the appropriate collection
     collection = catalog_manager.get_catalog_collection(catalog_url)
+    lexical_index = catalog_manager.get_lexical_index(catalog_url)
+    return catalog_manager, collection, lexical_index
 
-    load_model_time = time.time()
-    logger.info(f"Model loading time: {load_model_time - start_time:.4f} seconds")
 
-    # Generate query embedding
-    query_embedding = await _generate_query_embedding(catalog_manager, query)
-
-    # Search vector database
-    results = await asyncio.to_thread(
-        collection.query,
-        query_embeddings=query_embedding.tolist(),
-        n_results=top_k * 2,  # Get more results initially for better reranking
-    )
+def _named_collection_result(
+    lexical_index, query: str, rerank: str
+) -> List[CollectionWithExplanation] | None:
+    """
+    The result of a query that is just a collection id or acronym ("naip"),
+    answered without retrieval or reranking unless the LLM reranks.
+    """
+    if rerank == "llm":
+        return None
+    collection_id = lexical_index.named_collection(query)
+    if collection_id is None:
+        return None
+    title = lexical_index.documents[collection_id].get("title") or collection_id
+    return [
+        CollectionWithExplanation(
+            collection_id=collection_id,
+            explanation=f"Exact match for {title} in the query.",
+        )
+    ]
+
+
+async def _rerank_candidates(
+    query: str,
+    query_embedding,
+    metadatas: List[Dict[str, Any]],
+    distances: List[float],
+    top_k: int,
+    rerank: str,
+    catalog_url: str | None,
+) -> List[CollectionWithExplanation]:
+    if rerank == "fusion":
+        with stage_timer("rerank.fusion"):
+            ranked = fusion_rerank(query, metadatas, distances, top_k)
+    elif rerank == "cross-encoder":
+        with stage_timer("rerank.cross_encoder"):
+            ranked = await asyncio.to_thread(
+                cross_encoder_rerank, query, metadatas, top_k
+            )
+    if rerank != "llm":
+        return [
+            CollectionWithExplanation(
+                collection_id=metadata["collection_id"], explanation=explanation
+            )
+            for metadata, _, explanation in ranked
+        ]
 
     # Prepare the collections information
     collections_text = "\n\n".join(
         [
             f"Collection ID: {c['collection_id']}\nTitle: {c.get('title', '')}\nDescription: {c.get('description', '')}"
-            for c in results["metadatas"][0]
+            for c in metadatas
         ]
     )
 
@@ -136,11 +245,141 @@ Collections to evaluate:
 {collections_text}
 """
 
+    # near-duplicate queries over the same candidates can reuse a rerank
+    candidates = (
+        catalog_url,
+        frozenset(c["collection_id"] for c in metadatas),
+    )
+    if rerank_semantic_cache.enabled:
+        cached = rerank_semantic_cache.lookup(query_embedding, candidates)
+        if cached is not MISSING:
+            return cached.results
+
     agent_result = await _run_rerank_agent(user_prompt)
+    if rerank_semantic_cache.enabled:
+        rerank_semantic_cache.store(query_embedding, candidates, agent_result)
 
     return agent_result.results
 
 
+async def collection_search(
+    query: str,
+    top_k: int = 5,
+    model_name: str = MODEL_NAME,
+    data_path: str = DATA_PATH,
+    catalog_url: str = None,
+    rerank: str = None,
+) -> List[CollectionWithExplanation]:
+    """
+    Search for collections and rerank results with explanations
+
+    Args:
+        query: The user's natural language query
+        top_k: Maximum number of results to return
+        model_name: Name of the sentence transformer model to use
+        data_path: Path to the vector database
+        catalog_url: URL of the STAC catalog
+        rerank: How to rerank the candidates, one of "llm" (rich explanations),
+            "fusion" or "cross-encoder"; defaults to RERANK_MODE
+
+    Returns:
+        Ranked results with relevance explanations
+    """
+    rerank = _validate_rerank(rerank)
+
+    catalog_manager, collection, lexical_index = await _open_catalog(
+        catalog_url, model_name, data_path
+    )
+
+    named_result = _named_collection_result(lexical_index, query, rerank)
+    if named_result is not None:
+        return named_result
+
+    # Generate query embedding
+    query_embedding = await _generate_query_embedding(catalog_manager, query)
+
+    # Get more results initially for better reranking
+    n_candidates = top_k * 2
+    metadatas, distances = await _hybrid_search(
+        collection, lexical_index, query, query_embedding, n_candidates
+    )
+    return await _rerank_candidates(
+        query, query_embedding, metadatas, distances, top_k, rerank, catalog_url
+    )
+
+
+async def collection_search_batch(
+    queries: List[str],
+    top_k: int = 5,
+    model_name: str = MODEL_NAME,
+    data_path: str = DATA_PATH,
+    catalog_url: str = None,
+    rerank: str = None,
+    concurrency: int = 8,
+) -> List[List[CollectionWithExplanation] | Exception]:
+    """
+    Search for the collections of many queries at once.
+
+    Identical queries are searched once, the distinct queries are embedded in
+    one model call and retrieved with one Chroma query, and at most
+    `concurrency` reranks run at the same time. Returns the results in the
+    order of `queries`, with the exception instead for a query that failed.
+    """
+    rerank = _validate_rerank(rerank)
+    catalog_manager, collection, lexical_index = await _open_catalog(
+        catalog_url, model_name, data_path
+    )
+
+    distinct = list(dict.fromkeys(queries))
+    results: Dict[str, List[CollectionWithExplanation] | Exception] = {}
+    for query in distinct:
+        named_result = _named_collection_result(lexical_index, query, rerank)
+        if named_result is not None:
+            results[query] = named_result
+
+    to_search = [query for query in distinct if query not in results]
+    if to_search:
+        n_candidates = top_k * 2
+        embeddings = await catalog_manager.encode(to_search)
+        vector_results = await _vector_search(collection, embeddings, n_candidates)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def search_one(i: int, query: str):
+            query_embedding = embeddings[i : i + 1]
+            async with semaphore:
+                try:
+                    metadatas, distances = await _fuse_candidates(
+                        collection,
+                        lexical_index,
+                        query,
+                        query_embedding,
+                        (
+                            vector_results["metadatas"][i],
+                            vector_results["distances"][i],
+                        ),
+                        n_candidates,
+                    )
+                    results[query] = await _rerank_candidates(
+                        query,
+                        query_embedding,
+                        metadatas,
+                        distances,
+                        top_k,
+                        rerank,
+                        catalog_url,
+                    )
+                except Exception as e:
+                    logger.warning(f"Collection search failed for {query!r}: {e}")
+                    results[query] = e
+
+        await asyncio.gather(*(search_one(i, q) for i, q in enumerate(to_search)))
+
+    logger.info(
+        f"Searched collections for {len(queries)} queries, {len(distinct)} distinct"
+    )
+    return [results[query] for query in queries]
+
+
 async def main():
     collections = await collection_search("Sentinel-2 imagery over France")
     logger.info(pformat(collections))
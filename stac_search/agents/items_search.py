@@ -2,24 +2,34 @@ from datetime import date
 import json
 import logging
 import os
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, astuple
 from pprint import pformat
-import time
 import asyncio
-from typing import List, Dict, Any, Union
-import aiohttp
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Any, Union
 from pydantic_ai import Agent, RunContext
-from pystac_client import Client
 from pydantic import BaseModel, ConfigDict
 
 from stac_search.agents.collections_search import (
     collection_search,
+    collection_search_batch,
     CollectionWithExplanation,
 )
-from stac_search.cache import async_cached, agent_cache, geocoding_cache
-
+from stac_search.aoi import prepare_aoi
+from stac_search.cache import async_cached, agent_cache, aoi_cache, geocoding_cache
+from stac_search.async_stac import ITEM_SEARCH_ENGINE, search_items, stream_item_pages
+from stac_search.catalog_manager import get_catalog_manager
+from stac_search.gazetteer import get_gazetteer
+from stac_search.geocoding import GeocodingError, get_geocoding_client
+from stac_search.pipeline import Pipeline, StageTiming
+from stac_search.query_parser import (
+    QUERY_FAST_PATH_ENABLED,
+    fast_path_stats,
+    parse_cloud_filter,
+    parse_temporal_range,
+)
+from stac_search.stac_client import get_collection_ids, get_stac_client
+from stac_search.timing import stage_timer, timed
 
-GEODINI_API = os.getenv("GEODINI_API", "https://geodini.k8s.labs.ds.io")
 SMALL_MODEL_NAME = os.getenv("SMALL_MODEL_NAME", "openai:gpt-4.1-mini")
 STAC_CATALOG_URL = os.getenv(
     "STAC_CATALOG_URL", "https://planetarycomputer.microsoft.com/api/stac/v1"
@@ -39,6 +49,8 @@ class Context:
     location: str | None = None
     top_k: int = 5
     return_search_params_only: bool = False
+    # search with and return the AOI as geocoded, instead of simplified
+    full_resolution_aoi: bool = False
 
 
 @dataclass
@@ -71,6 +83,7 @@ def search_items_agent_system_prompt():
 
 
 @async_cached(agent_cache)
+@timed("agent.search_items")
 async def _run_search_items_agent(query: str, deps: dict) -> ItemSearchParams:
     result = await search_items_agent.run(query, deps=Context(**deps))
     return result.data
@@ -115,6 +128,7 @@ class CollectionSearchResult:
 
 
 @async_cached(agent_cache)
+@timed("agent.collection_query_framing")
 async def _run_collection_query_framing_agent(query: str) -> CollectionQuery:
     result = await collection_query_framing_agent.run(query)
     return result.data
@@ -136,6 +150,59 @@ async def search_collections(
         return None
 
 
+async def _search_collections_batch(
+    contexts: List[Context], concurrency: int
+) -> Dict[tuple, CollectionSearchResult | None | Exception]:
+    """
+    The collections of many contexts, with the collection searches batched.
+
+    The collection queries are framed concurrently, then the specific ones of
+    each catalog go through one collection_search_batch, so they are embedded
+    in one model call and retrieved with one Chroma query.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def frame(ctx: Context) -> CollectionQuery | Exception:
+        async with semaphore:
+            try:
+                return await _run_collection_query_framing_agent(ctx.query)
+            except Exception as e:
+                return e
+
+    framed = await asyncio.gather(*map(frame, contexts))
+    results: Dict[tuple, CollectionSearchResult | None | Exception] = {}
+    by_catalog: Dict[str, List[tuple]] = {}
+    for ctx, collection_query in zip(contexts, framed):
+        key = astuple(ctx)
+        if isinstance(collection_query, Exception):
+            results[key] = collection_query
+        elif not collection_query.is_specific:
+            results[key] = None
+        else:
+            by_catalog.setdefault(ctx.catalog_url or STAC_CATALOG_URL, []).append(
+                (key, collection_query.query)
+            )
+
+    async def search_catalog(catalog_url: str, searches: List[tuple]) -> None:
+        try:
+            found = await collection_search_batch(
+                [query for _, query in searches],
+                catalog_url=catalog_url,
+                concurrency=concurrency,
+            )
+        except Exception as e:
+            found = [e] * len(searches)
+        for (key, _), collections in zip(searches, found):
+            results[key] = (
+                collections
+                if isinstance(collections, Exception)
+                else CollectionSearchResult(collections=collections)
+            )
+
+    await asyncio.gather(*(search_catalog(*batch) for batch in by_catalog.items()))
+    return results
+
+
 @dataclass
 class GeocodingResult:
     location: str
@@ -157,6 +224,7 @@ If the query is "do you have anything from Georgia the country", the location qu
 
 
 @async_cached(geocoding_cache)
+@timed("agent.geocoding")
 async def _run_geocoding_agent(query: str) -> GeocodingResult:
     result = await geocoding_agent.run(query)
     return result.data
@@ -164,6 +232,12 @@ async def _run_geocoding_agent(query: str) -> GeocodingResult:
 
 @search_items_agent.tool
 async def set_spatial_extent(ctx: RunContext[Context]) -> GeocodingResult:
+    gazetteer = get_gazetteer()
+    if gazetteer is not None:
+        with stage_timer("gazetteer"):
+            place = gazetteer.find(ctx.deps.query)
+        if place is not None:
+            return GeocodingResult(location=place.label)
     return await _run_geocoding_agent(ctx.deps.query)
 
 
@@ -189,6 +263,7 @@ def temporal_range_agent_system_prompt():
 
 
 @async_cached(agent_cache)
+@timed("agent.temporal_range")
 async def _run_temporal_range_agent(query: str) -> TemporalRangeResult:
     result = await temporal_range_agent.run(query)
     return result.data
@@ -196,6 +271,14 @@ async def _run_temporal_range_agent(query: str) -> TemporalRangeResult:
 
 @search_items_agent.tool
 async def set_temporal_range(ctx: RunContext[Context]) -> TemporalRangeResult:
+    if QUERY_FAST_PATH_ENABLED:
+        # the tool only runs for queries with a temporal constraint, so when the
+        # rules find none it is phrased in a way only the agent understands
+        parsed, datetime = parse_temporal_range(ctx.deps.query)
+        parsed = parsed and datetime is not None
+        fast_path_stats.record("temporal_range", parsed)
+        if parsed:
+            return TemporalRangeResult(datetime=datetime)
     return await _run_temporal_range_agent(ctx.deps.query)
 
 
@@ -279,6 +362,7 @@ Return the filter dictionary itself as a JSON object. No additional keys or valu
 
 
 @async_cached(agent_cache)
+@timed("agent.cql2_filter")
 async def _run_cql2_filter_agent(query: str) -> FilterExpr | None:
     result = await cql2_filter_agent.run(query)
     return result.data
@@ -286,18 +370,29 @@ async def _run_cql2_filter_agent(query: str) -> FilterExpr | None:
 
 @search_items_agent.tool
 async def construct_cql2_filter(ctx: RunContext[Context]) -> FilterExpr | None:
+    if QUERY_FAST_PATH_ENABLED:
+        # like the temporal range, "crystal clear images" is left to the agent
+        parsed, cql2_filter = parse_cloud_filter(ctx.deps.query)
+        parsed = parsed and cql2_filter is not None
+        fast_path_stats.record("cql2_filter", parsed)
+        if parsed:
+            return FilterExpr.model_validate(cql2_filter)
     return await _run_cql2_filter_agent(ctx.deps.query)
 
 
 @async_cached(geocoding_cache)
+@timed("geodini")
+async def _lookup_polygon(location: str):
+    return await get_geocoding_client().search(location)
+
+
 async def get_polygon_from_geodini(location: str):
-    geodini_api = f"{GEODINI_API}/search"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(geodini_api, params={"query": location}) as response:
-            result = (await response.json()).get("results", [])
-            if result:
-                return result[0].get("geometry", None)
-    return None
+    # failed lookups raise, so they aren't cached with the successful ones
+    try:
+        return await _lookup_polygon(location)
+    except GeocodingError as e:
+        logger.warning(f"Could not geocode {location}: {e}")
+        return None
 
 
 @dataclass
@@ -306,41 +401,108 @@ class ItemSearchResult:
     search_params: Dict[str, Any] | None = None
     aoi: Dict[str, Any] | None = None
     explanation: str = ""
+    # when each stage of the request ran
+    timings: List[StageTiming] | None = None
 
 
-async def item_search(ctx: Context) -> ItemSearchResult:
-    start_time = time.time()
-    # formulate the query to be used for the search
-    results = await _run_search_items_agent(
-        query=f"Find items for the query: {ctx.query}", deps=asdict(ctx)
-    )
-    query_formulation_time = time.time()
-    logger.info(
-        f"Query formulation time: {query_formulation_time - start_time} seconds"
-    )
+async def _default_collections(
+    target_collections: CollectionSearchResult | None, catalog_url: str
+) -> tuple[List[str], List[str]] | None:
+    """The default collections in the catalog, plus all of its collection ids"""
+    if target_collections:
+        return None
+    # check that the default target collections exist in the catalog
+    all_collection_ids = await get_collection_ids(catalog_url)
+    default_target_collections = [
+        collection_id
+        for collection_id in DEFAULT_TARGET_COLLECTIONS
+        if collection_id in all_collection_ids
+    ]
+    return default_target_collections, all_collection_ids
+
+
+async def _geocode(results: ItemSearchParams):
+    if not results.location:
+        return None
+    gazetteer = get_gazetteer()
+    if gazetteer is not None:
+        with stage_timer("gazetteer"):
+            place = gazetteer.lookup(results.location)
+        if place is not None:
+            return place.geometry
+    return await get_polygon_from_geodini(results.location)
+
+
+@async_cached(aoi_cache, key=lambda location, polygon: location)
+@timed("aoi_prepare")
+async def _prepare_polygon(location: str, polygon: Dict[str, Any]) -> Dict[str, Any]:
+    return await asyncio.to_thread(prepare_aoi, polygon)
+
+
+async def _prepare_aoi(
+    results: ItemSearchParams, polygon: Dict[str, Any] | None, full_resolution: bool
+):
+    if polygon is None or full_resolution:
+        return polygon
+    return await _prepare_polygon(results.location, polygon)
+
 
+@dataclass
+class ItemSearchPlan:
+    """The search params and explanation of a query, before the STAC search runs"""
+
+    result: ItemSearchResult
+    catalog_url: str
+    # False when there is nothing to search, e.g. the location wasn't found
+    search: bool = True
+
+
+async def plan_item_search(
+    ctx: Context,
+    pipeline: Pipeline,
+    collections: Callable[[], Awaitable[CollectionSearchResult | None]] = None,
+) -> ItemSearchPlan:
+    """
+    Run every stage of the item search up to the STAC search itself.
+
+    `collections` replaces the collection search, e.g. with the result of a
+    batched search.
+    """
     catalog_url_to_use = ctx.catalog_url or STAC_CATALOG_URL
 
-    # determine the collections to search
-    target_collections = await search_collections(ctx.query, catalog_url_to_use) or []
+    # query formulation and collection selection are independent, geocoding
+    # starts as soon as the query formulation has found the location
+    pipeline.stage(
+        "params",
+        lambda: _run_search_items_agent(
+            query=f"Find items for the query: {ctx.query}", deps=asdict(ctx)
+        ),
+    )
+    pipeline.stage(
+        "collections",
+        collections or (lambda: search_collections(ctx.query, catalog_url_to_use)),
+    )
+    pipeline.stage(
+        "default_collections",
+        lambda target_collections: _default_collections(
+            target_collections, catalog_url_to_use
+        ),
+        "collections",
+    )
+    pipeline.stage("geocode", _geocode, "params")
+    pipeline.stage(
+        "aoi",
+        lambda results, polygon: _prepare_aoi(
+            results, polygon, ctx.full_resolution_aoi
+        ),
+        "params",
+        "geocode",
+    )
+    results, target_collections, defaults, polygon = await pipeline.run(
+        "params", "collections", "default_collections", "aoi"
+    )
     logger.info(f"Target collections: {pformat(target_collections)}")
 
-    if not target_collections:
-        # If no specific collections were found, use the default target collections
-        default_target_collections = DEFAULT_TARGET_COLLECTIONS
-        # check that default_target_collections exist in the catalog
-        all_collection_ids = await asyncio.to_thread(
-            lambda: [
-                collection.id
-                for collection in Client.open(catalog_url_to_use).get_collections()
-            ]
-        )
-        default_target_collections = [
-            collection_id
-            for collection_id in default_target_collections
-            if collection_id in all_collection_ids
-        ]
-
     if target_collections:
         explanation = "Considering the following collections:"
         for result in target_collections.collections:
@@ -348,63 +510,197 @@ async def item_search(ctx: Context) -> ItemSearchResult:
         collections_to_search = [
             collection.collection_id for collection in target_collections.collections
         ]
-    elif default_target_collections:
-        explanation = f"Including the following common collections in the search: {', '.join(default_target_collections)}\n"
-        collections_to_search = default_target_collections
     else:
-        explanation = "Searching all collections in the catalog."
-        collections_to_search = all_collection_ids
+        default_target_collections, all_collection_ids = defaults
+        if default_target_collections:
+            explanation = f"Including the following common collections in the search: {', '.join(default_target_collections)}\n"
+            collections_to_search = default_target_collections
+        else:
+            explanation = "Searching all collections in the catalog."
+            collections_to_search = all_collection_ids
 
-    # Actually perform the search
-    client = Client.open(catalog_url_to_use)
     params = {
         "max_items": 20,
         "collections": collections_to_search,
         "datetime": results.datetime,
         "filter": results.filter,
     }
-
     logger.info(f"Searching with params: {params}")
-    params_formulation_time = time.time()
-    logger.info(
-        f"Params formulation time: {params_formulation_time - query_formulation_time} seconds"
-    )
+
+    def plan(search: bool = True, **kwargs) -> ItemSearchPlan:
+        result = ItemSearchResult(
+            search_params=params, explanation=explanation, **kwargs
+        )
+        return ItemSearchPlan(result, catalog_url_to_use, search)
 
     if results.location:
-        polygon = await get_polygon_from_geodini(results.location)
         if polygon:
             logger.info(f"Found polygon for {results.location}")
             params["intersects"] = polygon
         else:
             explanation += f"\n\n No polygon found for {results.location}. "
-            return ItemSearchResult(
-                items=None, search_params=params, aoi=None, explanation=explanation
-            )
+            return plan(search=False, items=None, aoi=None)
     else:
-        polygon = None
         explanation += "\n\n No specific location provided in the query."
-    geocoding_time = time.time()
-    logger.info(f"Geocoding time: {geocoding_time - params_formulation_time} seconds")
+
+    # drop the collections whose extent can't match the AOI or datetime
+    extent_index = get_catalog_manager().get_extent_index(catalog_url_to_use)
+    if extent_index is not None:
+        try:
+            pruned = extent_index.prune(
+                collections_to_search, params.get("intersects"), params["datetime"]
+            )
+        except Exception as e:
+            logger.warning(f"Could not prune collections by extent: {e}")
+            pruned = collections_to_search
+        dropped = [c for c in collections_to_search if c not in pruned]
+        if dropped:
+            logger.info(f"Pruned {len(dropped)} collections outside the search extent")
+            params["collections"] = pruned
+        if not pruned:
+            explanation += (
+                "\n\n None of the collections cover the requested area and time."
+            )
+            return plan(search=False, items=[], aoi=polygon)
+        if dropped:
+            explanation += (
+                "\n\n Not searching collections outside the requested area and "
+                f"time: {', '.join(dropped)}."
+            )
 
     if ctx.return_search_params_only:
         logger.info("Returning STAC query parameters only")
-        total_time = time.time() - start_time
-        logger.info(f"Total time: {total_time} seconds")
-        return ItemSearchResult(
-            search_params=params, aoi=polygon, explanation=explanation
-        )
+        return plan(search=False, aoi=polygon)
+    return plan(aoi=polygon)
+
+
+async def item_search(
+    ctx: Context,
+    collections: Callable[[], Awaitable[CollectionSearchResult | None]] = None,
+) -> ItemSearchResult:
+    pipeline = Pipeline("item_search")
+    plan = await plan_item_search(ctx, pipeline, collections)
+    result = plan.result
+
+    last_stage = "aoi"
+    if plan.search:
+        # Actually perform the search
+        async def search(*_):
+            if ITEM_SEARCH_ENGINE == "async":
+                return await search_items(plan.catalog_url, result.search_params)
+            client = await get_stac_client(plan.catalog_url)
+            return await asyncio.to_thread(
+                lambda: list(client.search(**result.search_params).items_as_dicts())
+            )
 
-    items = await asyncio.to_thread(
-        lambda: list(client.search(**params).items_as_dicts())
-    )
-    search_time = time.time()
-    logger.info(f"Search time: {search_time - geocoding_time} seconds")
-    total_time = time.time() - start_time
-    logger.info(f"Total time: {total_time} seconds")
-    return ItemSearchResult(
-        items=items, aoi=polygon, explanation=explanation, search_params=params
+        pipeline.stage(
+            "search",
+            search,
+            "params",
+            "default_collections",
+            "aoi",
+        )
+        last_stage = "search"
+        (result.items,) = await pipeline.run("search")
+
+    pipeline.log_timings(last_stage)
+    result.timings = pipeline.ordered_timings()
+    return result
+
+
+async def item_search_batch(
+    contexts: List[Context], concurrency: int = 8
+) -> List[ItemSearchResult | Exception]:
+    """
+    Run the item search of many queries, at most `concurrency` at a time.
+
+    Identical contexts are searched once, and the collection stage of all of
+    them runs as one batch next to their other stages: the specific
+    collection queries of a catalog are embedded in one model call and
+    retrieved with one Chroma query. Returns the results in the order of
+    `contexts`, with the exception instead for a query that failed.
+    """
+    distinct = list(dict.fromkeys(astuple(ctx) for ctx in contexts))
+    semaphore = asyncio.Semaphore(concurrency)
+    batch = asyncio.ensure_future(
+        _search_collections_batch([Context(*key) for key in distinct], concurrency)
     )
 
+    async def search_one(key: tuple) -> ItemSearchResult | Exception:
+        async def collections() -> CollectionSearchResult | None:
+            # a failing search cancels its stages, but not the shared batch
+            result = (await asyncio.shield(batch))[key]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        async with semaphore:
+            try:
+                return await item_search(Context(*key), collections)
+            except Exception as e:
+                logger.warning(f"Item search failed for {key[0]!r}: {e}")
+                return e
+
+    results = dict(zip(distinct, await asyncio.gather(*map(search_one, distinct))))
+    # every search may have failed before it needed its collections
+    batch.cancel()
+    logger.info(f"Searched items for {len(contexts)} queries, {len(distinct)} distinct")
+    return [results[astuple(ctx)] for ctx in contexts]
+
+
+async def stream_item_search(ctx: Context) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Item search that yields events as soon as they are known.
+
+    The first event carries the explanation, search params and AOI, then
+    every item follows as its STAC page arrives, and a last event has the
+    item count. Pages are fetched lazily, so when the consumer stops
+    iterating no further pages are requested.
+    """
+    pipeline = Pipeline("item_search")
+    plan = await plan_item_search(ctx, pipeline)
+    pipeline.log_timings("aoi")
+    result = plan.result
+    result.timings = pipeline.ordered_timings()
+    yield {
+        "type": "search",
+        **{k: v for k, v in asdict(result).items() if k != "items"},
+    }
+
+    count = 0
+    if plan.search:
+        pages = _item_pages(plan.catalog_url, result.search_params)
+        try:
+            async for page in pages:
+                for item in page:
+                    count += 1
+                    yield {"type": "item", "item": item}
+                logger.info(f"Streamed {count} items")
+        finally:
+            await pages.aclose()
+    yield {"type": "done", "count": count}
+
+
+async def _item_pages(
+    catalog_url: str, params: Dict[str, Any]
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """The items of search params page by page, with the ITEM_SEARCH_ENGINE"""
+    if ITEM_SEARCH_ENGINE == "async":
+        pages = stream_item_pages(catalog_url, params)
+        try:
+            async for page in pages:
+                yield page
+        finally:
+            await pages.aclose()
+        return
+    client = await get_stac_client(catalog_url)
+    pages = client.search(**params).pages_as_dicts()
+    while True:
+        page = await asyncio.to_thread(next, pages, None)
+        if page is None:
+            break
+        yield page.get("features", [])
+
 
 async def main():
     ctx = Context(query="NAIP imagery from Washington state")
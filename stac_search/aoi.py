@@ -0,0 +1,77 @@
+"""
+AOI preparation for STAC Natural Query - keeps search geometries small
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, Tuple
+
+import shapely
+from shapely.geometry import box, shape
+from shapely.geometry.base import BaseGeometry
+
+logger = logging.getLogger(__name__)
+
+# most vertices of the AOI sent to the STAC API and returned in the results
+AOI_MAX_VERTICES = int(os.environ.get("AOI_MAX_VERTICES", "1000"))
+# times the simplification tolerance is doubled before falling back to the bbox
+AOI_SIMPLIFY_STEPS = int(os.environ.get("AOI_SIMPLIFY_STEPS", "10"))
+
+
+def _min_vertices(geometry: BaseGeometry) -> int:
+    """Fewest vertices a topology preserving simplification can leave"""
+    parts = shapely.get_parts(geometry)
+    rings = len(parts) + int(shapely.get_num_interior_rings(parts).sum())
+    # a closed ring keeps at least 4 coordinates
+    return 4 * rings
+
+
+def simplify_to_budget(
+    geometry: BaseGeometry,
+    max_vertices: int = AOI_MAX_VERTICES,
+    steps: int = AOI_SIMPLIFY_STEPS,
+) -> Tuple[BaseGeometry, str]:
+    """
+    The geometry with at most `max_vertices` vertices, and how it was made.
+
+    Returns the geometry itself ("original") when it is within the budget, or
+    simplifies it with topology preserved, doubling the tolerance from a
+    fraction of its extent until it fits ("simplified"). Geometries that can't
+    fit, typically archipelagos whose every island keeps at least a triangle,
+    become their bbox ("bbox").
+    """
+    if shapely.get_num_coordinates(geometry) <= max_vertices:
+        return geometry, "original"
+    if not geometry.is_valid:
+        geometry = geometry.buffer(0)
+    minx, miny, maxx, maxy = geometry.bounds
+    if _min_vertices(geometry) <= max_vertices:
+        tolerance = max(maxx - minx, maxy - miny) / max_vertices / 8
+        candidate = geometry
+        for _ in range(steps):
+            # plain Douglas-Peucker on the previous result is several times
+            # faster and finds about the same vertex count for a tolerance
+            candidate = candidate.simplify(tolerance, preserve_topology=False)
+            if shapely.get_num_coordinates(candidate) <= max_vertices:
+                simplified = geometry.simplify(tolerance, preserve_topology=True)
+                if (
+                    not simplified.is_empty
+                    and shapely.get_num_coordinates(simplified) <= max_vertices
+                ):
+                    return simplified, "simplified"
+            tolerance *= 2
+    return box(minx, miny, maxx, maxy), "bbox"
+
+
+def prepare_aoi(geometry: Dict[str, Any]) -> Dict[str, Any]:
+    """A GeoJSON geometry simplified to the AOI vertex budget"""
+    original = shape(geometry)
+    prepared, method = simplify_to_budget(original)
+    if method == "original":
+        return geometry
+    logger.info(
+        f"Prepared AOI as {method}: {shapely.get_num_coordinates(original)} -> "
+        f"{shapely.get_num_coordinates(prepared)} vertices"
+    )
+    return json.loads(shapely.to_geojson(prepared))
@@ -2,24 +2,88 @@
 FastAPI server for STAC Natural Query
 """
 
+import asyncio
+import json
 import logging
-from typing import Optional
+import os
+import time
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import asdict
+from typing import List, Literal, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import uvicorn
 
-from stac_search.agents.collections_search import collection_search
-from stac_search.agents.items_search import item_search, Context as ItemSearchContext
+from stac_search.agents.collections_search import (
+    collection_search,
+    collection_search_batch,
+)
+from stac_search.agents.items_search import (
+    item_search,
+    item_search_batch,
+    stream_item_search,
+    Context as ItemSearchContext,
+)
+from stac_search.async_stac import close_async_search
+from stac_search.cache import cache_stats
+from stac_search.catalog_manager import get_catalog_manager, close_catalog_managers
+from stac_search.embeddings import model_id, model_is_ready, warmup_model
+from stac_search.gazetteer import get_gazetteer
+from stac_search.geocoding import close_geocoding_client, get_geocoding_client
+from stac_search.query_parser import fast_path_stats
+from stac_search.stac_client import close_stac_clients
+from stac_search.timing import (
+    latest_metrics,
+    metrics_enabled,
+    record_request,
+    server_timing_header,
+    start_request_timings,
+)
 
 logger = logging.getLogger(__name__)
 
+# most queries in one batch request, and how many of them run at the same time
+BATCH_MAX_QUERIES = int(os.environ.get("BATCH_MAX_QUERIES", "1000"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+
+
+def _log_warmup_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logger.error(f"Model warmup failed: {task.exception()}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Own the process-wide resources shared across requests"""
+    app.state.catalog_manager = get_catalog_manager()
+    # warm the model in the background so the server can bind right away;
+    # /ready reports when it is hot
+    app.state.warmup = asyncio.create_task(
+        asyncio.to_thread(
+            warmup_model,
+            app.state.catalog_manager.model_name,
+            app.state.catalog_manager.backend,
+        )
+    )
+    app.state.warmup.add_done_callback(_log_warmup_failure)
+    await asyncio.to_thread(get_gazetteer)
+    yield
+    app.state.warmup.cancel()
+    close_catalog_managers()
+    close_stac_clients()
+    await close_geocoding_client()
+    await close_async_search()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="STAC Natural Query API",
     description="API for semantic search of STAC collections",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -29,19 +93,97 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["Server-Timing"],
 )
 
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Return the stage timings of each request as a Server-Timing header"""
+    timings = start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    duration = time.perf_counter() - start
+    # label by route template so ids in paths don't create new series
+    route = request.scope.get("route")
+    record_request(request.method, getattr(route, "path", "unmatched"), duration)
+    # streamed responses only include the stages that ran before the first byte
+    timings.append(("total", duration))
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+
 # Define request model
 class QueryRequest(BaseModel):
     query: str
     catalog_url: Optional[str] = None
+    # defaults to the RERANK_MODE setting
+    rerank: Optional[Literal["llm", "fusion", "cross-encoder"]] = None
 
 
 class STACItemsRequest(BaseModel):
     query: str
     catalog_url: Optional[str] = None
     return_search_params_only: bool = False
+    # search with and return the geocoded AOI instead of its simplified version
+    full_resolution_aoi: bool = False
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=BATCH_MAX_QUERIES)
+    catalog_url: Optional[str] = None
+    rerank: Optional[Literal["llm", "fusion", "cross-encoder"]] = None
+
+
+class STACItemsBatchRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=BATCH_MAX_QUERIES)
+    catalog_url: Optional[str] = None
+    return_search_params_only: bool = False
+    full_resolution_aoi: bool = False
+
+
+class STACItemsStreamRequest(STACItemsRequest):
+    # newline-delimited JSON or server-sent events
+    format: Literal["ndjson", "sse"] = "ndjson"
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness check, reports whether the embedding model is loaded and warm"""
+    catalog_manager = app.state.catalog_manager
+    model = model_id(catalog_manager.model_name, catalog_manager.backend)
+    if model_is_ready(catalog_manager.model_name, catalog_manager.backend):
+        return {"ready": True, "model": model}
+    return JSONResponse(status_code=503, content={"ready": False, "model": model})
+
+
+@app.get("/stats")
+async def stats():
+    """Cache, embedding batcher, query fast path, gazetteer and geocoding counters"""
+    geocoding_client = get_geocoding_client()
+    gazetteer = get_gazetteer()
+    return {
+        "caches": cache_stats(),
+        "embedding_batcher": asdict(app.state.catalog_manager.batcher.stats),
+        "query_fast_path": fast_path_stats.as_dict(),
+        "gazetteer": asdict(gazetteer.stats) if gazetteer else None,
+        "geocoding": {
+            **asdict(geocoding_client.stats),
+            "circuit": geocoding_client.breaker.state,
+        },
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Stage and request latency histograms in the Prometheus text format"""
+    if not metrics_enabled():
+        raise HTTPException(
+            status_code=501,
+            detail="Install prometheus-client (pip install .[metrics]) for metrics",
+        )
+    content, content_type = latest_metrics()
+    return Response(content=content, media_type=content_type)
 
 
 # Define search endpoint
@@ -50,7 +192,7 @@ async def search(request: QueryRequest):
     """Search for STAC collections using natural language"""
     try:
         results = await collection_search(
-            request.query, catalog_url=request.catalog_url
+            request.query, catalog_url=request.catalog_url, rerank=request.rerank
         )
         return {"results": results}
     except Exception as e:
@@ -65,6 +207,7 @@ async def search_items(request: STACItemsRequest):
             query=request.query,
             catalog_url=request.catalog_url,
             return_search_params_only=request.return_search_params_only,
+            full_resolution_aoi=request.full_resolution_aoi,
         )
         results = await item_search(ctx)
         return {"results": results}
@@ -73,6 +216,92 @@ async def search_items(request: STACItemsRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _batch_response(queries: List[str], results: list) -> dict:
+    """Per-query results, or errors, in the order of the queries"""
+    return {
+        "results": [
+            (
+                {"query": query, "error": str(result)}
+                if isinstance(result, Exception)
+                else {"query": query, "results": result}
+            )
+            for query, result in zip(queries, results)
+        ]
+    }
+
+
+@app.post("/search/batch")
+async def search_batch(request: BatchQueryRequest):
+    """Search for the STAC collections of many natural language queries"""
+    try:
+        results = await collection_search_batch(
+            request.queries,
+            catalog_url=request.catalog_url,
+            rerank=request.rerank,
+            concurrency=BATCH_CONCURRENCY,
+        )
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return _batch_response(request.queries, results)
+
+
+@app.post("/items/search/batch")
+async def search_items_batch(request: STACItemsBatchRequest):
+    """Search for the STAC items of many natural language queries"""
+    contexts = [
+        ItemSearchContext(
+            query=query,
+            catalog_url=request.catalog_url,
+            return_search_params_only=request.return_search_params_only,
+            full_resolution_aoi=request.full_resolution_aoi,
+        )
+        for query in request.queries
+    ]
+    results = await item_search_batch(contexts, concurrency=BATCH_CONCURRENCY)
+    return _batch_response(request.queries, results)
+
+
+def _encode_event(event: dict, format: str) -> str:
+    data = json.dumps(event, default=str)
+    if format == "sse":
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return f"{data}\n"
+
+
+@app.post("/items/search/stream")
+async def stream_search_items(request: STACItemsStreamRequest, http_request: Request):
+    """
+    Search for STAC items using natural language, streaming the results.
+
+    The explanation and search params come first, then each item as its STAC
+    page arrives. A client disconnect stops the upstream pagination.
+    """
+    ctx = ItemSearchContext(
+        query=request.query,
+        catalog_url=request.catalog_url,
+        return_search_params_only=request.return_search_params_only,
+        full_resolution_aoi=request.full_resolution_aoi,
+    )
+
+    async def events():
+        try:
+            async with aclosing(stream_item_search(ctx)) as stream:
+                async for event in stream:
+                    if await http_request.is_disconnected():
+                        logger.info("Client disconnected, stopping the item search")
+                        return
+                    yield _encode_event(event, request.format)
+        except Exception as e:
+            logger.exception(e)
+            yield _encode_event({"type": "error", "detail": str(e)}, request.format)
+
+    media_type = (
+        "text/event-stream" if request.format == "sse" else "application/x-ndjson"
+    )
+    return StreamingResponse(events(), media_type=media_type)
+
+
 def start_server(host: str = "0.0.0.0", port: int = 8000):
     """Start the FastAPI server"""
     uvicorn.run(app, host=host, port=port)
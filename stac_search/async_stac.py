@@ -0,0 +1,292 @@
+"""
+Async STAC item search for STAC Natural Query - fans out per collection on aiohttp
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+from stac_search.stac_client import STAC_REQUEST_TIMEOUT, get_stac_client
+
+logger = logging.getLogger(__name__)
+
+# "pystac" runs pystac-client in a thread, "async" uses AsyncStacSearch
+ITEM_SEARCH_ENGINES = ("pystac", "async")
+ITEM_SEARCH_ENGINE = os.environ.get("ITEM_SEARCH_ENGINE", "pystac")
+# collections searched at the same time, per request
+STAC_SEARCH_CONCURRENCY = int(os.environ.get("STAC_SEARCH_CONCURRENCY", "4"))
+STAC_SEARCH_PAGE_SIZE = int(os.environ.get("STAC_SEARCH_PAGE_SIZE", "100"))
+# searches over more collections than this run as a single search
+STAC_SEARCH_MAX_FANOUT = int(os.environ.get("STAC_SEARCH_MAX_FANOUT", "10"))
+
+
+def _format_datetime(value: Optional[str]) -> Optional[str]:
+    """Expand the dates of a datetime range to RFC 3339, e.g. 2023-01-01/.."""
+    if not value:
+        return None
+    parts = value.split("/")
+    formatted = []
+    for i, part in enumerate(parts):
+        if len(part) == 10:
+            # a date-only end includes the whole day
+            is_end = len(parts) == 2 and i == 1
+            part += "T23:59:59Z" if is_end else "T00:00:00Z"
+        formatted.append(part or "..")
+    return "/".join(formatted)
+
+
+def _sort_key(item: Dict[str, Any]) -> str:
+    properties = item.get("properties", {})
+    return properties.get("datetime") or properties.get("start_datetime") or ""
+
+
+class AsyncStacSearch:
+    """
+    STAC API item search on one pooled aiohttp session.
+
+    A search for several collections runs one search per collection, with at
+    most `concurrency` requests in flight, and each of them requests its next
+    page while the current one is processed. The results are merged by
+    datetime, newest first, up to `max_items`, so a collection is only paged
+    further while its items are among the newest. Searches over more than
+    `max_fanout` collections, or over the whole catalog, run as one search.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = STAC_SEARCH_CONCURRENCY,
+        page_size: int = STAC_SEARCH_PAGE_SIZE,
+        max_fanout: int = STAC_SEARCH_MAX_FANOUT,
+        timeout: float = STAC_REQUEST_TIMEOUT,
+    ):
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.max_fanout = max_fanout
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        # a session is bound to the loop it was created on
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+            self._loop = loop
+        return self._session
+
+    async def _fetch(
+        self,
+        method: str,
+        url: str,
+        body: Dict[str, Any],
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ) -> dict:
+        if semaphore is not None:
+            async with semaphore:
+                return await self._fetch(method, url, body)
+        session = self._get_session()
+        if method == "POST":
+            request = session.post(url, json=body)
+        else:
+            request = session.get(url)
+        async with request as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def pages(
+        self,
+        search_url: str,
+        body: Dict[str, Any],
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Pages of a search, requesting each page before the previous is consumed.
+
+        With a semaphore, every request, prefetches included, holds it while
+        in flight, so the searches sharing it respect its limit.
+        """
+        next_page = asyncio.ensure_future(
+            self._fetch("POST", search_url, body, semaphore)
+        )
+        try:
+            while next_page is not None:
+                page = await next_page
+                next_page = None
+                links = page.get("links", [])
+                link = next((link for link in links if link.get("rel") == "next"), None)
+                if link and page.get("features"):
+                    method = link.get("method", "GET").upper()
+                    next_body = link.get("body", {})
+                    if link.get("merge"):
+                        next_body = {**body, **next_body}
+                    next_page = asyncio.ensure_future(
+                        self._fetch(method, link["href"], next_body, semaphore)
+                    )
+                yield page
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def _search_one(
+        self, search_url: str, body: Dict[str, Any], max_items: int
+    ) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        pages = self.pages(search_url, body)
+        try:
+            async for page in pages:
+                items.extend(page.get("features", []))
+                if len(items) >= max_items:
+                    break
+        finally:
+            await pages.aclose()
+        return items[:max_items]
+
+    def search_body(
+        self,
+        max_items: int = 20,
+        datetime: Optional[str] = None,
+        intersects: Optional[Dict[str, Any]] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """The body of a search request, without its collections"""
+        body: Dict[str, Any] = {"limit": min(self.page_size, max_items)}
+        if datetime:
+            body["datetime"] = _format_datetime(datetime)
+        if intersects:
+            body["intersects"] = intersects
+        if filter:
+            body["filter"] = filter
+            body["filter-lang"] = "cql2-json"
+        return body
+
+    async def search(
+        self,
+        search_url: str,
+        collections: List[str],
+        max_items: int = 20,
+        datetime: Optional[str] = None,
+        intersects: Optional[Dict[str, Any]] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Items of the collections matching the search, newest first"""
+        body = self.search_body(max_items, datetime, intersects, filter)
+
+        if not collections or len(collections) > self.max_fanout:
+            if collections:
+                body["collections"] = collections
+            return await self._search_one(search_url, body, max_items)
+
+        # shared by the requests of all the collections, prefetches included
+        semaphore = asyncio.Semaphore(self.concurrency)
+        streams = {
+            collection_id: self.pages(
+                search_url, {**body, "collections": [collection_id]}, semaphore
+            )
+            for collection_id in collections
+        }
+        buffers: Dict[str, List[Dict[str, Any]]] = {c: [] for c in collections}
+
+        async def refill(collection_id: str) -> None:
+            try:
+                page = await streams[collection_id].__anext__()
+            except StopAsyncIteration:
+                del streams[collection_id]
+                return
+            buffers[collection_id].extend(page.get("features", []))
+
+        # merge the newest items of each collection, fetching a collection's
+        # next page only once its buffered items have all been taken
+        items: List[Dict[str, Any]] = []
+        try:
+            while len(items) < max_items:
+                empty = [c for c in streams if not buffers[c]]
+                if empty:
+                    await asyncio.gather(*(refill(c) for c in empty))
+                candidates = [c for c in buffers if buffers[c]]
+                if not candidates:
+                    break
+                newest = max(candidates, key=lambda c: _sort_key(buffers[c][0]))
+                items.append(buffers[newest].pop(0))
+        finally:
+            for stream in streams.values():
+                await stream.aclose()
+        return items
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_async_search: Optional[AsyncStacSearch] = None
+
+
+def get_async_search() -> AsyncStacSearch:
+    """The process-wide async STAC search client"""
+    global _async_search
+    if _async_search is None:
+        _async_search = AsyncStacSearch()
+    return _async_search
+
+
+async def close_async_search() -> None:
+    global _async_search
+    if _async_search is not None:
+        await _async_search.close()
+        _async_search = None
+
+
+async def _search_url(catalog_url: str) -> str:
+    client = await get_stac_client(catalog_url)
+    link = client.get_single_link("search")
+    return link.href if link else f"{catalog_url.rstrip('/')}/search"
+
+
+async def search_items(
+    catalog_url: str, params: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Run item search params, as passed to pystac-client, with AsyncStacSearch"""
+    search_url = await _search_url(catalog_url)
+    return await get_async_search().search(
+        search_url,
+        params["collections"],
+        max_items=params.get("max_items") or 20,
+        datetime=params.get("datetime"),
+        intersects=params.get("intersects"),
+        filter=params.get("filter"),
+    )
+
+
+async def stream_item_pages(
+    catalog_url: str, params: Dict[str, Any]
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    The items of search params page by page, up to `max_items`.
+
+    Like pystac-client, this is one search over all the collections, in the
+    order of the API, so every page can be passed on as soon as it arrives.
+    """
+    search = get_async_search()
+    max_items = params.get("max_items") or 20
+    body = search.search_body(
+        max_items,
+        params.get("datetime"),
+        params.get("intersects"),
+        params.get("filter"),
+    )
+    if params.get("collections"):
+        body["collections"] = params["collections"]
+    pages = search.pages(await _search_url(catalog_url), body)
+    count = 0
+    try:
+        async for page in pages:
+            items = page.get("features", [])[: max_items - count]
+            count += len(items)
+            yield items
+            if count >= max_items:
+                break
+    finally:
+        await pages.aclose()
@@ -3,18 +3,452 @@ Caching module for STAC Natural Query - handles various caching strategies
 """
 
 import asyncio
+import base64
+import dataclasses
+import hashlib
+import importlib
+import json
 import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
 from functools import wraps
+from typing import Any, Dict, Hashable, List
 
+import numpy as np
 from cachetools.keys import hashkey
 from cachetools import TTLCache
+from pydantic import BaseModel
+
+from stac_search.timing import stage_timer
 
 logger = logging.getLogger(__name__)
 
+# "memory" keeps a TTLCache per worker, "sqlite" shares a SQLite file between
+# the workers of a host and "redis" shares a Redis-protocol server between pods
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+# where each shared backend keeps its data unless CACHE_URL is set
+CACHE_URL_DEFAULTS = {
+    "sqlite": os.path.join(
+        os.environ.get("DATA_PATH", "data/chromadb"), "cache.sqlite"
+    ),
+    "redis": "redis://localhost:6379/0",
+}
+
+
+def _cache_url(backend: str) -> str | None:
+    """The SQLite file path or redis:// URL of a shared backend"""
+    return os.environ.get("CACHE_URL") or CACHE_URL_DEFAULTS.get(backend)
+
+
+CACHE_URL = _cache_url(CACHE_BACKEND)
+
+# Semantic cache for LLM rerank results, off unless enabled
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "false") == "true"
+# minimum cosine similarity between query embeddings to reuse a result
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAXSIZE = int(os.environ.get("SEMANTIC_CACHE_MAXSIZE", "1000"))
+
+# returned by CacheBackend.get on a miss, since None is a valid cached value
+MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    """Counters for a single cache"""
+
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+
+
+# Serialization for the shared backends. Values are encoded as JSON with
+# tagged objects for dataclasses, pydantic models and numpy arrays; only
+# classes defined in this package are ever instantiated when decoding.
+
+
+def _class_path(cls) -> str:
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def _load_class(path: str):
+    module_name, _, qualname = path.partition(":")
+    if module_name != "stac_search" and not module_name.startswith("stac_search."):
+        raise ValueError(f"Refusing to decode cached value of type {path}")
+    obj = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def encode_value(value) -> Any:
+    """Encode a cached value into JSON-compatible data"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.ndarray):
+        return {
+            "__ndarray__": base64.b64encode(np.ascontiguousarray(value)).decode(),
+            "dtype": str(value.dtype),
+            "shape": list(value.shape),
+        }
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, BaseModel):
+        return {
+            "__model__": _class_path(type(value)),
+            "data": value.model_dump(mode="json"),
+        }
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {
+            "__dataclass__": _class_path(type(value)),
+            "fields": {
+                f.name: encode_value(getattr(value, f.name))
+                for f in dataclasses.fields(value)
+            },
+        }
+    if isinstance(value, (list, tuple)):
+        return [encode_value(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): encode_value(v) for k, v in value.items()}
+    raise TypeError(f"Cannot cache values of type {type(value).__name__}")
+
+
+def decode_value(data) -> Any:
+    """Inverse of encode_value"""
+    if isinstance(data, list):
+        return [decode_value(v) for v in data]
+    if not isinstance(data, dict):
+        return data
+    if "__ndarray__" in data:
+        array = np.frombuffer(base64.b64decode(data["__ndarray__"]), data["dtype"])
+        return array.reshape(data["shape"]).copy()
+    if "__model__" in data:
+        return _load_class(data["__model__"]).model_validate(data["data"])
+    if "__dataclass__" in data:
+        cls = _load_class(data["__dataclass__"])
+        if not dataclasses.is_dataclass(cls):
+            raise ValueError(f"{data['__dataclass__']} is not a dataclass")
+        return cls(**{k: decode_value(v) for k, v in data["fields"].items()})
+    return {k: decode_value(v) for k, v in data.items()}
+
+
+def _canonical(obj) -> Any:
+    """Deterministic JSON-compatible form of a frozen cache key"""
+    if isinstance(obj, (frozenset, set)):
+        return {"__set__": sorted(json.dumps(_canonical(v)) for v in obj)}
+    if isinstance(obj, (tuple, list)):
+        return [_canonical(v) for v in obj]
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    return repr(obj)
+
+
+def stable_key(name: str, key) -> str:
+    """Key that is the same in every process, for the shared backends"""
+    digest = hashlib.sha256(json.dumps(_canonical(key)).encode()).hexdigest()
+    return f"stac_search:{name}:{digest}"
+
+
+class CacheBackend(ABC):
+    """Interface of the storage behind async_cached"""
+
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    @abstractmethod
+    async def get(self, key) -> Any:
+        """Get a cached value, or MISSING"""
+
+    @abstractmethod
+    async def set(self, key, value) -> None:
+        """Store a value"""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Remove every value of this cache"""
+
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process TTLCache.
+
+    With `serialize`, values are round-tripped through the same encoding as
+    the shared backends, which makes it a local stand-in for them in tests.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, serialize: bool = False):
+        super().__init__(name, ttl)
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.serialize = serialize
+
+    async def get(self, key) -> Any:
+        value = self.cache.get(key, MISSING)
+        if self.serialize and value is not MISSING:
+            value = decode_value(json.loads(value))
+        return value
+
+    async def set(self, key, value) -> None:
+        if self.serialize:
+            value = json.dumps(encode_value(value))
+        self.cache[key] = value
+
+    async def clear(self) -> None:
+        self.cache.clear()
+
+
+class SQLiteBackend(CacheBackend):
+    """Cache in a SQLite file, shared by the workers of a host"""
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        ttl: float,
+        path: str = CACHE_URL_DEFAULTS["sqlite"],
+    ):
+        super().__init__(name, ttl)
+        self.maxsize = maxsize
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, name TEXT, value TEXT, expires REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_name ON cache (name)")
+
+    def _get(self, key: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires > ?",
+                (key, time.time()),
+            ).fetchone()
+        return MISSING if row is None else decode_value(json.loads(row[0]))
+
+    def _set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (key, self.name, value, now + self.ttl),
+            )
+            # drop expired entries, then the ones closest to expiry over maxsize
+            self._db.execute(
+                "DELETE FROM cache WHERE name = ? AND (expires <= ? OR key IN "
+                "(SELECT key FROM cache WHERE name = ? ORDER BY expires DESC "
+                "LIMIT -1 OFFSET ?))",
+                (self.name, now, self.name, self.maxsize),
+            )
+
+    async def get(self, key) -> Any:
+        return await asyncio.to_thread(self._get, stable_key(self.name, key))
+
+    async def set(self, key, value) -> None:
+        value = json.dumps(encode_value(value))
+        await asyncio.to_thread(self._set, stable_key(self.name, key), value)
+
+    async def clear(self) -> None:
+        def _clear():
+            with self._lock:
+                self._db.execute("DELETE FROM cache WHERE name = ?", (self.name,))
+
+        await asyncio.to_thread(_clear)
 
-geocoding_cache = TTLCache(maxsize=100, ttl=86400)  # 24 hours - locations don't change
-embedding_cache = TTLCache(maxsize=100, ttl=86400)  # 24 hours - embeddings are stable
-agent_cache = TTLCache(maxsize=100, ttl=3600)  # 1 hour - agent results cache
+
+class RedisBackend(CacheBackend):
+    """Cache in a Redis-protocol server (Redis, Valkey, ...), shared across pods"""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        url: str = CACHE_URL_DEFAULTS["redis"],
+        client=None,
+    ):
+        super().__init__(name, ttl)
+        if client is None:
+            # redis is an optional dependency, only needed for this backend
+            import redis.asyncio
+
+            client = redis.asyncio.from_url(url)
+        self.client = client
+
+    async def get(self, key) -> Any:
+        value = await self.client.get(stable_key(self.name, key))
+        return MISSING if value is None else decode_value(json.loads(value))
+
+    async def set(self, key, value) -> None:
+        value = json.dumps(encode_value(value))
+        await self.client.set(stable_key(self.name, key), value, ex=int(self.ttl))
+
+    async def clear(self) -> None:
+        async for key in self.client.scan_iter(match=f"stac_search:{self.name}:*"):
+            await self.client.delete(key)
+
+
+def make_cache(name: str, maxsize: int, ttl: float) -> CacheBackend:
+    """Create a cache using the configured CACHE_BACKEND"""
+    if CACHE_BACKEND == "memory":
+        return MemoryBackend(name, maxsize=maxsize, ttl=ttl)
+    if CACHE_BACKEND == "sqlite":
+        return SQLiteBackend(name, maxsize=maxsize, ttl=ttl, path=CACHE_URL)
+    if CACHE_BACKEND == "redis":
+        return RedisBackend(name, ttl=ttl, url=CACHE_URL)
+    raise ValueError(f"Unknown cache backend {CACHE_BACKEND!r}")
+
+
+# 24 hours - locations don't change
+geocoding_cache = make_cache("geocoding", maxsize=100, ttl=86400)
+# 24 hours - embeddings are stable
+embedding_cache = make_cache("embedding", maxsize=100, ttl=86400)
+# 1 hour - agent results cache
+agent_cache = make_cache("agent", maxsize=100, ttl=3600)
+# 24 hours - simplified AOIs per location
+aoi_cache = make_cache("aoi", maxsize=100, ttl=86400)
+
+CACHES = {
+    "geocoding": geocoding_cache,
+    "embedding": embedding_cache,
+    "agent": agent_cache,
+    "aoi": aoi_cache,
+}
+
+# upper bounds of the buckets for the best similarity seen by each lookup
+SIMILARITY_BUCKETS = (0.5, 0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0)
+
+
+@dataclass
+class SemanticCacheStats:
+    """Counters for a SemanticCache"""
+
+    hits: int = 0
+    misses: int = 0
+    # lookups by best similarity bucket, hits and misses alike, so the
+    # threshold can be tuned against the observed distribution
+    similarity: Dict[str, int] = field(
+        default_factory=lambda: {f"le_{b}": 0 for b in SIMILARITY_BUCKETS}
+    )
+
+
+class SemanticCache:
+    """
+    Bounded cache that reuses values for near-duplicate queries.
+
+    Values are stored under a query embedding and an exact context key (e.g.
+    the candidate collections a rerank was run on). A lookup with the same
+    context returns the value of the most similar stored query if its cosine
+    similarity is at least `threshold`. Least recently used entries are
+    evicted beyond `maxsize`, and entries expire after `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = SEMANTIC_CACHE_MAXSIZE,
+        ttl: float = 3600,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        enabled: bool = SEMANTIC_CACHE_ENABLED,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.enabled = enabled
+        self.stats = SemanticCacheStats()
+        # entry id -> (context, normalized embedding, value, expiry time)
+        self._entries: OrderedDict = OrderedDict()
+        self._by_context: Dict[Hashable, List[int]] = {}
+        self._next_id = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+
+    def _remove(self, entry_id: int) -> None:
+        context = self._entries.pop(entry_id)[0]
+        self._by_context[context].remove(entry_id)
+        if not self._by_context[context]:
+            del self._by_context[context]
+
+    def lookup(self, embedding, context: Hashable) -> Any:
+        """Get the value for the most similar query with this context, or MISSING"""
+        now = time.time()
+        query = self._normalize(embedding)
+        best_id, best_similarity = None, -1.0
+        for entry_id in list(self._by_context.get(context, [])):
+            _, vector, _, expires = self._entries[entry_id]
+            if expires <= now:
+                self._remove(entry_id)
+                continue
+            similarity = float(vector @ query)
+            if similarity > best_similarity:
+                best_id, best_similarity = entry_id, similarity
+
+        bucket = next(
+            (b for b in SIMILARITY_BUCKETS if best_similarity <= b),
+            SIMILARITY_BUCKETS[-1],
+        )
+        if best_id is not None:
+            self.stats.similarity[f"le_{bucket}"] += 1
+        if best_id is None or best_similarity < self.threshold:
+            self.stats.misses += 1
+            return MISSING
+        self.stats.hits += 1
+        self._entries.move_to_end(best_id)
+        logger.info(f"{self.name} semantic cache hit, similarity {best_similarity:.4f}")
+        return self._entries[best_id][2]
+
+    def store(self, embedding, context: Hashable, value) -> None:
+        """Store a value for a query embedding and context"""
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (
+            context,
+            self._normalize(embedding),
+            value,
+            time.time() + self.ttl,
+        )
+        self._by_context.setdefault(context, []).append(entry_id)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_context.clear()
+
+
+# 1 hour, like the agent cache
+rerank_semantic_cache = SemanticCache("rerank", ttl=3600)
+
+
+def get_cache_stats(cache: CacheBackend) -> CacheStats:
+    """Get the counters for a cache"""
+    return cache.stats
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of the counters for all named caches"""
+    stats = {name: asdict(cache.stats) for name, cache in CACHES.items()}
+    stats["semantic_rerank"] = {
+        "enabled": rerank_semantic_cache.enabled,
+        "threshold": rerank_semantic_cache.threshold,
+        "size": len(rerank_semantic_cache),
+        **asdict(rerank_semantic_cache.stats),
+    }
+    return stats
 
 
 def _freeze(obj):
@@ -28,35 +462,89 @@ def _freeze(obj):
     return obj  # assume primitive (int, str, etc.)
 
 
-def async_cached(cache):
-    lock = asyncio.Lock()
+def async_cached(cache: CacheBackend, key=None):
+    """
+    Cache the results of a coroutine function in `cache`.
+
+    `key` optionally maps the call arguments to the cache key; by default all
+    arguments are frozen and used as the key.
+
+    Misses are single-flight per key: concurrent callers with the same key
+    await one shared task, while different keys run in parallel. The task is
+    owned by the cache rather than by the first caller, so a cancelled caller
+    does not cancel the computation for the others. Failed or cancelled
+    computations are never stored. Errors from the cache backend are logged
+    and treated as misses.
+    """
+    stats = cache.stats
+    in_flight: Dict[tuple, asyncio.Task] = {}
 
     def decorator(fn):
+        async def _fill(cache_key, args, kwargs):
+            result = await fn(*args, **kwargs)
+            try:
+                await cache.set(cache_key, result)
+            except Exception as e:
+                logger.warning(f"Error writing to {cache.name} cache: {e}")
+            return result
+
+        def _done(cache_key, task):
+            if in_flight.get(cache_key) is task:
+                del in_flight[cache_key]
+            # mark the exception as retrieved when every waiter went away
+            if not task.cancelled():
+                task.exception()
+
         @wraps(fn)
         async def wrapper(*args, **kwargs):
-            # freeze each arg/kwarg
-            fargs = tuple(_freeze(a) for a in args)
-            fkwargs = {k: _freeze(v) for k, v in kwargs.items()}
-            key = hashkey(f"{fn.__name__}", *fargs, **fkwargs)
-            if key in cache:
-                return cache[key]
-            async with lock:
-                if key in cache:
-                    return cache[key]
-                result = await fn(*args, **kwargs)
-                cache[key] = result
-                return result
+            if key is None:
+                # freeze each arg/kwarg
+                fargs = tuple(_freeze(a) for a in args)
+                fkwargs = {k: _freeze(v) for k, v in kwargs.items()}
+                cache_key = hashkey(f"{fn.__name__}", *fargs, **fkwargs)
+            else:
+                cache_key = hashkey(f"{fn.__name__}", key(*args, **kwargs))
+
+            task = in_flight.get(cache_key)
+            if task is None:
+                try:
+                    with stage_timer(f"cache.{cache.name}"):
+                        cached = await cache.get(cache_key)
+                except Exception as e:
+                    logger.warning(f"Error reading from {cache.name} cache: {e}")
+                    cached = MISSING
+                if cached is not MISSING:
+                    stats.hits += 1
+                    return cached
+                # another caller may have started the task while we awaited
+                task = in_flight.get(cache_key)
+
+            if task is None:
+                stats.misses += 1
+                task = asyncio.ensure_future(_fill(cache_key, args, kwargs))
+                in_flight[cache_key] = task
+                task.add_done_callback(lambda t: _done(cache_key, t))
+            else:
+                stats.coalesced += 1
+            return await asyncio.shield(task)
 
         return wrapper
 
     return decorator
 
 
-def clear_all_caches():
+async def aclear_all_caches():
     """
     Clear all caches
     """
     logger.info("Clearing all caches")
-    geocoding_cache.clear()
-    embedding_cache.clear()
-    agent_cache.clear()
+    for cache in CACHES.values():
+        await cache.clear()
+    rerank_semantic_cache.clear()
+
+
+def clear_all_caches():
+    """
+    Clear all caches, from synchronous code outside of an event loop
+    """
+    asyncio.run(aclear_all_caches())
@@ -6,72 +6,122 @@ import asyncio
 import hashlib
 import logging
 import os
-from typing import Optional, Dict, Any
-import chromadb
+import threading
+import time
+from typing import Optional, Dict, Any, Tuple, TYPE_CHECKING
+import numpy as np
 from pystac_client import Client
-from sentence_transformers import SentenceTransformer
-
-from stac_search.cache import async_cached, embedding_cache
 
+from stac_search.embedding_store import EmbeddingStore
+from stac_search.extent_index import ExtentIndex, collection_extent
+from stac_search.lexical import BM25Index
+from stac_search.embeddings import (
+    EMBEDDING_BACKEND,
+    MODEL_NAME,
+    EmbeddingBatcher,
+    get_model,
+    model_id,
+)
+from stac_search.registry import CatalogRegistry
+from stac_search.stac_client import get_stac_client
+from stac_search.timing import stage_timer
 
 logger = logging.getLogger(__name__)
 
+if TYPE_CHECKING:
+    import chromadb
+
 # Constants
-MODEL_NAME = "all-MiniLM-L6-v2"
 DATA_PATH = os.environ.get("DATA_PATH", "data/chromadb")
-MODEL = SentenceTransformer(MODEL_NAME)
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH")
 
 
 class CatalogManager:
     """Manages STAC catalog indexing and retrieval operations"""
 
-    def __init__(self, data_path: str = DATA_PATH, model_name: str = MODEL_NAME):
+    def __init__(
+        self,
+        data_path: str = DATA_PATH,
+        model_name: str = MODEL_NAME,
+        backend: str = EMBEDDING_BACKEND,
+    ):
         self.data_path = data_path
         self.model_name = model_name
+        self.backend = backend
+        self.model_id = model_id(model_name, backend)
+        # chromadb is imported lazily to keep the package import cheap
+        import chromadb
+
         self.client = chromadb.PersistentClient(path=data_path)
+        # ChromaDB collection names, keyed by catalog URL
+        self._collection_names: Dict[str, str] = {}
+        # open ChromaDB collection handles, keyed by collection name
+        self._collections: Dict[str, "chromadb.Collection"] = {}
+        # BM25 indexes, keyed by collection name
+        self._lexical: Dict[str, BM25Index] = {}
+        # spatial/temporal extent indexes, keyed by collection name
+        self._extents: Dict[str, ExtentIndex] = {}
+        self.registry = CatalogRegistry(data_path)
+        self.embedding_store = EmbeddingStore(
+            EMBEDDING_CACHE_PATH or os.path.join(data_path, "embeddings"),
+            self.model_id,
+        )
+        # coalesces concurrent single-query encodes into one model call
+        self.batcher = EmbeddingBatcher(lambda texts: self.model.encode(texts))
 
     @property
     def model(self):
-        return MODEL
+        return get_model(self.model_name, self.backend)
 
-    def _get_catalog_name(self, catalog_url: str) -> str:
+    def _get_catalog_name(self, catalog_url: str, keep_colons: bool = False) -> str:
         """Generate a unique catalog name from URL"""
-        logger.info(f"Generating catalog name for {catalog_url}")
+        logger.debug(f"Generating catalog name for {catalog_url}")
         # Create a hash of the URL for consistent naming
         url_hash = hashlib.md5(catalog_url.encode()).hexdigest()[:8]
         # Clean URL for readability
         clean_url = catalog_url.replace("https://", "").replace("http://", "")
         clean_url = clean_url.replace("/", "_").replace(".", "_")
+        if not keep_colons:
+            clean_url = clean_url.replace(":", "_")
         return f"{clean_url}_{url_hash}"
 
     def _get_collection_name(self, catalog_url: str) -> str:
         """Get ChromaDB collection name for a catalog"""
-        catalog_name = self._get_catalog_name(catalog_url)
-        return f"{catalog_name}_collections"
+        if catalog_url in self._collection_names:
+            return self._collection_names[catalog_url]
+        name = f"{self._get_catalog_name(catalog_url)}_collections"
+        # catalogs with a port were indexed under a name keeping its ":"; keep
+        # using such a collection rather than indexing the catalog again
+        legacy_name = (
+            f"{self._get_catalog_name(catalog_url, keep_colons=True)}_collections"
+        )
+        if legacy_name != name:
+            try:
+                self.client.get_collection(name=legacy_name)
+                name = legacy_name
+            except Exception:
+                pass
+        self._collection_names[catalog_url] = name
+        return name
 
     def catalog_exists(self, catalog_url: str) -> bool:
         """Check if a catalog is already indexed in the vector database"""
         collection_name = self._get_collection_name(catalog_url)
+        if collection_name in self._collections:
+            return True
         try:
-            existing_collections = self.client.list_collections()
-            print(f"Existing collections: {[col.name for col in existing_collections]}")
-            print(f"Checking for collection: {collection_name}")
-            return any(col.name == collection_name for col in existing_collections)
-        except Exception as e:
-            logger.error(f"Error checking catalog existence: {e}")
+            collection = self.client.get_collection(name=collection_name)
+        except Exception:
             return False
+        self._collections[collection_name] = collection
+        return True
 
     async def validate_catalog_url(self, catalog_url: str) -> bool:
         """Validate that the catalog URL is accessible and is a valid STAC catalog"""
         try:
-
-            def _validate():
-                stac_client = Client.open(catalog_url)
-                # Try to get at least one collection to verify it's a valid catalog
-                collections = list(stac_client.collection_search().collections())
-                return len(collections) > 0
-
-            return await asyncio.to_thread(_validate)
+            # Opening the client only fetches the landing page
+            await get_stac_client(catalog_url)
+            return True
         except Exception as e:
             logger.error(f"Invalid catalog URL {catalog_url}: {e}")
             return False
@@ -89,44 +139,163 @@ class CatalogManager:
             logger.error(f"Error fetching collections: {e}")
             return []
 
-    @async_cached(embedding_cache)
-    async def generate_embeddings(self, collections: list) -> list:
+    @staticmethod
+    def _collection_text(collection) -> str:
+        """Text that gets embedded for a collection (title + description)"""
+        title = getattr(collection, "title", "") or ""
+        description = getattr(collection, "description", "") or ""
+        return f"{title} {description}"
+
+    @staticmethod
+    def _content_hash(text: str) -> str:
+        """Hash of the embedded text, used to detect changed collections"""
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    async def encode(self, texts: list) -> np.ndarray:
+        """Embed texts, only running the model for texts not in the embedding store"""
+        with stage_timer("embedding_store"):
+            cached = await asyncio.to_thread(self.embedding_store.get_many, texts)
+        missing = [text for text, vector in zip(texts, cached) if vector is None]
+        if missing:
+            # dedupe so repeated texts are only encoded once
+            missing = list(dict.fromkeys(missing))
+            with stage_timer("embedding"):
+                if len(missing) == 1:
+                    vectors = [await self.batcher.encode(missing[0])]
+                else:
+                    vectors = await asyncio.to_thread(self.model.encode, missing)
+            await asyncio.to_thread(self.embedding_store.put_many, missing, vectors)
+            encoded = dict(zip(missing, vectors))
+            cached = [
+                encoded[text] if vector is None else vector
+                for text, vector in zip(texts, cached)
+            ]
+        logger.debug(f"Encoded {len(missing)} of {len(texts)} texts")
+        return np.asarray(cached, dtype=np.float32)
+
+    async def generate_embeddings(self, collections: list) -> np.ndarray:
         """Generate embeddings for each collection (title + description)"""
-        texts = []
-        for collection in collections:
-            title = getattr(collection, "title", "") or ""
-            description = getattr(collection, "description", "") or ""
-            texts.append(f"{title} {description}")
-
-        embeddings = await asyncio.to_thread(self.model.encode, texts)
-        return embeddings
-
-    async def store_in_vector_db(self, collections: list, chroma_collection) -> None:
-        """Store embeddings in ChromaDB"""
+        texts = [self._collection_text(collection) for collection in collections]
+        return await self.encode(texts)
+
+    async def store_in_vector_db(
+        self, collections: list, chroma_collection
+    ) -> Dict[str, int]:
+        """
+        Store embeddings in ChromaDB, keyed by STAC collection id.
+
+        Only collections that are new or whose embedded text changed are
+        embedded and upserted; collections no longer in the catalog are deleted.
+        """
         if not collections:
             logger.warning("No collections to store")
-            return
+            return {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+
+        # last one wins if a catalog lists the same collection id twice
+        by_id = {
+            getattr(collection, "id", ""): collection for collection in collections
+        }
+
+        existing = await asyncio.to_thread(chroma_collection.get, include=["metadatas"])
+        existing_hashes = {
+            id_: (metadata or {}).get("content_hash")
+            for id_, metadata in zip(existing["ids"], existing["metadatas"])
+        }
 
+        changed = []
         metadatas = []
-        for collection in collections:
-            metadata = {
-                "title": getattr(collection, "title", "") or "",
-                "description": getattr(collection, "description", "") or "",
-                "collection_id": getattr(collection, "id", ""),
-            }
-            metadatas.append(metadata)
+        added = updated = 0
+        for collection_id, collection in by_id.items():
+            content_hash = self._content_hash(self._collection_text(collection))
+            if existing_hashes.get(collection_id) == content_hash:
+                continue
+            if collection_id in existing_hashes:
+                updated += 1
+            else:
+                added += 1
+            changed.append(collection)
+            metadatas.append(
+                {
+                    "title": getattr(collection, "title", "") or "",
+                    "description": getattr(collection, "description", "") or "",
+                    "collection_id": collection_id,
+                    "content_hash": content_hash,
+                }
+            )
 
-        embeddings = await self.generate_embeddings(collections)
+        if changed:
+            embeddings = await self.generate_embeddings(changed)
+            await asyncio.to_thread(
+                chroma_collection.upsert,
+                ids=[metadata["collection_id"] for metadata in metadatas],
+                embeddings=embeddings,
+                metadatas=metadatas,
+            )
 
+        removed = [id_ for id_ in existing_hashes if id_ not in by_id]
+        if removed:
+            await asyncio.to_thread(chroma_collection.delete, ids=removed)
+
+        # the lexical index is cheap to build, so it is always rebuilt in full
+        lexical_index = BM25Index(
+            [
+                {
+                    "collection_id": collection_id,
+                    "title": getattr(collection, "title", "") or "",
+                    "description": getattr(collection, "description", "") or "",
+                    "keywords": list(getattr(collection, "keywords", None) or []),
+                }
+                for collection_id, collection in by_id.items()
+            ]
+        )
         await asyncio.to_thread(
-            chroma_collection.add,
-            ids=[str(i) for i in range(len(collections))],
-            embeddings=embeddings,
-            metadatas=metadatas,
+            lexical_index.save, self._lexical_path(chroma_collection.name)
         )
+        self._lexical[chroma_collection.name] = lexical_index
+
+        extent_index = ExtentIndex(
+            {
+                collection_id: collection_extent(collection)
+                for collection_id, collection in by_id.items()
+            }
+        )
+        await asyncio.to_thread(
+            extent_index.save, self._extent_path(chroma_collection.name)
+        )
+        self._extents[chroma_collection.name] = extent_index
+
+        stats = {
+            "added": added,
+            "updated": updated,
+            "deleted": len(removed),
+            "unchanged": len(by_id) - len(changed),
+        }
+        logger.info(f"Stored collections in {chroma_collection.name}: {stats}")
+        return stats
+
+    def _lexical_path(self, collection_name: str) -> str:
+        return os.path.join(self.data_path, "lexical", f"{collection_name}.json")
+
+    def _extent_path(self, collection_name: str) -> str:
+        return os.path.join(self.data_path, "extents", f"{collection_name}.json")
+
+    async def load_catalog(
+        self, catalog_url: str, refresh: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Load and index a catalog if it doesn't exist.
+
+        With `refresh`, an already indexed catalog is re-fetched and only new,
+        changed or removed collections are written to the vector database.
+        """
+        catalog_name = self._get_catalog_name(catalog_url)
+        if not refresh and self.registry.is_fresh(catalog_url):
+            return {
+                "success": True,
+                "message": "Catalog already indexed",
+                "catalog_name": catalog_name,
+            }
 
-    async def load_catalog(self, catalog_url: str) -> Dict[str, Any]:
-        """Load and index a catalog if it doesn't exist"""
         try:
             # Validate catalog URL first
             if not await self.validate_catalog_url(catalog_url):
@@ -136,17 +305,22 @@ class CatalogManager:
                 }
 
             # Check if catalog already exists
-            if self.catalog_exists(catalog_url):
+            if not refresh and self.catalog_exists(catalog_url):
                 logger.info(f"Catalog {catalog_url} already indexed")
+                self.registry.record(
+                    catalog_url,
+                    collection_name=self._get_collection_name(catalog_url),
+                    validated_at=time.time(),
+                )
                 return {
                     "success": True,
-                    "message": f"Catalog already indexed",
-                    "catalog_name": self._get_catalog_name(catalog_url),
+                    "message": "Catalog already indexed",
+                    "catalog_name": catalog_name,
                 }
 
             # Load the catalog
             logger.info(f"Loading catalog from {catalog_url}")
-            stac_client = await asyncio.to_thread(Client.open, catalog_url)
+            stac_client = await get_stac_client(catalog_url)
             collections = await self.fetch_collections(stac_client)
 
             if not collections:
@@ -160,18 +334,28 @@ class CatalogManager:
             chroma_collection = self.client.create_collection(
                 name=collection_name, get_or_create=True
             )
+            self._collections[collection_name] = chroma_collection
 
             # Store in vector database
-            await self.store_in_vector_db(collections, chroma_collection)
+            stats = await self.store_in_vector_db(collections, chroma_collection)
 
             logger.info(
                 f"Successfully indexed {len(collections)} collections from {catalog_url}"
             )
+            now = time.time()
+            self.registry.record(
+                catalog_url,
+                collection_name=collection_name,
+                collections_count=len(collections),
+                indexed_at=now,
+                validated_at=now,
+            )
             return {
                 "success": True,
                 "message": f"Successfully indexed {len(collections)} collections",
-                "catalog_name": self._get_catalog_name(catalog_url),
+                "catalog_name": catalog_name,
                 "collections_count": len(collections),
+                **stats,
             }
 
         except Exception as e:
@@ -180,15 +364,110 @@ class CatalogManager:
 
     def get_catalog_collection(
         self, catalog_url: Optional[str] = None
-    ) -> chromadb.Collection:
+    ) -> "chromadb.Collection":
         """Get the ChromaDB collection for a catalog"""
         if not catalog_url:
             catalog_url = os.environ.get("STAC_CATALOG_URL")
 
         collection_name = self._get_collection_name(catalog_url)
+        if collection_name in self._collections:
+            return self._collections[collection_name]
 
         try:
-            return self.client.get_collection(name=collection_name)
+            collection = self.client.get_collection(name=collection_name)
         except Exception as e:
             logger.error(f"Error getting collection {collection_name}: {e}")
             raise
+        self._collections[collection_name] = collection
+        return collection
+
+    def get_lexical_index(self, catalog_url: Optional[str] = None) -> BM25Index:
+        """
+        Get the BM25 index for a catalog.
+
+        Catalogs indexed before lexical indexes existed get one built from the
+        metadata stored in ChromaDB, without keywords, on first use.
+        """
+        if not catalog_url:
+            catalog_url = os.environ.get("STAC_CATALOG_URL")
+
+        collection_name = self._get_collection_name(catalog_url)
+        if collection_name in self._lexical:
+            return self._lexical[collection_name]
+
+        path = self._lexical_path(collection_name)
+        if os.path.exists(path):
+            lexical_index = BM25Index.load(path)
+        else:
+            logger.info(f"Building lexical index for {collection_name}")
+            stored = self.get_catalog_collection(catalog_url).get(include=["metadatas"])
+            lexical_index = BM25Index(
+                [
+                    {
+                        "collection_id": metadata["collection_id"],
+                        "title": metadata.get("title", ""),
+                        "description": metadata.get("description", ""),
+                    }
+                    for metadata in stored["metadatas"]
+                ]
+            )
+            lexical_index.save(path)
+        self._lexical[collection_name] = lexical_index
+        return lexical_index
+
+    def get_extent_index(
+        self, catalog_url: Optional[str] = None
+    ) -> Optional[ExtentIndex]:
+        """
+        Get the extent index for a catalog.
+
+        Returns None if the catalog has not been (re-)indexed since extent
+        indexes were introduced; run a refresh to build one.
+        """
+        if not catalog_url:
+            catalog_url = os.environ.get("STAC_CATALOG_URL")
+
+        collection_name = self._get_collection_name(catalog_url)
+        if collection_name not in self._extents:
+            path = self._extent_path(collection_name)
+            if not os.path.exists(path):
+                return None
+            self._extents[collection_name] = ExtentIndex.load(path)
+        return self._extents[collection_name]
+
+    def close(self) -> None:
+        """Release the pooled collection handles and the ChromaDB client"""
+        logger.info(f"Closing catalog manager for {self.data_path}")
+        self._collections.clear()
+        self._lexical.clear()
+        self._extents.clear()
+        self.embedding_store.close()
+        try:
+            self.client.clear_system_cache()
+        except Exception as e:
+            logger.warning(f"Error closing ChromaDB client: {e}")
+
+
+_catalog_managers: Dict[Tuple[str, str], CatalogManager] = {}
+_catalog_managers_lock = threading.Lock()
+
+
+def get_catalog_manager(
+    data_path: str = DATA_PATH, model_name: str = MODEL_NAME
+) -> CatalogManager:
+    """Get the process-wide CatalogManager for a data path and model"""
+    key = (data_path, model_name)
+    with _catalog_managers_lock:
+        if key not in _catalog_managers:
+            _catalog_managers[key] = CatalogManager(
+                data_path=data_path, model_name=model_name
+            )
+        return _catalog_managers[key]
+
+
+def close_catalog_managers() -> None:
+    """Close every process-wide CatalogManager"""
+    with _catalog_managers_lock:
+        for catalog_manager in _catalog_managers.values():
+            catalog_manager.close()
+        _catalog_managers.clear()
@@ -0,0 +1,215 @@
+"""
+Embedding store for STAC Natural Query - persistent, content-addressed embedding cache
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_MAX_ENTRIES = int(
+    os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "100000")
+)
+
+
+def text_key(text: str) -> str:
+    """Content address of a text"""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _tag(key: str) -> np.uint64:
+    """Non-zero 64-bit tag of a key, written next to its vector slot"""
+    return np.uint64(int(key[:16], 16) | 1)
+
+
+class EmbeddingStore:
+    """
+    Disk-backed embedding cache keyed by (model name, sha256 of text).
+
+    Vectors live in a fixed-size float32 memory-mapped file with one slot per
+    entry; a SQLite index maps keys to slots and tracks recency for LRU
+    eviction once all slots are used. Each slot also carries a tag derived
+    from its key, so a reader in another worker never returns a vector whose
+    slot was reused mid-read.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        model_name: str,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+    ):
+        self.path = os.path.join(path, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.model_name = model_name
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(self.path, "index.sqlite"),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER);
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, slot INTEGER UNIQUE, last_used REAL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            """
+        )
+        self._db.execute(
+            "INSERT OR IGNORE INTO meta VALUES ('capacity', ?)", (max_entries,)
+        )
+        self.capacity = self._get_meta("capacity")
+        if self.capacity != max_entries:
+            logger.warning(
+                f"Embedding store {self.path} was created with {self.capacity} "
+                f"slots, ignoring max_entries={max_entries}"
+            )
+        self.dim: Optional[int] = self._get_meta("dim")
+        self._vectors: Optional[np.memmap] = None
+        self._tags: Optional[np.memmap] = None
+
+    def _get_meta(self, name: str) -> Optional[int]:
+        row = self._db.execute("SELECT value FROM meta WHERE name = ?", (name,))
+        row = row.fetchone()
+        return row[0] if row else None
+
+    def _open_vectors(self, dim: int) -> None:
+        if self._vectors is not None:
+            return
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?)", (dim,))
+        self.dim = self._get_meta("dim")
+        vectors_path = os.path.join(self.path, "vectors.f32")
+        tags_path = os.path.join(self.path, "tags.u64")
+        mode = "r+" if os.path.exists(vectors_path) else "w+"
+        self._vectors = np.memmap(
+            vectors_path, dtype=np.float32, mode=mode, shape=(self.capacity, self.dim)
+        )
+        mode = "r+" if os.path.exists(tags_path) else "w+"
+        self._tags = np.memmap(
+            tags_path, dtype=np.uint64, mode=mode, shape=(self.capacity,)
+        )
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up cached vectors; missing texts come back as None"""
+        if self.dim is None:
+            # another worker may have stored the first vectors meanwhile
+            self.dim = self._get_meta("dim")
+        if not texts or self.dim is None:
+            return [None] * len(texts)
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            self._open_vectors(self.dim)
+            placeholders = ",".join("?" * len(keys))
+            rows = self._db.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", keys
+            ).fetchall()
+            slots = dict(rows)
+            results = []
+            for key in keys:
+                slot = slots.get(key)
+                if slot is None:
+                    results.append(None)
+                    continue
+                tag = self._tags[slot]
+                vector = np.array(self._vectors[slot])
+                if tag != _tag(key) or self._tags[slot] != tag:
+                    results.append(None)
+                    continue
+                results.append(vector)
+            if slots:
+                self._db.execute(
+                    f"UPDATE entries SET last_used = ? WHERE key IN ({placeholders})",
+                    [time.time(), *keys],
+                )
+        return results
+
+    def put_many(self, texts: List[str], vectors) -> None:
+        """Store vectors for texts, evicting the least recently used entries"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not texts:
+            return
+        # only the last `capacity` entries can be kept
+        keys = [text_key(text) for text in texts][-self.capacity :]
+        vectors = vectors[-self.capacity :]
+        with self._lock:
+            self._open_vectors(vectors.shape[1])
+            if vectors.shape[1] != self.dim:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match "
+                    f"store dimension {self.dim}"
+                )
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                placeholders = ",".join("?" * len(keys))
+                existing = dict(
+                    self._db.execute(
+                        f"SELECT key, slot FROM entries WHERE key IN ({placeholders})",
+                        keys,
+                    ).fetchall()
+                )
+                new_keys = list(dict.fromkeys(k for k in keys if k not in existing))
+                slots = self._allocate(len(new_keys))
+                existing.update(zip(new_keys, slots))
+                for key, vector in zip(keys, vectors):
+                    slot = existing[key]
+                    # invalidate, write, then re-tag the slot
+                    self._tags[slot] = 0
+                    self._vectors[slot] = vector
+                    self._tags[slot] = _tag(key)
+                self._vectors.flush()
+                self._tags.flush()
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                    [(key, existing[key], now) for key in dict.fromkeys(keys)],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _allocate(self, count: int) -> List[int]:
+        """Hand out free slots, evicting the least recently used entries if needed"""
+        if count == 0:
+            return []
+        next_slot = self._get_meta("next_slot") or 0
+        fresh = list(range(next_slot, min(next_slot + count, self.capacity)))
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('next_slot', ?)",
+            (next_slot + len(fresh),),
+        )
+        evict = count - len(fresh)
+        if evict == 0:
+            return fresh
+        rows = self._db.execute(
+            "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (evict,)
+        ).fetchall()
+        self._db.executemany(
+            "DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows]
+        )
+        logger.debug(f"Evicted {len(rows)} embeddings from {self.path}")
+        return fresh + [slot for _, slot in rows]
+
+    def close(self) -> None:
+        """Flush the vectors and close the index"""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._tags.flush()
+                self._vectors = self._tags = None
+            self._db.close()
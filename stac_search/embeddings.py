@@ -0,0 +1,221 @@
+"""
+Embedding model loading for STAC Natural Query
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# "torch" runs the model through PyTorch, "onnx" through ONNX Runtime and
+# "onnx-int8" through ONNX Runtime with the int8 quantized export of the model
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+ONNX_INT8_FILE_NAME = os.environ.get(
+    "ONNX_INT8_FILE_NAME", "onnx/model_qint8_avx2.onnx"
+)
+# minimum cosine similarity between a backend's vectors and the torch ones
+EMBEDDING_PARITY_TOLERANCE = float(os.environ.get("EMBEDDING_PARITY_TOLERANCE", "0.99"))
+# queries arriving within the window are encoded in one model call
+EMBEDDING_BATCH_WINDOW_MS = float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.environ.get("EMBEDDING_BATCH_MAX_SIZE", "32"))
+
+_models: Dict[Tuple[str, str], Any] = {}
+_models_lock = threading.Lock()
+_warm_models: Set[Tuple[str, str]] = set()
+
+
+def model_id(model_name: str = MODEL_NAME, backend: str = EMBEDDING_BACKEND) -> str:
+    """Identity of the vectors a model and backend produce, e.g. for cache keys"""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def _load_model(model_name: str, backend: str):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+    if backend == "onnx-int8":
+        return SentenceTransformer(
+            model_name,
+            backend="onnx",
+            model_kwargs={"file_name": ONNX_INT8_FILE_NAME},
+        )
+    raise ValueError(
+        f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}"
+    )
+
+
+def get_model(model_name: str = MODEL_NAME, backend: str = EMBEDDING_BACKEND):
+    """
+    Get the sentence transformer model, loading it on first use.
+
+    sentence_transformers (and torch) are imported here rather than at module
+    import, so importing the package stays cheap.
+    """
+    key = (model_name, backend)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _models_lock:
+        if key not in _models:
+            start_time = time.time()
+            _models[key] = _load_model(model_name, backend)
+            logger.info(
+                f"Loaded model {model_id(model_name, backend)} "
+                f"in {time.time() - start_time:.2f} seconds"
+            )
+        return _models[key]
+
+
+def get_cross_encoder(model_name: str):
+    """Get a sentence-transformers CrossEncoder, loading it on first use"""
+    key = (model_name, "cross-encoder")
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _models_lock:
+        if key not in _models:
+            start_time = time.time()
+            from sentence_transformers import CrossEncoder
+
+            _models[key] = CrossEncoder(model_name)
+            logger.info(
+                f"Loaded cross-encoder {model_name} "
+                f"in {time.time() - start_time:.2f} seconds"
+            )
+        return _models[key]
+
+
+def model_is_ready(
+    model_name: str = MODEL_NAME, backend: str = EMBEDDING_BACKEND
+) -> bool:
+    """Check if the model has been loaded and warmed up"""
+    return (model_name, backend) in _warm_models
+
+
+def warmup_model(model_name: str = MODEL_NAME, backend: str = EMBEDDING_BACKEND):
+    """Load the model and run a dummy encode so the first request is hot"""
+    get_model(model_name, backend).encode(["warmup"])
+    _warm_models.add((model_name, backend))
+    logger.info(f"Model {model_id(model_name, backend)} is warm")
+
+
+def check_parity(
+    texts: List[str],
+    model_name: str = MODEL_NAME,
+    backend: str = EMBEDDING_BACKEND,
+    tolerance: float = EMBEDDING_PARITY_TOLERANCE,
+) -> Dict[str, Any]:
+    """
+    Compare a backend's embeddings against the torch backend.
+
+    Passes when every text's vectors have a cosine similarity of at least
+    `tolerance`.
+    """
+    reference = get_model(model_name, "torch").encode(texts)
+    candidate = get_model(model_name, backend).encode(texts)
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosines = np.sum(reference * candidate, axis=1)
+    return {
+        "backend": backend,
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "tolerance": tolerance,
+        "passed": bool(cosines.min() >= tolerance),
+    }
+
+
+@dataclass
+class BatcherStats:
+    """Counters for an EmbeddingBatcher"""
+
+    batches: int = 0
+    texts: int = 0
+    max_batch_size: int = 0
+    # number of batches by size
+    batch_sizes: Dict[int, int] = field(default_factory=dict)
+    queue_wait_seconds_total: float = 0.0
+    queue_wait_seconds_max: float = 0.0
+
+
+class EmbeddingBatcher:
+    """
+    Collects texts submitted within a short window and encodes them together.
+
+    The first text of a batch opens a window of `window_ms`; the batch is
+    flushed when the window closes or when it reaches `max_batch_size`,
+    whichever comes first. One model call then serves every waiting caller.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+        max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+    ):
+        self._encode = encode
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.stats = BatcherStats()
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Embed a single text as part of the next batch"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        now = time.perf_counter()
+        waits = [now - enqueued_at for _, _, enqueued_at in batch]
+        stats = self.stats
+        stats.batches += 1
+        stats.texts += len(batch)
+        stats.max_batch_size = max(stats.max_batch_size, len(batch))
+        stats.batch_sizes[len(batch)] = stats.batch_sizes.get(len(batch), 0) + 1
+        stats.queue_wait_seconds_total += sum(waits)
+        stats.queue_wait_seconds_max = max(stats.queue_wait_seconds_max, *waits)
+
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            vectors = await asyncio.to_thread(self._encode, texts)
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        encoded = dict(zip(texts, vectors))
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(encoded[text])
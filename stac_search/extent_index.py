@@ -0,0 +1,144 @@
+"""
+Extent index for STAC Natural Query - prunes collections by spatial and temporal extent
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from shapely import STRtree, box
+from shapely.geometry import shape
+
+logger = logging.getLogger(__name__)
+
+# Extents are stored per collection as
+#   {"bbox": [minx, miny, maxx, maxy], "interval": [start, end]}
+# (or a 3D bbox [minx, miny, minz, maxx, maxy, maxz])
+# with ISO 8601 start/end, or None for open ends.
+Extent = Dict[str, Any]
+
+
+def _parse_instant(value: Optional[str], end: bool = False) -> Optional[float]:
+    """Timestamp of an ISO 8601 date or datetime, None for open ends"""
+    if value in (None, "", ".."):
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end and len(value) == 10:
+        # a date-only end includes the whole day, up to its last microsecond
+        parsed += timedelta(days=1, microseconds=-1)
+    return parsed.timestamp()
+
+
+def parse_datetime_range(
+    value: Optional[str],
+) -> Tuple[Optional[float], Optional[float]]:
+    """Parse a STAC API datetime parameter into (start, end) timestamps"""
+    if not value:
+        return None, None
+    if "/" in value:
+        start, end = value.split("/", 1)
+        return _parse_instant(start), _parse_instant(end, end=True)
+    return _parse_instant(value), _parse_instant(value, end=True)
+
+
+def _boxes(bbox: List[float]):
+    """Shapely boxes for a 2D or 3D bbox, split in two across the antimeridian"""
+    n = len(bbox) // 2
+    minx, miny, maxx, maxy = bbox[0], bbox[1], bbox[n], bbox[n + 1]
+    if minx > maxx:
+        return [box(minx, miny, 180, maxy), box(-180, miny, maxx, maxy)]
+    return [box(minx, miny, maxx, maxy)]
+
+
+class ExtentIndex:
+    """
+    Spatial (STRtree over bboxes) and temporal index of collection extents.
+
+    Collections the index knows nothing about are never pruned.
+    """
+
+    def __init__(self, extents: Dict[str, Extent]):
+        self.extents = extents
+        self._ids: List[str] = []
+        geometries = []
+        self._intervals: Dict[str, Tuple[Optional[float], Optional[float]]] = {}
+        for collection_id, extent in extents.items():
+            if extent.get("bbox"):
+                for geometry in _boxes(extent["bbox"]):
+                    self._ids.append(collection_id)
+                    geometries.append(geometry)
+            interval = extent.get("interval") or [None, None]
+            self._intervals[collection_id] = (
+                _parse_instant(interval[0]),
+                _parse_instant(interval[1], end=True),
+            )
+        self._tree = STRtree(geometries)
+
+    def covering(
+        self, geometry: Optional[Dict[str, Any]] = None, datetime: Optional[str] = None
+    ) -> List[str]:
+        """Ids of the indexed collections that can match the geometry and datetime"""
+        ids = list(self.extents)
+        if geometry:
+            hits = self._tree.query(shape(geometry), predicate="intersects")
+            spatial = {self._ids[i] for i in hits}
+            # collections without a bbox can't be ruled out
+            spatial |= {i for i in ids if not self.extents[i].get("bbox")}
+            ids = [i for i in ids if i in spatial]
+        if datetime:
+            start, end = parse_datetime_range(datetime)
+            ids = [i for i in ids if self._overlaps(i, start, end)]
+        return ids
+
+    def _overlaps(
+        self, collection_id: str, start: Optional[float], end: Optional[float]
+    ) -> bool:
+        interval_start, interval_end = self._intervals[collection_id]
+        if end is not None and interval_start is not None and end < interval_start:
+            return False
+        if start is not None and interval_end is not None and start > interval_end:
+            return False
+        return True
+
+    def prune(
+        self,
+        collection_ids: List[str],
+        geometry: Optional[Dict[str, Any]] = None,
+        datetime: Optional[str] = None,
+    ) -> List[str]:
+        """Drop the collections whose extent can't match the geometry and datetime"""
+        if not geometry and not datetime:
+            return collection_ids
+        covering = set(self.covering(geometry, datetime))
+        return [i for i in collection_ids if i in covering or i not in self.extents]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.extents, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ExtentIndex":
+        with open(path) as f:
+            return cls(json.load(f))
+
+
+def collection_extent(collection) -> Extent:
+    """Overall bbox and interval of a pystac Collection"""
+    extent = getattr(collection, "extent", None)
+    bbox = interval = None
+    try:
+        bbox = extent.spatial.bboxes[0]
+    except (AttributeError, IndexError, TypeError):
+        pass
+    try:
+        interval = [d.isoformat() if d else None for d in extent.temporal.intervals[0]]
+    except (AttributeError, IndexError, TypeError):
+        pass
+    return {"bbox": bbox, "interval": interval}
@@ -0,0 +1,288 @@
+"""
+Offline gazetteer for STAC Natural Query - resolves common place names without Geodini
+"""
+
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_ENABLED = os.environ.get("GAZETTEER_ENABLED", "true") == "true"
+# continents, countries, US states and large cities with simplified geometries,
+# built with scripts/build_gazetteer.py
+GAZETTEER_PATH = os.environ.get(
+    "GAZETTEER_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "gazetteer.json.gz"),
+)
+
+# words that introduce the location of a query
+SPATIAL_CUES = {
+    "over",
+    "in",
+    "of",
+    "for",
+    "across",
+    "covering",
+    "around",
+    "within",
+    "throughout",
+    "inside",
+    "at",
+}
+# a query naming one of these is about a smaller area than the place it
+# mentions ("lake tahoe in california", "northern california")
+FEATURE_WORDS = {
+    "lake",
+    "river",
+    "mount",
+    "mt",
+    "mountain",
+    "mountains",
+    "park",
+    "island",
+    "islands",
+    "bay",
+    "county",
+    "valley",
+    "desert",
+    "coast",
+    "peninsula",
+    "basin",
+    "delta",
+    "canyon",
+    "glacier",
+    "reef",
+    "region",
+    "province",
+    "district",
+    "border",
+    "near",
+    "north",
+    "south",
+    "east",
+    "west",
+    "northern",
+    "southern",
+    "eastern",
+    "western",
+    "central",
+    "downtown",
+    "suburbs",
+}
+KIND_WORDS = {"country": "country", "state": "state", "city": "city"}
+SEPARATORS = {",", "the"}
+
+_NON_WORD = re.compile(r"[^a-z0-9,]+")
+
+
+def normalize(text: str) -> List[str]:
+    """Lowercase ASCII words of a text, with commas as separate tokens"""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    text = text.lower().replace(".", "").replace("'", "")
+    return _NON_WORD.sub(" ", text.replace(",", " , ")).split()
+
+
+@dataclass
+class Place:
+    """An entry of the gazetteer"""
+
+    name: str
+    kind: str
+    geometry: Dict[str, Any]
+    # ISO 3166-1 alpha-2 code, and the state code for US states and cities
+    country: Optional[str] = None
+    state: Optional[str] = None
+    aliases: List[str] = field(default_factory=list)
+    population: int = 0
+    # unique name of the place, like "Paris, France"
+    label: Optional[str] = None
+
+    def __post_init__(self):
+        if self.label is None:
+            self.label = self.name
+
+    def within(self, other: "Place") -> bool:
+        if other.kind == "country":
+            return self.kind in ("state", "city") and self.country == other.country
+        if other.kind == "state":
+            return (
+                self.kind == "city"
+                and self.country == other.country
+                and self.state == other.state
+            )
+        return False
+
+
+@dataclass
+class GazetteerStats:
+    """Counters for the gazetteer lookups"""
+
+    query_hits: int = 0
+    query_misses: int = 0
+    name_hits: int = 0
+    name_misses: int = 0
+
+
+class Gazetteer:
+    """
+    In-memory index of place names.
+
+    `find` resolves the location of a whole query and `lookup` a location
+    name. Both only answer when exactly one place matches, optionally
+    narrowed by its country or state ("Paris, France") or kind ("Washington
+    state"); anything else is left to the geocoding agent and Geodini.
+    """
+
+    def __init__(self, places: List[Place]):
+        self.places = places
+        self.stats = GazetteerStats()
+        self._names: Dict[str, List[Place]] = {}
+        self._aliases: Dict[str, List[Place]] = {}
+        self._labels: Dict[str, Place] = {}
+        for place in places:
+            self._names.setdefault(" ".join(normalize(place.name)), []).append(place)
+            # "UK" and "U.K." are the same alias
+            for alias in {" ".join(normalize(alias)) for alias in place.aliases}:
+                self._aliases.setdefault(alias, []).append(place)
+        # a label is only a shortcut when no other place goes by it, "Georgia"
+        # is the label of the country but also the name of the state
+        for place in places:
+            label = " ".join(normalize(place.label))
+            others = [
+                other
+                for other in self._names.get(label, []) + self._aliases.get(label, [])
+                if other is not place
+            ]
+            if not others:
+                self._labels.setdefault(label, place)
+        self._max_words = max(
+            (len(name.split()) for name in [*self._names, *self._aliases]), default=0
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "Gazetteer":
+        """Load a gazetteer from a JSON file, gzipped if it ends in .gz"""
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls([Place(**place) for place in data["places"]])
+
+    def _candidates(self, name: str) -> List[Place]:
+        places = self._names.get(name, []) + self._aliases.get(name, [])
+        return list({id(place): place for place in places}.values())
+
+    def _match(self, tokens: List[str]) -> List[Tuple[int, int, str]]:
+        """Longest non-overlapping runs of tokens that are place names"""
+        matches = []
+        i = 0
+        while i < len(tokens):
+            for length in range(min(self._max_words, len(tokens) - i), 0, -1):
+                name = " ".join(tokens[i : i + length])
+                if name in self._names or name in self._aliases:
+                    matches.append((i, i + length, name))
+                    i += length
+                    break
+            else:
+                i += 1
+        return matches
+
+    def _resolve(self, names: List[str], kind: Optional[str]) -> Optional[Place]:
+        """The single place called names[0], within names[1] if given"""
+        candidates = self._candidates(names[0])
+        if kind:
+            candidates = [place for place in candidates if place.kind == kind]
+        if len(names) == 2:
+            containers = self._candidates(names[1])
+            candidates = [
+                place
+                for place in candidates
+                if any(place.within(container) for container in containers)
+            ]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def _adjacent(self, tokens, matches) -> bool:
+        """Whether the matches are one place, optionally followed by its container"""
+        if len(matches) == 1:
+            return True
+        (_, end, _), (start, _, _) = matches
+        return len(matches) == 2 and all(t in SEPARATORS for t in tokens[end:start])
+
+    def find(self, query: str) -> Optional[Place]:
+        """The place a query is about, if it names exactly one known place"""
+        place = self._find(normalize(query))
+        if place is None:
+            self.stats.query_misses += 1
+        else:
+            self.stats.query_hits += 1
+        return place
+
+    def _find(self, tokens: List[str]) -> Optional[Place]:
+        matches = self._match(tokens)
+        if not matches or not self._adjacent(tokens, matches):
+            return None
+        start, end = matches[0][0], matches[-1][1]
+        if FEATURE_WORDS.intersection(tokens[:start] + tokens[end:]):
+            return None
+        # the place must be introduced as the location, "over the Netherlands"
+        before = [t for t in tokens[:start] if t != "the"]
+        if not before or before[-1] not in SPATIAL_CUES:
+            return None
+        after = [t for t in tokens[end:] if t != "the"]
+        kind = KIND_WORDS.get(after[0]) if after else None
+        return self._resolve([name for _, _, name in matches], kind)
+
+    def lookup(self, location: str) -> Optional[Place]:
+        """The place a location name refers to, like "Paris, France" or "Kenya" """
+        place = self._lookup(normalize(location))
+        if place is None:
+            self.stats.name_misses += 1
+        else:
+            self.stats.name_hits += 1
+        return place
+
+    def _lookup(self, tokens: List[str]) -> Optional[Place]:
+        tokens = [t for t in tokens if t != "the"]
+        if " ".join(tokens) in self._labels:
+            return self._labels[" ".join(tokens)]
+        kind = None
+        if tokens and tokens[-1] in KIND_WORDS and " ".join(tokens) not in self._names:
+            kind = KIND_WORDS[tokens.pop()]
+        matches = self._match(tokens)
+        matched = sum(end - start for start, end, _ in matches)
+        separators = sum(t in SEPARATORS for t in tokens)
+        # every word must be part of the place name or its container
+        if not matches or matched + separators != len(tokens):
+            return None
+        if not self._adjacent(tokens, matches):
+            return None
+        return self._resolve([name for _, _, name in matches], kind)
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_loaded = False
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """The process-wide gazetteer, None when it is disabled or can't be loaded"""
+    global _gazetteer, _gazetteer_loaded
+    if not GAZETTEER_ENABLED:
+        return None
+    with _gazetteer_lock:
+        if not _gazetteer_loaded:
+            _gazetteer_loaded = True
+            try:
+                _gazetteer = Gazetteer.load(GAZETTEER_PATH)
+                logger.info(
+                    f"Loaded {len(_gazetteer.places)} places from {GAZETTEER_PATH}"
+                )
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"Could not load the gazetteer {GAZETTEER_PATH}: {e}")
+        return _gazetteer
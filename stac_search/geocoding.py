@@ -0,0 +1,237 @@
+"""
+Geocoding client for STAC Natural Query - resolves locations to polygons with Geodini
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import aiohttp
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+GEODINI_API = os.getenv("GEODINI_API", "https://geodini.k8s.labs.ds.io")
+# seconds for a whole Geodini call, including reading the response
+GEODINI_TIMEOUT = float(os.getenv("GEODINI_TIMEOUT", "5"))
+GEODINI_RETRIES = int(os.getenv("GEODINI_RETRIES", "2"))
+GEODINI_BACKOFF = float(os.getenv("GEODINI_BACKOFF", "0.2"))
+GEODINI_POOL_SIZE = int(os.getenv("GEODINI_POOL_SIZE", "20"))
+# consecutive failed calls that open the circuit, and how long it stays open
+GEODINI_BREAKER_THRESHOLD = int(os.getenv("GEODINI_BREAKER_THRESHOLD", "5"))
+GEODINI_BREAKER_RESET = float(os.getenv("GEODINI_BREAKER_RESET", "30"))
+# how long a failed lookup is answered from the negative cache
+GEODINI_NEGATIVE_TTL = float(os.getenv("GEODINI_NEGATIVE_TTL", "60"))
+
+
+class GeocodingError(Exception):
+    """Geodini could not be reached or answered with an error"""
+
+
+class CircuitOpenError(GeocodingError):
+    """Geodini is skipped after too many consecutive failures"""
+
+
+class GeocodingRequestError(GeocodingError):
+    """Geodini rejected the request with a 4xx status, retrying won't help"""
+
+
+class CircuitBreaker:
+    """
+    Fails fast after `threshold` consecutive failures.
+
+    Once `reset_timeout` seconds have passed, a single trial call is let
+    through; its success closes the circuit and its failure opens it again.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial or self.failures >= self.threshold:
+            if self.opened_at is None or self._trial:
+                logger.warning(f"Opening the circuit after {self.failures} failures")
+            self.opened_at = time.monotonic()
+        self._trial = False
+
+    def release(self) -> None:
+        """End a call that says nothing about the health of the service"""
+        self._trial = False
+
+
+@dataclass
+class GeocodingStats:
+    """Counters for a GeocodingClient"""
+
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    negative_hits: int = 0
+    rejected: int = 0
+
+
+class GeocodingClient:
+    """
+    Geodini client on one pooled aiohttp session.
+
+    Every attempt is bounded by `timeout`, failed attempts are retried with
+    exponential backoff and full jitter, and a circuit breaker skips Geodini
+    while it keeps failing. Rejected requests (4xx) are neither retried nor
+    counted by the breaker. Failed lookups raise GeocodingError and are
+    remembered for `negative_ttl` seconds so repeats fail fast.
+    """
+
+    def __init__(
+        self,
+        base_url: str = GEODINI_API,
+        timeout: float = GEODINI_TIMEOUT,
+        retries: int = GEODINI_RETRIES,
+        backoff: float = GEODINI_BACKOFF,
+        pool_size: int = GEODINI_POOL_SIZE,
+        breaker_threshold: int = GEODINI_BREAKER_THRESHOLD,
+        breaker_reset: float = GEODINI_BREAKER_RESET,
+        negative_ttl: float = GEODINI_NEGATIVE_TTL,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.stats = GeocodingStats()
+        self._failed: TTLCache = TTLCache(maxsize=1024, ttl=negative_ttl)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        # a session is bound to the loop it was created on
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout
+            )
+            self._loop = loop
+        return self._session
+
+    async def _get(self, location: str) -> Optional[Dict[str, Any]]:
+        session = self._get_session()
+        async with session.get(
+            f"{self.base_url}/search", params={"query": location}
+        ) as response:
+            if response.status >= 500 or response.status == 429:
+                raise GeocodingError(f"Geodini returned {response.status}")
+            if response.status >= 400:
+                raise GeocodingRequestError(f"Geodini returned {response.status}")
+            try:
+                body = await response.json()
+            except (aiohttp.ContentTypeError, ValueError) as e:
+                raise GeocodingError(f"Geodini returned a malformed body: {e}") from e
+        if not isinstance(body, dict):
+            raise GeocodingError("Geodini returned a malformed body")
+        results = body.get("results", [])
+        if results:
+            return results[0].get("geometry", None)
+        return None
+
+    async def search(self, location: str) -> Optional[Dict[str, Any]]:
+        """The polygon of the best match for a location, None if there is none"""
+        if location in self._failed:
+            self.stats.negative_hits += 1
+            raise GeocodingError(f"Geocoding {location!r} failed recently")
+
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self.stats.rejected += 1
+                raise CircuitOpenError("Geodini is unavailable")
+            self.stats.requests += 1
+            outcome = "failure"
+            try:
+                polygon = await self._get(location)
+                outcome = "success"
+            except GeocodingRequestError:
+                # the request is at fault, not Geodini
+                outcome = None
+                self.stats.failures += 1
+                self._failed[location] = True
+                raise
+            except asyncio.CancelledError:
+                outcome = None
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, GeocodingError) as e:
+                error = e
+                logger.warning(
+                    f"Geocoding {location!r} failed (attempt {attempt + 1}): {e!r}"
+                )
+            finally:
+                # unexpected errors count as failures too, so a half-open trial
+                # can't stay in flight forever
+                if outcome == "success":
+                    self.breaker.record_success()
+                elif outcome == "failure":
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+            if outcome == "success":
+                return polygon
+            if attempt < self.retries:
+                self.stats.retries += 1
+                await asyncio.sleep(random.uniform(0, self.backoff * 2**attempt))
+
+        self.stats.failures += 1
+        self._failed[location] = True
+        raise GeocodingError(f"Geocoding {location!r} failed: {error!r}")
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_geocoding_client: Optional[GeocodingClient] = None
+
+
+def get_geocoding_client() -> GeocodingClient:
+    """The process-wide Geodini client"""
+    global _geocoding_client
+    if _geocoding_client is None:
+        _geocoding_client = GeocodingClient()
+    return _geocoding_client
+
+
+async def close_geocoding_client() -> None:
+    global _geocoding_client
+    if _geocoding_client is not None:
+        await _geocoding_client.close()
+        _geocoding_client = None
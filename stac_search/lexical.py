@@ -0,0 +1,186 @@
+"""
+Lexical index for STAC Natural Query - BM25 over collection metadata
+"""
+
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from stac_search.rerank import tokenize
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# reciprocal rank fusion constant
+RRF_K = 60
+# an acronym shared by more collections than this is too generic to be exact
+EXACT_MATCH_MAX = 2
+# weight of the exact matches in the fused ranking, relative to the retrievers
+EXACT_MATCH_WEIGHT = 2.0
+
+# fields of a collection document, with how many times each is counted
+FIELD_WEIGHTS = {"collection_id": 3, "title": 2, "keywords": 2, "description": 1}
+
+
+def _terms(text: str) -> List[str]:
+    """Tokens plus the parts of hyphenated ids, e.g. sentinel-2-l2a -> sentinel"""
+    terms = []
+    for token in tokenize(text):
+        terms.append(token)
+        parts = re.split(r"[-_:.]", token)
+        if len(parts) > 1:
+            terms.extend(p for p in parts if p)
+    return terms
+
+
+def _acronyms(text: str) -> List[str]:
+    """Upper-case words of three or more characters, e.g. NAIP or HLS, but not V2"""
+    return [
+        word
+        for word in re.findall(r"\b[A-Z][A-Z0-9]{2,}\b", text)
+        if not re.fullmatch(r"V\d+", word)
+    ]
+
+
+def _document_acronyms(document: Dict[str, Any]) -> List[str]:
+    return _acronyms(
+        f"{document.get('title', '')} {' '.join(document.get('keywords', []))}"
+    )
+
+
+class BM25Index:
+    """
+    BM25 index over collection id, title, description and keywords.
+
+    Besides ranked search, `exact_matches` finds the collections a query
+    names by their full id or a distinctive acronym (NAIP, HLS) with dict
+    lookups, and `named_collection` the one a query consists of. Acronyms
+    only match when written in upper case, and neither ids nor acronyms match
+    when they are also plain words of the catalog's descriptions, like "cap".
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.documents = {d["collection_id"]: d for d in documents}
+        self._term_freqs: Dict[str, Counter] = {}
+        for document in documents:
+            terms = []
+            for field, weight in FIELD_WEIGHTS.items():
+                value = document.get(field) or ""
+                if isinstance(value, list):
+                    value = " ".join(value)
+                terms.extend(_terms(value) * weight)
+            self._term_freqs[document["collection_id"]] = Counter(terms)
+
+        self._lengths = {i: sum(tf.values()) for i, tf in self._term_freqs.items()}
+        self._avg_length = sum(self._lengths.values()) / max(len(self._lengths), 1)
+        doc_freqs = Counter(t for tf in self._term_freqs.values() for t in tf)
+        n = len(self._term_freqs)
+        self._idf = {
+            t: math.log(1 + (n - df + 0.5) / (df + 0.5)) for t, df in doc_freqs.items()
+        }
+        self._postings: Dict[str, List[str]] = {}
+        for collection_id, tf in self._term_freqs.items():
+            for term in tf:
+                self._postings.setdefault(term, []).append(collection_id)
+
+        # lower-case words of the descriptions, to tell acronyms from words
+        words = {
+            word
+            for document in documents
+            for word in re.findall(
+                r"\b[a-z][a-z0-9]*\b", document.get("description") or ""
+            )
+        }
+        # ids like "sentinel-1-grd" match in any case, plain word ids like
+        # "naip" or "gap" only as an upper-case acronym
+        self._ids: Dict[str, List[str]] = {
+            i.lower(): [i]
+            for i in self.documents
+            if re.search(r"[^a-z]", i.lower()) and i.lower() not in words
+        }
+        by_acronym: Dict[str, List[str]] = {}
+        for collection_id, document in self.documents.items():
+            acronyms = _document_acronyms(document)
+            if collection_id.isalpha():
+                acronyms.append(collection_id.upper())
+            for acronym in dict.fromkeys(acronyms):
+                by_acronym.setdefault(acronym, []).append(collection_id)
+        self._acronyms: Dict[str, List[str]] = {
+            acronym: ids
+            for acronym, ids in by_acronym.items()
+            if len(ids) <= EXACT_MATCH_MAX and acronym.lower() not in words
+        }
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(self, query: str, n_results: int) -> List[Tuple[str, float]]:
+        """Top collections by BM25 score"""
+        scores: Dict[str, float] = {}
+        for term in dict.fromkeys(_terms(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for collection_id in self._postings[term]:
+                tf = self._term_freqs[collection_id][term]
+                norm = K1 * (
+                    1 - B + B * self._lengths[collection_id] / self._avg_length
+                )
+                scores[collection_id] = scores.get(collection_id, 0.0) + idf * (
+                    tf * (K1 + 1) / (tf + norm)
+                )
+        return sorted(scores.items(), key=lambda s: s[1], reverse=True)[:n_results]
+
+    def exact_matches(self, query: str) -> List[str]:
+        """Collections whose full id or distinctive acronym appears in the query"""
+        matches = []
+        for token in tokenize(query):
+            matches.extend(self._ids.get(token, []))
+        # in an all upper-case query acronyms can't be told from words
+        if not query.isupper() or len(query.split()) == 1:
+            for acronym in _acronyms(query):
+                matches.extend(self._acronyms.get(acronym, []))
+        return list(dict.fromkeys(matches))
+
+    def named_collection(self, query: str) -> Optional[str]:
+        """The collection a query is just the id or acronym of, e.g. "naip" """
+        name = query.strip()
+        if len(name.split()) != 1:
+            return None
+        # a plain word id as typed, like an acronym in upper case
+        if name in self.documents and name.upper() in self._acronyms:
+            return name
+        matches = self._ids.get(name.lower()) or self._acronyms.get(name, [])
+        return matches[0] if len(matches) == 1 else None
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(list(self.documents.values()), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path) as f:
+            return cls(json.load(f))
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[str]],
+    k: int = RRF_K,
+    weights: Optional[List[float]] = None,
+) -> List[str]:
+    """Fuse several rankings of ids into one, by the sum of weight / (k + rank)"""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + weight / (k + rank)
+    return sorted(scores, key=lambda id_: scores[id_], reverse=True)
@@ -2,28 +2,35 @@
 Load CLI for STAC Natural Query - creates and populates the vector database
 """
 
+import argparse
 import asyncio
 import logging
 import os
 
-from stac_search.catalog_manager import CatalogManager
+from stac_search.catalog_manager import get_catalog_manager, close_catalog_managers
+from stac_search.stac_client import close_stac_clients
 
 logger = logging.getLogger(__name__)
 
 
-def load_data(catalog_url: str):
+def load_data(catalog_url: str, refresh: bool = False):
     """Load STAC collections into the vector database using CatalogManager"""
     try:
-        # Initialize catalog manager
-        catalog_manager = CatalogManager()
+        # Use the process-wide catalog manager
+        catalog_manager = get_catalog_manager()
 
         # Load catalog using async method
-        result = asyncio.run(catalog_manager.load_catalog(catalog_url))
+        result = asyncio.run(catalog_manager.load_catalog(catalog_url, refresh=refresh))
 
         if result["success"]:
             logger.info(f"Successfully loaded catalog: {result['message']}")
             if "collections_count" in result:
                 logger.info(f"Indexed {result['collections_count']} collections")
+            if refresh:
+                logger.info(
+                    f"Added {result['added']}, updated {result['updated']}, "
+                    f"deleted {result['deleted']}, unchanged {result['unchanged']}"
+                )
         else:
             logger.error(f"Failed to load catalog: {result['error']}")
             raise Exception(result["error"])
@@ -31,6 +38,9 @@ def load_data(catalog_url: str):
     except Exception as e:
         logger.error(f"Error loading data: {e}")
         raise
+    finally:
+        close_catalog_managers()
+        close_stac_clients()
 
 
 if __name__ == "__main__":
@@ -42,4 +52,12 @@ if __name__ == "__main__":
     STAC_CATALOG_URL = os.environ.get(
         "STAC_CATALOG_URL", "https://planetarycomputer.microsoft.com/api/stac/v1"
     )
-    load_data(catalog_url=STAC_CATALOG_URL)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--catalog-url", default=STAC_CATALOG_URL)
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Re-fetch an indexed catalog and re-embed only changed collections",
+    )
+    args = parser.parse_args()
+    load_data(catalog_url=args.catalog_url, refresh=args.refresh)
@@ -0,0 +1,113 @@
+"""
+Dependency graph execution for STAC Natural Query pipelines
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from stac_search.timing import record_stage
+
+logger = logging.getLogger(__name__)
+
+StageFunc = Callable[..., Awaitable[Any]]
+
+
+@dataclass
+class StageTiming:
+    """When a stage ran, in seconds since the pipeline started"""
+
+    name: str
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class Pipeline:
+    """
+    Runs async stages as soon as the stages they depend on have finished.
+
+    Each stage is called with the results of its dependencies, in the order
+    they were declared. Stages run at most once, so `run` can be called again
+    with stages added later and the finished ones are reused. With a `name`,
+    stage durations are also recorded as `<name>.<stage>` timings.
+    """
+
+    def __init__(self, name: Optional[str] = None):
+        self.name = name
+        self._start = time.perf_counter()
+        self._stages: Dict[str, Tuple[StageFunc, Tuple[str, ...]]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.timings: Dict[str, StageTiming] = {}
+
+    def stage(self, name: str, func: StageFunc, *depends_on: str) -> None:
+        """Add a stage that runs `func` with the results of `depends_on`"""
+        # stages only depend on earlier ones, so the graph can't have cycles
+        if name in self._stages:
+            raise ValueError(f"Stage {name!r} is already defined")
+        for dependency in depends_on:
+            if dependency not in self._stages:
+                raise ValueError(
+                    f"Stage {name!r} depends on unknown stage {dependency!r}"
+                )
+        self._stages[name] = (func, depends_on)
+
+    def _task(self, name: str) -> asyncio.Task:
+        if name not in self._tasks:
+            self._tasks[name] = asyncio.ensure_future(self._run_stage(name))
+        return self._tasks[name]
+
+    async def _run_stage(self, name: str) -> Any:
+        func, depends_on = self._stages[name]
+        # start every dependency before waiting on any of them
+        tasks = [self._task(dependency) for dependency in depends_on]
+        inputs = [await task for task in tasks]
+        start = time.perf_counter() - self._start
+        try:
+            return await func(*inputs)
+        finally:
+            timing = StageTiming(name, start, time.perf_counter() - self._start)
+            self.timings[name] = timing
+            if self.name:
+                record_stage(f"{self.name}.{name}", timing.duration)
+
+    async def run(self, *names: str) -> List[Any]:
+        """Run the named stages and everything they depend on"""
+        tasks = [self._task(name) for name in names]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in self._tasks.values():
+                task.cancel()
+            raise
+
+    def ordered_timings(self) -> List[StageTiming]:
+        """Timings of the stages that ran, by start time"""
+        return sorted(self.timings.values(), key=lambda t: t.start)
+
+    def critical_path(self, name: str) -> List[StageTiming]:
+        """The chain of stages, ending at `name`, that determined when it finished"""
+        path = []
+        while name in self.timings:
+            path.append(self.timings[name])
+            finished = [d for d in self._stages[name][1] if d in self.timings]
+            if not finished:
+                break
+            name = max(finished, key=lambda d: self.timings[d].end)
+        return path[::-1]
+
+    def log_timings(self, name: str) -> None:
+        for timing in self.ordered_timings():
+            logger.info(
+                f"Stage {timing.name}: {timing.start:.3f}s -> {timing.end:.3f}s "
+                f"({timing.duration:.3f} seconds)"
+            )
+        path = self.critical_path(name)
+        logger.info(f"Critical path: {' -> '.join(t.name for t in path)}")
+        if path:
+            logger.info(f"Total time: {path[-1].end} seconds")
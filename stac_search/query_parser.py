@@ -0,0 +1,341 @@
+"""
+Rule-based query parsing for STAC Natural Query - dates and cloud cover without an LLM
+
+Each parser returns `(parsed, value)`. `parsed` is True only when the rules
+understood every temporal (or cloud) expression of the query, including when
+there is none at all, in which case `value` is None. Anything the rules don't
+fully understand, e.g. "summer 2023", is left to the agents.
+"""
+
+import calendar
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+QUERY_FAST_PATH_ENABLED = (
+    os.environ.get("QUERY_FAST_PATH_ENABLED", "true").lower() == "true"
+)
+
+# "cloudless imagery" means less than 10 percent cloud cover
+CLOUDLESS_MAX = 10
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+MONTHS["sept"] = 9
+NUMBER_WORDS = {
+    "a": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}  # fmt: skip
+
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+# not part of a numeric date like 12/2020, 2023-06 or 2021.06, but a year may
+# end or start a range like 2019-2021
+_NOT_IN_DATE_END = r"(?![/.]\d)(?!-(?!(?:19|20)\d{2}(?!\d))\d)"
+# nor part of an id like esa-worldcover-2021, nor a quantity like "over 2000 km"
+_YEAR = (
+    r"(?<!\w)(?<![a-z]-)(?<![/.])(?:(?<!\d-)|(?<=(?:19|20)\d\d-))"
+    r"(?<!over\s)(?<!above\s)(?<!under\s)(?<!below\s)"
+    rf"(?<!than\s)(?:19|20)\d{{2}}(?!\w){_NOT_IN_DATE_END}"
+    r"(?!\s*(?:%|percent|km|kilomet|mi\b|miles?\b|m\b|meters?\b|metres?\b|"
+    r"ft\b|feet\b|ha\b|hectares?\b|sq\b|square\b|px\b|pixels?\b))"
+)
+# an ISO date, a month and year or a year
+_PERIOD = (
+    rf"(?:\d{{4}}-\d{{2}}-\d{{2}}|(?:{_MONTH})\.?,?\s+(?:19|20)\d{{2}}(?!\w)"
+    rf"{_NOT_IN_DATE_END}|{_YEAR})"
+)
+_NUMBER = r"\d+|" + "|".join(NUMBER_WORDS)
+_UNIT = r"day|week|month|year"
+
+# words that mean the query says something about time
+TEMPORAL_CUES = re.compile(
+    rf"(?<![\w-])(?:{_MONTH}|(?:19|20)\d{{2}}|\d{{4}}-\d{{2}}|today|yesterday|"
+    r"tonight|now|current|recent|recently|latest|newest|oldest|ago|since|before|"
+    r"after|until|till|during|past|last|previous|next|days?|weeks?|months?|"
+    r"years?|decades?|quarters?|q[1-4]|spring|summer|autumn|fall|winter|season|"
+    r"seasons|monsoon|dry|wet|annual|monthly|weekly|daily)(?![\w-])"
+)
+CLOUD_CUES = re.compile(r"cloud|overcast|haze|hazy|clear\s+sk|sunny")
+
+_LESS = (
+    r"less\s+than|fewer\s+than|lower\s+than|under|below|at\s+most|no\s+more\s+than|"
+    r"maximum(?:\s+of)?|max|up\s+to|<=?"
+)
+_MORE = (
+    r"more\s+than|greater\s+than|higher\s+than|over|above|at\s+least|"
+    r"minimum(?:\s+of)?|min|>=?"
+)
+_PERCENT = r"\s*(?:%|percent|pct)?"
+_VALUE = rf"(?P<value>\d+(?:\.\d+)?){_PERCENT}"
+_LOW_HIGH = (
+    rf"(?P<low>\d+(?:\.\d+)?){_PERCENT}\s+and\s+(?P<high>\d+(?:\.\d+)?){_PERCENT}"
+)
+_CLOUD = r"cloud(?:s|y|iness)?(?:\s+cover(?:age)?)?"
+# after a number, "cloudy" must end the phrase, "over 30 cloudy days" is a count
+_CLOUD_AFTER = r"(?:cloud(?:s|iness)?(?:\s+cover(?:age)?)?\b|cloudy(?!\s+[a-z]))"
+_CLOUD_LEAD = rf"{_CLOUD}(?:\s+(?:is|of|percentage|percent|at))?"
+
+
+def _month_end(year: int, month: int) -> date:
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _shift_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _period(text: str) -> Tuple[date, date]:
+    """First and last day of an ISO date, a month and year or a year"""
+    text = text.strip()
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", text):
+        day = date.fromisoformat(text)
+        return day, day
+    match = re.fullmatch(rf"({_MONTH})\.?,?\s+(\d{{4}})", text)
+    if match:
+        year, month = int(match.group(2)), MONTHS[match.group(1)]
+        return date(year, month, 1), _month_end(year, month)
+    year = int(text)
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def _format(start: Optional[date], end: Optional[date]) -> str:
+    return f"{start.isoformat() if start else '..'}/{end.isoformat() if end else '..'}"
+
+
+def _next_to_number(match: re.Match, first: str, last: str) -> bool:
+    """Whether a number sits right before or after the periods, as in "5 Jan 2021" """
+    before = match.string[: match.start(first)]
+    after = match.string[match.end(last) :]
+    return bool(re.search(r"\d[\s,]*$", before) or re.match(r"[\s,]*\d", after))
+
+
+def _range(match: re.Match, today: date) -> Optional[str]:
+    if _next_to_number(match, "first", "second"):
+        return None
+    start, _ = _period(match.group("first"))
+    _, end = _period(match.group("second"))
+    return _format(start, end) if start <= end else None
+
+
+def _open_range(match: re.Match, today: date) -> Optional[str]:
+    if _next_to_number(match, "period", "period"):
+        return None
+    start, end = _period(match.group("period"))
+    word = match.group("word")
+    if word == "since":
+        return _format(start, None)
+    if word == "after":
+        return _format(end + timedelta(days=1), None)
+    if word == "before":
+        return _format(None, start - timedelta(days=1))
+    return _format(None, end)
+
+
+def _rolling(match: re.Match, today: date) -> Optional[str]:
+    number, unit = match.group("number"), match.group("unit")
+    # "last year" on its own may mean the previous calendar year
+    if number is None and not match.group("the") and match.group("word") != "past":
+        return None
+    n = 1 if number is None else int(NUMBER_WORDS.get(number, number))
+    if unit == "day":
+        start = today - timedelta(days=n)
+    elif unit == "week":
+        start = today - timedelta(weeks=n)
+    elif unit == "month":
+        start = _shift_months(today, -n)
+    else:
+        start = _shift_months(today, -12 * n)
+    return _format(start, today)
+
+
+def _named_day(match: re.Match, today: date) -> Optional[str]:
+    word = match.group("word")
+    if word == "today":
+        return _format(today, today)
+    if word == "yesterday":
+        day = today - timedelta(days=1)
+        return _format(day, day)
+    if word.startswith("this") and word.endswith("year"):
+        return _format(date(today.year, 1, 1), today)
+    return _format(today.replace(day=1), today)
+
+
+def _single(match: re.Match, today: date) -> Optional[str]:
+    if _next_to_number(match, "period", "period"):
+        return None
+    return _format(*_period(match.group("period")))
+
+
+# tried in order; the first patterns claim their text before the later ones
+TEMPORAL_RULES = [
+    (
+        re.compile(
+            rf"(?:\bfrom\s+)?(?P<first>{_PERIOD})\s*(?:to|through|until|till|-|–)"
+            rf"\s*(?P<second>{_PERIOD})"
+        ),
+        _range,
+    ),
+    (
+        re.compile(rf"\bbetween\s+(?P<first>{_PERIOD})\s+and\s+(?P<second>{_PERIOD})"),
+        _range,
+    ),
+    (
+        re.compile(
+            rf"\b(?P<word>since|after|before|until|till)\s+(?P<period>{_PERIOD})"
+        ),
+        _open_range,
+    ),
+    (
+        re.compile(
+            r"\b(?:(?:in|over|during|within|for|from)\s+)?(?P<the>the\s+)?"
+            rf"(?P<word>past|last|previous)\s+(?:(?P<number>{_NUMBER})\s+)?"
+            rf"(?P<unit>{_UNIT})s?\b"
+        ),
+        _rolling,
+    ),
+    (
+        re.compile(
+            r"\b(?:(?:from|for|of)\s+)?"
+            r"(?P<word>today|yesterday|this\s+year|this\s+month)\b"
+        ),
+        _named_day,
+    ),
+    (
+        re.compile(rf"(?:\b(?:in|during|from|for|of)\s+)?(?P<period>{_PERIOD})"),
+        _single,
+    ),
+]
+
+
+def _cloud_filter(op: str, value: float) -> Dict[str, Any]:
+    return {"op": op, "args": [{"property": "eo:cloud_cover"}, value]}
+
+
+def _number(text: str) -> Optional[float]:
+    value = float(text)
+    if not 0 <= value <= 100:
+        return None
+    return int(value) if value.is_integer() else value
+
+
+def _cloudless(match: re.Match) -> Optional[Dict[str, Any]]:
+    return _cloud_filter("lte", CLOUDLESS_MAX)
+
+
+def _less(match: re.Match) -> Optional[Dict[str, Any]]:
+    value = _number(match.group("value"))
+    return None if value is None else _cloud_filter("lte", value)
+
+
+def _more(match: re.Match) -> Optional[Dict[str, Any]]:
+    value = _number(match.group("value"))
+    return None if value is None else _cloud_filter("gte", value)
+
+
+def _between(match: re.Match) -> Optional[Dict[str, Any]]:
+    low, high = _number(match.group("low")), _number(match.group("high"))
+    if low is None or high is None or low > high:
+        return None
+    return {
+        "op": "and",
+        "args": [_cloud_filter("gte", low), _cloud_filter("lte", high)],
+    }
+
+
+CLOUD_RULES = [
+    (
+        re.compile(
+            r"\b(?:cloud[- ]?less|cloud[- ]free|no\s+clouds?|without\s+clouds?|"
+            r"clear\s+sk(?:y|ies))\b"
+        ),
+        _cloudless,
+    ),
+    (re.compile(rf"\b{_CLOUD_LEAD}\s+between\s+{_LOW_HIGH}"), _between),
+    (re.compile(rf"\bbetween\s+{_LOW_HIGH}\s+(?:of\s+)?{_CLOUD_AFTER}"), _between),
+    (
+        re.compile(rf"(?<!\w)(?:{_LESS})\s*{_VALUE}\s+(?:of\s+)?{_CLOUD_AFTER}"),
+        _less,
+    ),
+    (re.compile(rf"\b{_CLOUD_LEAD}\s*(?:{_LESS})\s*{_VALUE}"), _less),
+    (
+        re.compile(
+            rf"\b{_VALUE}\s+(?:of\s+)?{_CLOUD_AFTER}\s+or\s+(?:less|lower|below|fewer)"
+        ),
+        _less,
+    ),
+    (
+        re.compile(rf"(?<!\w)(?:{_MORE})\s*{_VALUE}\s+(?:of\s+)?{_CLOUD_AFTER}"),
+        _more,
+    ),
+    (re.compile(rf"\b{_CLOUD_LEAD}\s*(?:{_MORE})\s*{_VALUE}"), _more),
+]
+
+
+def _apply(rules, text: str, *args) -> Tuple[List[Any], str]:
+    """Values of every rule match, and the text with the matches blanked out"""
+    values = []
+    for pattern, handler in rules:
+        for match in list(pattern.finditer(text)):
+            values.append(handler(match, *args))
+            text = (
+                text[: match.start()] + " " * len(match.group()) + text[match.end() :]
+            )
+    return values, text
+
+
+def _conflicting(values: List[Any]) -> bool:
+    return any(value != values[0] for value in values)
+
+
+def parse_temporal_range(
+    query: str, today: Optional[date] = None
+) -> Tuple[bool, Optional[str]]:
+    """Parse the query's temporal range as a STAC datetime, e.g. 2023-01-01/.."""
+    today = today or date.today()
+    try:
+        values, rest = _apply(TEMPORAL_RULES, query.lower(), today)
+    except ValueError:
+        # e.g. an invalid date like 2023-02-30
+        return False, None
+    if TEMPORAL_CUES.search(rest) or None in values or _conflicting(values):
+        return False, None
+    return True, values[0] if values else None
+
+
+def parse_cloud_filter(query: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """Parse the query's cloud cover constraint as a CQL2 filter on eo:cloud_cover"""
+    values, rest = _apply(CLOUD_RULES, query.lower())
+    if CLOUD_CUES.search(rest) or None in values or _conflicting(values):
+        return False, None
+    return True, values[0] if values else None
+
+
+@dataclass
+class FastPathStats:
+    """How often the rules answered without the agents, by field"""
+
+    parsed: Dict[str, int] = field(default_factory=dict)
+    fallbacks: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, name: str, parsed: bool) -> None:
+        counts = self.parsed if parsed else self.fallbacks
+        counts[name] = counts.get(name, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        names = sorted(set(self.parsed) | set(self.fallbacks))
+        stats = {}
+        for name in names:
+            parsed, fallbacks = self.parsed.get(name, 0), self.fallbacks.get(name, 0)
+            stats[name] = {
+                "parsed": parsed,
+                "fallbacks": fallbacks,
+                "llm_skip_rate": round(parsed / (parsed + fallbacks), 3),
+            }
+        return stats
+
+
+fast_path_stats = FastPathStats()
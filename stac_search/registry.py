@@ -0,0 +1,75 @@
+"""
+Catalog registry for STAC Natural Query - tracks which catalogs are indexed
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# How long a validated catalog is trusted before it is checked again
+CATALOG_REGISTRY_TTL = float(os.environ.get("CATALOG_REGISTRY_TTL", "86400"))
+REGISTRY_FILENAME = "catalog_registry.json"
+
+
+class CatalogRegistry:
+    """
+    In-memory registry of indexed catalogs, persisted next to the ChromaDB data.
+
+    A fresh entry means the catalog was validated and found indexed less than
+    `ttl` seconds ago, so requests can skip validation and existence checks.
+    """
+
+    def __init__(self, data_path: str, ttl: float = CATALOG_REGISTRY_TTL):
+        self.path = os.path.join(data_path, REGISTRY_FILENAME)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable catalog registry {self.path}: {e}")
+            return {}
+
+    def _write(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, catalog_url: str) -> Optional[Dict[str, Any]]:
+        """Get the registry entry for a catalog, if any"""
+        return self._entries.get(catalog_url)
+
+    def is_fresh(self, catalog_url: str) -> bool:
+        """Check if a catalog was validated and indexed within the TTL"""
+        entry = self._entries.get(catalog_url)
+        if entry is None:
+            return False
+        return time.time() - entry.get("validated_at", 0) < self.ttl
+
+    def record(self, catalog_url: str, **fields) -> Dict[str, Any]:
+        """Create or update the entry for a catalog and persist the registry"""
+        with self._lock:
+            entry = dict(self._entries.get(catalog_url, {}))
+            entry.update(fields)
+            entry.setdefault("validated_at", time.time())
+            self._entries[catalog_url] = entry
+            self._write()
+            return entry
+
+    def remove(self, catalog_url: str) -> None:
+        """Forget a catalog"""
+        with self._lock:
+            if self._entries.pop(catalog_url, None) is not None:
+                self._write()
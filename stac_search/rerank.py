@@ -0,0 +1,115 @@
+"""
+Local reranking for STAC Natural Query - ranks collection candidates without an LLM
+"""
+
+import logging
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+from stac_search.embeddings import get_cross_encoder
+
+logger = logging.getLogger(__name__)
+
+# "llm" reranks with the rerank agent and returns rich explanations, "fusion"
+# fuses the Chroma distances with keyword matches and "cross-encoder" scores
+# each candidate with a CPU cross-encoder
+RERANK_MODES = ("llm", "fusion", "cross-encoder")
+RERANK_MODE = os.environ.get("RERANK_MODE", "llm")
+CROSS_ENCODER_MODEL = os.environ.get(
+    "CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"
+)
+
+# weights of the vector similarity and keyword overlap in the fused score
+VECTOR_WEIGHT = 0.7
+KEYWORD_WEIGHT = 0.3
+# added when the query names the collection id
+EXACT_ID_BONUS = 0.5
+
+STOPWORDS = {
+    "a", "an", "and", "any", "data", "for", "from", "i", "images", "imagery",
+    "in", "me", "of", "on", "over", "show", "the", "to", "want", "with",
+}  # fmt: skip
+
+RankedCandidate = Tuple[Dict[str, Any], float, str]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, keeping ids like sentinel-2-l2a together"""
+    return re.findall(r"[a-z0-9]+(?:[-_:.][a-z0-9]+)*", text.lower())
+
+
+def _query_terms(query: str) -> List[str]:
+    return [t for t in dict.fromkeys(tokenize(query)) if t not in STOPWORDS]
+
+
+def _matched_terms(terms: List[str], metadata: Dict[str, Any]) -> List[str]:
+    collection_id = metadata.get("collection_id", "")
+    words = set(tokenize(f"{collection_id} {metadata.get('title', '')}"))
+    # also match the parts of hyphenated ids, e.g. "sentinel" in sentinel-2-l2a
+    words |= {part for word in words for part in re.split(r"[-_:.]", word)}
+    return [t for t in terms if t in words]
+
+
+def _exact_id(query: str, metadata: Dict[str, Any]) -> bool:
+    collection_id = metadata.get("collection_id", "").lower()
+    return bool(collection_id) and collection_id in tokenize(query)
+
+
+def fusion_rerank(
+    query: str,
+    metadatas: List[Dict[str, Any]],
+    distances: List[float],
+    top_k: int,
+) -> List[RankedCandidate]:
+    """
+    Rank candidates by a weighted sum of vector similarity and keyword overlap.
+
+    Chroma's default distance is the squared L2 distance, which for the
+    normalized sentence embeddings is 2 - 2 * cosine similarity.
+    """
+    terms = _query_terms(query)
+    ranked = []
+    for metadata, distance in zip(metadatas, distances):
+        similarity = max(0.0, min(1.0, 1 - distance / 2))
+        matched = _matched_terms(terms, metadata)
+        overlap = len(matched) / len(terms) if terms else 0.0
+        score = VECTOR_WEIGHT * similarity + KEYWORD_WEIGHT * overlap
+        if _exact_id(query, metadata):
+            score += EXACT_ID_BONUS
+            explanation = f"The query names {metadata['collection_id']} directly."
+        elif matched:
+            explanation = (
+                f"Matches {', '.join(matched)} in the title "
+                f"(semantic similarity {similarity:.2f})."
+            )
+        else:
+            explanation = f"Semantically similar to the query ({similarity:.2f})."
+        ranked.append((metadata, score, explanation))
+    ranked.sort(key=lambda r: r[1], reverse=True)
+    return ranked[:top_k]
+
+
+def cross_encoder_rerank(
+    query: str,
+    metadatas: List[Dict[str, Any]],
+    top_k: int,
+    model_name: str = CROSS_ENCODER_MODEL,
+) -> List[RankedCandidate]:
+    """Rank candidates by cross-encoder relevance of (query, title + description)"""
+    if not metadatas:
+        return []
+    pairs = [
+        (query, f"{m.get('title', '')} {m.get('description', '')}") for m in metadatas
+    ]
+    scores = get_cross_encoder(model_name).predict(pairs)
+    terms = _query_terms(query)
+    ranked = []
+    for metadata, score in zip(metadatas, scores):
+        matched = _matched_terms(terms, metadata)
+        explanation = f"Cross-encoder relevance score {score:.2f}"
+        if matched:
+            explanation += f", matches {', '.join(matched)} in the title"
+        ranked.append((metadata, float(score), explanation + "."))
+    ranked.sort(key=lambda r: r[1], reverse=True)
+    return ranked[:top_k]
@@ -0,0 +1,91 @@
+"""
+STAC API clients for STAC Natural Query - one cached client per catalog URL
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from typing import List, Optional
+
+import requests
+from pystac_client import Client
+from pystac_client.stac_api_io import StacApiIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from stac_search.cache import CACHES, MemoryBackend, async_cached, make_cache
+
+logger = logging.getLogger(__name__)
+
+# how long an opened client (landing page) and a catalog's collection ids are reused
+STAC_CLIENT_TTL = float(os.environ.get("STAC_CLIENT_TTL", "3600"))
+STAC_REQUEST_TIMEOUT = float(os.environ.get("STAC_REQUEST_TIMEOUT", "30"))
+STAC_MAX_RETRIES = int(os.environ.get("STAC_MAX_RETRIES", "3"))
+# keep-alive connections kept open per STAC API host
+STAC_POOL_MAXSIZE = int(os.environ.get("STAC_POOL_MAXSIZE", "20"))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+# Client objects hold a session, so they are only cached in memory; the
+# collection ids go to the configured backend and are shared across workers
+stac_client_cache = MemoryBackend("stac_clients", maxsize=64, ttl=STAC_CLIENT_TTL)
+collection_ids_cache = make_cache(
+    "stac_collection_ids", maxsize=64, ttl=STAC_CLIENT_TTL
+)
+CACHES["stac_clients"] = stac_client_cache
+CACHES["stac_collection_ids"] = collection_ids_cache
+
+
+def get_session() -> requests.Session:
+    """The HTTP session, with its keep-alive connection pools, shared by all clients"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=STAC_MAX_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                # STAC searches are POSTs but don't change anything
+                allowed_methods=frozenset({"GET", "POST"}),
+            )
+            adapter = HTTPAdapter(
+                pool_maxsize=STAC_POOL_MAXSIZE, max_retries=retry, pool_block=False
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def open_client(catalog_url: str) -> Client:
+    """Open a client on the shared session, which fetches the landing page"""
+    stac_io = StacApiIO(timeout=STAC_REQUEST_TIMEOUT, max_retries=None)
+    stac_io.session = get_session()
+    return Client.open(catalog_url, stac_io=stac_io, timeout=STAC_REQUEST_TIMEOUT)
+
+
+@async_cached(stac_client_cache)
+async def get_stac_client(catalog_url: str) -> Client:
+    """Get the client for a catalog, opening it on first use or after the TTL"""
+    return await asyncio.to_thread(open_client, catalog_url)
+
+
+@async_cached(collection_ids_cache)
+async def get_collection_ids(catalog_url: str) -> List[str]:
+    """Ids of all the collections of a catalog"""
+    client = await get_stac_client(catalog_url)
+    return await asyncio.to_thread(
+        lambda: [collection.id for collection in client.get_collections()]
+    )
+
+
+def close_stac_clients() -> None:
+    """Close the shared session's connections"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,118 @@
+"""
+Stage timing for STAC Natural Query - Prometheus histograms and Server-Timing headers
+
+Stages are timed with `stage_timer` (or the `timed` decorator). Every timing
+is observed in the `stac_search_stage_duration_seconds` histogram when
+prometheus_client is installed (`pip install .[metrics]`), and added to the
+timings of the current request, which the API returns as a Server-Timing
+header.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+except ImportError:
+    Histogram = None
+
+# from 1 ms (cache lookups) to 1 minute (LLM calls, large STAC searches)
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)  # fmt: skip
+
+if Histogram is not None:
+    STAGE_DURATION = Histogram(
+        "stac_search_stage_duration_seconds",
+        "Duration of each stage of the search pipelines",
+        ["stage"],
+        buckets=BUCKETS,
+    )
+    REQUEST_DURATION = Histogram(
+        "stac_search_request_duration_seconds",
+        "Duration of the API requests",
+        ["method", "path"],
+        buckets=BUCKETS,
+    )
+
+# (stage, seconds) of the request being handled
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def metrics_enabled() -> bool:
+    return Histogram is not None
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Record how long a stage took"""
+    if Histogram is not None:
+        STAGE_DURATION.labels(stage=stage).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+    logger.debug(f"{stage} took {seconds:.4f} seconds")
+
+
+def record_request(method: str, path: str, seconds: float) -> None:
+    if Histogram is not None:
+        REQUEST_DURATION.labels(method=method, path=path).observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time the block as `stage`, including when it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def timed(stage: str):
+    """Time every call of a coroutine function as `stage`"""
+
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def start_request_timings() -> List[Tuple[str, float]]:
+    """Collect the stage timings of the current request, and of its tasks"""
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Server-Timing header value, summing the stages that ran more than once"""
+    totals: Dict[str, Tuple[float, int]] = {}
+    for stage, seconds in timings:
+        total, count = totals.get(stage, (0.0, 0))
+        totals[stage] = (total + seconds, count + 1)
+    entries = []
+    for stage, (total, count) in totals.items():
+        entry = stage
+        if count > 1:
+            entry += f';desc="{count} calls"'
+        entries.append(f"{entry};dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def latest_metrics() -> Tuple[bytes, str]:
+    """The metrics in the Prometheus text format, and their content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,6 @@
+import os
+
+# the agents need an API key to be created, the tests never call them
+os.environ.setdefault("OPENAI_API_KEY", "test")
+# keep the module-level caches in process
+os.environ["CACHE_BACKEND"] = "memory"
@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import shapely
+from shapely.geometry import MultiPolygon, Point, Polygon, box, mapping
+
+from stac_search import aoi
+from stac_search.agents import items_search
+from stac_search.aoi import prepare_aoi, simplify_to_budget
+
+
+def wiggly_ring(x, y, radius, n=2000):
+    """A ring of n vertices with a small wobble, so simplifying has work to do"""
+    ring = Point(x, y).buffer(radius, quad_segs=n // 4).exterior
+    return [
+        (x + (px - x) * (1 + 0.01 * (i % 3)), y + (py - y) * (1 + 0.01 * (i % 3)))
+        for i, (px, py) in enumerate(ring.coords[:-1])
+    ]
+
+
+@pytest.fixture(scope="module")
+def lake():
+    """A detailed polygon with an island close to its shore"""
+    return Polygon(wiggly_ring(0, 0, 1), [wiggly_ring(0.7, 0, 0.2)])
+
+
+@pytest.mark.parametrize("max_vertices", [50, 200, 1000])
+def test_simplified_geometries_fit_the_budget(lake, max_vertices):
+    simplified, method = simplify_to_budget(lake, max_vertices)
+    assert method == "simplified"
+    assert shapely.get_num_coordinates(simplified) <= max_vertices
+    # still valid, and the island is not lost
+    assert simplified.is_valid
+    assert len(simplified.interiors) == 1
+    assert simplified.area == pytest.approx(lake.area, rel=0.1)
+
+
+def test_geometries_within_the_budget_are_kept(lake):
+    assert simplify_to_budget(lake, 10_000) == (lake, "original")
+    geometry = mapping(box(0, 0, 1, 1))
+    assert prepare_aoi(geometry) is geometry
+
+
+def test_archipelagos_fall_back_to_their_bbox():
+    islands = MultiPolygon(
+        [box(i, 0, i + 0.5, 0.5) for i in range(100)]  # 500 vertices
+    )
+    bbox, method = simplify_to_budget(islands, 100)
+    assert method == "bbox"
+    assert bbox.equals(box(*islands.bounds))
+
+
+def test_falls_back_to_the_bbox_when_the_steps_run_out(lake):
+    bbox, method = simplify_to_budget(lake, 50, steps=0)
+    assert method == "bbox"
+    assert bbox.equals(box(*lake.bounds))
+
+
+def test_prepare_aoi_returns_geojson(lake):
+    prepared = prepare_aoi(mapping(lake))
+    assert prepared["type"] == "Polygon"
+    assert shapely.get_num_coordinates(shapely.geometry.shape(prepared)) <= (
+        aoi.AOI_MAX_VERTICES
+    )
+
+
+def test_full_resolution_aoi_skips_simplification(lake, monkeypatch):
+    calls = []
+
+    async def prepare_polygon(location, polygon):
+        calls.append(location)
+        return "simplified"
+
+    monkeypatch.setattr(items_search, "_prepare_polygon", prepare_polygon)
+    results = SimpleNamespace(location="Lake")
+    polygon = mapping(lake)
+
+    assert asyncio.run(items_search._prepare_aoi(results, polygon, True)) is polygon
+    assert calls == []
+    assert asyncio.run(items_search._prepare_aoi(results, polygon, False)) == (
+        "simplified"
+    )
+    assert calls == ["Lake"]
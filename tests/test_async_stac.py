@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_stac import MockStacServer
+from stac_search.agents import items_search
+from stac_search.async_stac import AsyncStacSearch, close_async_search
+from stac_search.stac_client import close_stac_clients
+
+PARAMS = {
+    "max_items": 25,
+    "collections": ["naip", "sentinel-2-l2a"],
+    "datetime": None,
+    "filter": None,
+}
+
+
+@pytest.fixture(scope="module")
+def stac_api():
+    with MockStacServer(latency=0, items_per_collection=30) as server:
+        yield server
+    close_stac_clients()
+
+
+def stream(engine, catalog_url, monkeypatch):
+    monkeypatch.setattr(items_search, "ITEM_SEARCH_ENGINE", engine)
+
+    async def main():
+        try:
+            return [
+                page async for page in items_search._item_pages(catalog_url, PARAMS)
+            ]
+        finally:
+            await close_async_search()
+
+    return asyncio.run(main())
+
+
+def test_streaming_engines_agree(stac_api, monkeypatch):
+    pystac_pages = stream("pystac", stac_api.url, monkeypatch)
+    async_pages = stream("async", stac_api.url, monkeypatch)
+    items = [item["id"] for page in pystac_pages for item in page]
+    assert [item["id"] for page in async_pages for item in page] == items
+    assert len(items) == PARAMS["max_items"]
+
+
+def test_async_streaming_stops_paging_at_max_items(stac_api, monkeypatch):
+    requests = stac_api.requests
+    pages = stream("async", stac_api.url, monkeypatch)
+    assert sum(map(len, pages)) == PARAMS["max_items"]
+    # one page of max_items, and at most the prefetched next page
+    assert stac_api.requests - requests <= 2
+
+
+def test_fan_out_respects_the_concurrency_limit():
+    collections = [f"collection-{i}" for i in range(8)]
+    search = AsyncStacSearch(concurrency=2, page_size=5)
+
+    async def main():
+        try:
+            return await search.search(
+                f"{server.url}/search", collections, max_items=40
+            )
+        finally:
+            await search.close()
+
+    with MockStacServer(latency=0.02, items_per_collection=30) as server:
+        items = asyncio.run(main())
+    assert len(items) == 40
+    assert {item["collection"] for item in items} == set(collections)
+    # prefetched pages count against the limit too
+    assert server.max_in_flight == 2
@@ -0,0 +1,248 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from stac_search.agents.items_search import FilterExpr
+from stac_search.cache import (
+    MISSING,
+    CacheBackend,
+    CacheStats,
+    MemoryBackend,
+    SemanticCache,
+    SQLiteBackend,
+    _cache_url,
+    async_cached,
+    decode_value,
+)
+
+
+def make_counted(cache, delay=0.05, fail=False):
+    """A cached coroutine function that counts its calls"""
+    calls = []
+
+    @async_cached(cache)
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(delay)
+        if fail:
+            raise ValueError(f"failed {key}")
+        return f"value {key}"
+
+    return fetch, calls
+
+
+def test_concurrent_same_key_callers_share_one_call():
+    cache = MemoryBackend("test", maxsize=10, ttl=60)
+    fetch, calls = make_counted(cache)
+
+    async def run():
+        return await asyncio.gather(*(fetch("a") for _ in range(5)))
+
+    assert asyncio.run(run()) == ["value a"] * 5
+    assert calls == ["a"]
+    assert cache.stats.misses == 1
+    assert cache.stats.coalesced == 4
+
+
+def test_cached_value_is_a_hit():
+    cache = MemoryBackend("test", maxsize=10, ttl=60)
+    fetch, calls = make_counted(cache, delay=0)
+
+    async def run():
+        return await fetch("a"), await fetch("a")
+
+    assert asyncio.run(run()) == ("value a", "value a")
+    assert calls == ["a"]
+    assert cache.stats.hits == 1
+
+
+def test_different_keys_run_in_parallel():
+    cache = MemoryBackend("test", maxsize=10, ttl=60)
+    fetch, calls = make_counted(cache, delay=0.2)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await asyncio.gather(*(fetch(key) for key in "abcd"))
+        return results, loop.time() - start
+
+    results, elapsed = asyncio.run(run())
+    assert results == [f"value {key}" for key in "abcd"]
+    assert sorted(calls) == list("abcd")
+    # sequential calls would take 0.8s
+    assert elapsed < 0.5
+
+
+def test_failures_are_not_cached():
+    cache = MemoryBackend("test", maxsize=10, ttl=60)
+    fetch, calls = make_counted(cache, delay=0, fail=True)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                await fetch("a")
+
+    asyncio.run(run())
+    assert calls == ["a", "a"]
+    assert len(cache.cache) == 0
+
+
+def test_concurrent_waiters_all_see_the_failure():
+    cache = MemoryBackend("test", maxsize=10, ttl=60)
+    fetch, calls = make_counted(cache, fail=True)
+
+    async def run():
+        return await asyncio.gather(
+            *(fetch("a") for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert calls == ["a"]
+
+
+def test_cancelling_the_first_caller_keeps_the_others_waiting():
+    cache = MemoryBackend("test", maxsize=10, ttl=60)
+    fetch, calls = make_counted(cache, delay=0.1)
+
+    async def run():
+        first = asyncio.ensure_future(fetch("a"))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(fetch("a"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, await fetch("a")
+
+    assert asyncio.run(run()) == ("value a", "value a")
+    # the computation finished for the second caller and was stored
+    assert calls == ["a"]
+    assert cache.stats.hits == 1
+
+
+def test_custom_key():
+    cache = MemoryBackend("test", maxsize=10, ttl=60)
+    calls = []
+
+    @async_cached(cache, key=lambda location, geometry: location)
+    async def prepare(location, geometry):
+        calls.append(location)
+        return geometry
+
+    async def run():
+        return await prepare("Paris", {"a": 1}), await prepare("Paris", {"b": 2})
+
+    assert asyncio.run(run()) == ({"a": 1}, {"a": 1})
+    assert calls == ["Paris"]
+
+
+def test_cache_url_defaults_to_the_backend(monkeypatch):
+    monkeypatch.delenv("CACHE_URL", raising=False)
+    assert _cache_url("sqlite").endswith("cache.sqlite")
+    assert _cache_url("redis") == "redis://localhost:6379/0"
+    assert _cache_url("memory") is None
+    monkeypatch.setenv("CACHE_URL", "redis://cache:6379/1")
+    assert _cache_url("redis") == "redis://cache:6379/1"
+
+
+@pytest.fixture(params=["serialized_memory", "sqlite"])
+def shared_backend(request, tmp_path):
+    """The serializing stand-in and a real shared backend"""
+    if request.param == "sqlite":
+        return SQLiteBackend("test", maxsize=10, ttl=60, path=str(tmp_path / "c.db"))
+    return MemoryBackend("test", maxsize=10, ttl=60, serialize=True)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        None,
+        "text",
+        {"nested": [1, 2.5, {"a": None}]},
+        CacheStats(hits=1, misses=2),
+        [
+            FilterExpr.model_validate(
+                {"op": "lte", "args": [{"property": "eo:cloud_cover"}, 10]}
+            )
+        ],
+    ],
+)
+def test_shared_backends_round_trip(shared_backend, value):
+    async def run():
+        await shared_backend.set(("key",), value)
+        return await shared_backend.get(("key",))
+
+    assert asyncio.run(run()) == value
+
+
+def test_shared_backends_round_trip_arrays(shared_backend):
+    array = np.arange(6, dtype=np.float32).reshape(2, 3)
+
+    async def run():
+        await shared_backend.set("key", array)
+        return await shared_backend.get("key")
+
+    cached = asyncio.run(run())
+    assert cached.dtype == np.float32
+    np.testing.assert_array_equal(cached, array)
+
+
+def test_shared_backends_miss_and_clear(shared_backend):
+    async def run():
+        missing = await shared_backend.get("key")
+        await shared_backend.set("key", None)
+        stored = await shared_backend.get("key")
+        await shared_backend.clear()
+        return missing, stored, await shared_backend.get("key")
+
+    missing, stored, cleared = asyncio.run(run())
+    assert missing is MISSING
+    assert stored is None
+    assert cleared is MISSING
+
+
+def test_serialized_backend_rejects_unknown_values():
+    cache = MemoryBackend("test", maxsize=10, ttl=60, serialize=True)
+    with pytest.raises(TypeError):
+        asyncio.run(cache.set("key", object()))
+
+
+def test_decoding_refuses_classes_outside_the_package():
+    data = {"__dataclass__": "os:stat_result", "fields": {}}
+    with pytest.raises(ValueError):
+        decode_value(data)
+
+
+def test_async_cached_with_a_serialized_backend():
+    cache = MemoryBackend("test", maxsize=10, ttl=60, serialize=True)
+    calls = []
+
+    @async_cached(cache)
+    async def search(query):
+        calls.append(query)
+        return CacheStats(hits=len(query))
+
+    async def run():
+        return await search("a"), await search("a")
+
+    first, second = asyncio.run(run())
+    assert first == second == CacheStats(hits=1)
+    # the hit is a decoded copy, like with a shared backend
+    assert first is not second
+    assert calls == ["a"]
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend("test", ttl=60)
+
+
+def test_semantic_cache_size():
+    cache = SemanticCache("test", maxsize=2, enabled=True)
+    for i in range(3):
+        cache.store(np.eye(3)[i], "context", i)
+    assert len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,84 @@
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from stac_search import embedding_store
+from stac_search.embedding_store import EmbeddingStore, _tag, text_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock that ticks on every read, so recency never ties"""
+    ticks = itertools.count()
+    monkeypatch.setattr(
+        embedding_store, "time", SimpleNamespace(time=lambda: next(ticks))
+    )
+
+
+def vectors(*values):
+    return np.array([[value] * 3 for value in values], dtype=np.float32)
+
+
+def found(store, texts):
+    return [None if v is None else float(v[0]) for v in store.get_many(texts)]
+
+
+def test_get_and_put(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model")
+    assert store.get_many(["a"]) == [None]
+    store.put_many(["a", "b"], vectors(1, 2))
+    assert found(store, ["b", "c", "a"]) == [2, None, 1]
+    assert len(store) == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    store = EmbeddingStore(str(tmp_path), "model", max_entries=2)
+    store.put_many(["a", "b"], vectors(1, 2))
+    store.get_many(["a"])
+    store.put_many(["c"], vectors(3))
+    assert found(store, ["a", "b", "c"]) == [1, None, 3]
+    assert len(store) == 2
+    # only the last `max_entries` of a batch are kept
+    store.put_many(["d", "e", "f"], vectors(4, 5, 6))
+    assert found(store, ["d", "e", "f"]) == [None, 5, 6]
+
+
+def test_reused_slots_are_not_read(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model")
+    store.put_many(["a"], vectors(1))
+    (slot,) = store._db.execute("SELECT slot FROM entries").fetchone()
+    # another worker is rewriting the slot for another text
+    store._tags[slot] = 0
+    assert store.get_many(["a"]) == [None]
+    store._tags[slot] = _tag(text_key("b"))
+    assert store.get_many(["a"]) == [None]
+    store._tags[slot] = _tag(text_key("a"))
+    assert found(store, ["a"]) == [1]
+
+
+def test_reopening_a_persisted_store(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model", max_entries=4)
+    store.put_many(["a", "b"], vectors(1, 2))
+    store.close()
+
+    # the capacity of the store on disk wins
+    reopened = EmbeddingStore(str(tmp_path), "model", max_entries=8)
+    assert reopened.capacity == 4
+    assert reopened.dim == 3
+    assert found(reopened, ["a", "b"]) == [1, 2]
+    reopened.put_many(["c"], vectors(3))
+    assert found(reopened, ["a", "b", "c"]) == [1, 2, 3]
+    reopened.close()
+
+
+def test_models_and_dimensions_do_not_mix(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model")
+    store.put_many(["a"], vectors(1))
+    # each model has its own store
+    other = EmbeddingStore(str(tmp_path), "other/model")
+    assert other.get_many(["a"]) == [None]
+    with pytest.raises(ValueError, match="dimension"):
+        store.put_many(["b"], np.ones((1, 4), dtype=np.float32))
+    assert found(store, ["a", "b"]) == [1, None]
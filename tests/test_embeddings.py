@@ -0,0 +1,79 @@
+import asyncio
+
+import numpy as np
+
+from stac_search.embeddings import EmbeddingBatcher
+
+
+class FakeModel:
+    """Encodes "text-<n>" as [n, n], recording the batches"""
+
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+
+    def __call__(self, texts):
+        self.batches.append(texts)
+        if self.error:
+            raise self.error
+        return np.array([[float(t.split("-")[1])] * 2 for t in texts])
+
+
+def encode_all(batcher, texts):
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.encode(text) for text in texts)), timeout=5
+        )
+
+    return asyncio.run(main())
+
+
+def test_batch_flushes_at_max_size():
+    model = FakeModel()
+    # a window no test waits for
+    batcher = EmbeddingBatcher(model, window_ms=60_000, max_batch_size=3)
+    encode_all(batcher, ["text-1", "text-2", "text-3"])
+    assert model.batches == [["text-1", "text-2", "text-3"]]
+    assert batcher.stats.batch_sizes == {3: 1}
+
+
+def test_batch_flushes_when_the_window_closes():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(model, window_ms=20, max_batch_size=100)
+
+    async def main():
+        first = await asyncio.gather(batcher.encode("text-1"), batcher.encode("text-2"))
+        second = await batcher.encode("text-3")
+        return first, second
+
+    asyncio.run(main())
+    assert model.batches == [["text-1", "text-2"], ["text-3"]]
+    assert batcher.stats.queue_wait_seconds_max >= 0.02
+
+
+def test_callers_get_their_own_rows():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(model, window_ms=10, max_batch_size=4)
+    texts = [f"text-{n}" for n in [5, 1, 5, 3, 8, 2, 9, 1, 7, 4]]
+    vectors = encode_all(batcher, texts)
+    assert [v.tolist() for v in vectors] == [
+        [float(t.split("-")[1])] * 2 for t in texts
+    ]
+    assert [len(batch) for batch in model.batches] == [3, 4, 2]
+    # duplicates in a batch are encoded once
+    assert batcher.stats.texts == len(texts)
+
+
+def test_encode_errors_reach_every_caller():
+    model = FakeModel(error=RuntimeError("model failed"))
+    batcher = EmbeddingBatcher(model, window_ms=10, max_batch_size=100)
+
+    async def main():
+        return await asyncio.gather(
+            *(batcher.encode(f"text-{n}") for n in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert len(model.batches) == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert all(str(r) == "model failed" for r in results)
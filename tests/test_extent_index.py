@@ -0,0 +1,88 @@
+import pytest
+
+from stac_search.extent_index import ExtentIndex, parse_datetime_range
+
+
+def point(x, y):
+    return {"type": "Point", "coordinates": [x, y]}
+
+
+@pytest.fixture(scope="module")
+def index():
+    return ExtentIndex(
+        {
+            "europe": {
+                "bbox": [-10, 35, 30, 70],
+                "interval": ["2015-06-23T00:00:00Z", None],
+            },
+            "pacific": {
+                "bbox": [170, -20, -170, 0],
+                "interval": ["2000-01-01", "2010-12-31"],
+            },
+            "alps-3d": {
+                "bbox": [5, 44, 0, 16, 48, 4800],
+                "interval": [None, "2020-01-01"],
+            },
+            "anywhere": {"bbox": None, "interval": None},
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "geometry, expected",
+    [
+        (point(10, 50), {"europe", "anywhere"}),
+        # both sides of the antimeridian
+        (point(175, -10), {"pacific", "anywhere"}),
+        (point(-175, -10), {"pacific", "anywhere"}),
+        (point(0, -10), {"anywhere"}),
+        # the maxx and maxy of a 3D bbox, not its elevations
+        (point(15, 47), {"europe", "alps-3d", "anywhere"}),
+        (point(3, 47), {"europe", "anywhere"}),
+    ],
+)
+def test_covering_geometry(index, geometry, expected):
+    assert set(index.covering(geometry=geometry)) == expected
+
+
+@pytest.mark.parametrize(
+    "datetime, expected",
+    [
+        # open ends match everything on their side
+        ("2024-01-01/..", {"europe", "anywhere"}),
+        ("../1999-12-31", {"alps-3d", "anywhere"}),
+        # a date-only end includes the whole day
+        ("2010-12-31", {"pacific", "alps-3d", "anywhere"}),
+        ("2011-01-01", {"alps-3d", "anywhere"}),
+        ("2020-01-01T12:00:00Z/2020-02-01", {"europe", "alps-3d", "anywhere"}),
+        ("2015-06-22T23:59:59Z", {"alps-3d", "anywhere"}),
+    ],
+)
+def test_covering_datetime(index, datetime, expected):
+    assert set(index.covering(datetime=datetime)) == expected
+
+
+def test_parse_datetime_range():
+    start, end = parse_datetime_range("2020-01-01/2020-01-01")
+    assert end - start == pytest.approx(24 * 60 * 60)
+    assert parse_datetime_range("2020-01-01/..")[1] is None
+    assert parse_datetime_range(None) == (None, None)
+
+
+def test_prune_keeps_unknown_collections(index):
+    assert index.prune(
+        ["pacific", "unknown", "europe"], point(10, 50), "2024-01-01"
+    ) == ["unknown", "europe"]
+
+
+def test_prune_without_geometry_or_datetime(index):
+    collection_ids = ["pacific", "europe", "unknown"]
+    assert index.prune(collection_ids) is collection_ids
+
+
+def test_save_and_load(index, tmp_path):
+    path = str(tmp_path / "extents.json")
+    index.save(path)
+    loaded = ExtentIndex.load(path)
+    assert loaded.extents == index.extents
+    assert loaded.covering(point(-175, -10)) == index.covering(point(-175, -10))
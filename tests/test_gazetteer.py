@@ -0,0 +1,53 @@
+import pytest
+
+from stac_search.gazetteer import GAZETTEER_PATH, Gazetteer
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return Gazetteer.load(GAZETTEER_PATH)
+
+
+@pytest.mark.parametrize(
+    "location, label",
+    [
+        ("Kenya", "Kenya"),
+        ("the Netherlands", "The Netherlands"),
+        ("UK", "United Kingdom"),
+        ("Georgia, United States", "Georgia, United States"),
+        ("Georgia country", "Georgia"),
+        ("New York state", "New York"),
+        ("New York City", "New York City"),
+        ("NYC", "New York City"),
+        ("Washington DC", "Washington, District of Columbia"),
+        # ambiguous names are left to Geodini
+        ("Georgia", None),
+        ("New York", None),
+        ("Washington", None),
+    ],
+)
+def test_lookup(gazetteer, location, label):
+    place = gazetteer.lookup(location)
+    assert (place.label if place else None) == label
+
+
+@pytest.mark.parametrize(
+    "query, label",
+    [
+        ("imagery over Kenya", "Kenya"),
+        ("images of Paris, France", "Paris"),
+        ("imagery over New York City", "New York City"),
+        ("images of Georgia", None),
+        ("imagery over New York", None),
+        ("imagery of Lake Tahoe in California", None),
+    ],
+)
+def test_find(gazetteer, query, label):
+    place = gazetteer.find(query)
+    assert (place.label if place else None) == label
+
+
+def test_lookup_agrees_with_find_on_ambiguous_names(gazetteer):
+    for name in ["Georgia", "New York", "Washington"]:
+        assert gazetteer.find(f"imagery over {name}") is None
+        assert gazetteer.lookup(name) is None
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_geodini import MockGeodiniServer
+from stac_search import geocoding
+from stac_search.agents.items_search import get_polygon_from_geodini
+from stac_search.geocoding import CircuitOpenError, GeocodingClient, GeocodingError
+
+
+@pytest.fixture
+def geodini():
+    with MockGeodiniServer(latency=0.01, unknown=["Atlantis"]) as server:
+        yield server
+
+
+def run(client, coroutine):
+    """Run a coroutine, then close the client's session on the same loop"""
+
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await client.close()
+
+    return asyncio.run(main())
+
+
+def client_for(server, **kwargs):
+    options = {"retries": 0, "backoff": 0, "breaker_reset": 60, "negative_ttl": 60}
+    return GeocodingClient(server.url, **{**options, **kwargs})
+
+
+def test_search(geodini):
+    client = client_for(geodini)
+
+    async def main():
+        return await client.search("Paris"), await client.search("Atlantis")
+
+    polygon, missing = run(client, main())
+    assert polygon == MockGeodiniServer.polygon("Paris")
+    assert missing is None
+
+
+def test_failed_attempts_are_retried(geodini):
+    geodini.fail("error", times=2)
+    client = client_for(geodini, retries=2)
+    assert run(client, client.search("Paris")) == MockGeodiniServer.polygon("Paris")
+    assert geodini.requests == 3
+    assert client.stats.retries == 2
+    assert client.breaker.state == "closed"
+
+
+def test_attempts_time_out(geodini):
+    geodini.fail("slow")
+    client = client_for(geodini, retries=1, timeout=0.05)
+    with pytest.raises(GeocodingError):
+        run(client, client.search("Paris"))
+    assert client.stats.requests == 2
+    assert client.stats.failures == 1
+
+
+def test_failed_lookups_are_remembered(geodini):
+    geodini.fail("error")
+    client = client_for(geodini)
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(GeocodingError):
+                await client.search("Paris")
+
+    run(client, main())
+    assert geodini.requests == 1
+    assert client.stats.negative_hits == 1
+
+
+def test_breaker_opens_after_consecutive_failures(geodini):
+    geodini.fail("error")
+    client = client_for(geodini, breaker_threshold=3)
+
+    async def main():
+        for location in ["Paris", "Rome", "Oslo"]:
+            with pytest.raises(GeocodingError):
+                await client.search(location)
+        with pytest.raises(CircuitOpenError):
+            await client.search("Lima")
+
+    run(client, main())
+    assert geodini.requests == 3
+    assert client.breaker.state == "open"
+    assert client.stats.rejected == 1
+
+
+def test_breaker_recovers_through_a_half_open_trial(geodini):
+    geodini.fail("error", times=2)
+    client = client_for(geodini, breaker_threshold=1, breaker_reset=0.1)
+
+    async def main():
+        with pytest.raises(GeocodingError):
+            await client.search("Paris")
+        with pytest.raises(CircuitOpenError):
+            await client.search("Rome")
+        # the failed trial opens the circuit again
+        await asyncio.sleep(0.1)
+        with pytest.raises(GeocodingError):
+            await client.search("Oslo")
+        assert client.breaker.state == "open"
+        await asyncio.sleep(0.1)
+        return await client.search("Lima")
+
+    assert run(client, main()) == MockGeodiniServer.polygon("Lima")
+    assert client.breaker.state == "closed"
+
+
+def test_malformed_bodies_fail_without_sticking_the_breaker(geodini):
+    geodini.fail("malformed", times=2)
+    client = client_for(geodini, breaker_threshold=1, breaker_reset=0.1)
+
+    async def main():
+        with pytest.raises(GeocodingError):
+            await client.search("Paris")
+        await asyncio.sleep(0.1)
+        # the half-open trial gets a malformed body too
+        with pytest.raises(GeocodingError):
+            await client.search("Rome")
+        await asyncio.sleep(0.1)
+        return await client.search("Oslo")
+
+    assert run(client, main()) == MockGeodiniServer.polygon("Oslo")
+    assert client.breaker.state == "closed"
+
+
+def test_rejected_requests_are_not_retried_or_counted(geodini):
+    geodini.fail("bad-request")
+    client = client_for(geodini, retries=2, breaker_threshold=1)
+    with pytest.raises(GeocodingError):
+        run(client, client.search("Paris"))
+    assert geodini.requests == 1
+    assert client.stats.retries == 0
+    assert client.breaker.state == "closed"
+
+
+def test_malformed_body_is_not_found(geodini, monkeypatch):
+    geodini.fail("malformed")
+    client = client_for(geodini)
+    monkeypatch.setattr(geocoding, "_geocoding_client", client)
+    assert run(client, get_polygon_from_geodini("Paris")) is None
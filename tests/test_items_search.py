@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from stac_search.agents import items_search
+from stac_search.agents.collections_search import CollectionWithExplanation
+from stac_search.agents.items_search import (
+    CollectionQuery,
+    CollectionSearchResult,
+    Context,
+    ItemSearchResult,
+    item_search_batch,
+)
+
+
+@pytest.fixture
+def batched_collections(monkeypatch):
+    """Fake framing agent and collection search, recording the batches"""
+    batches = []
+
+    async def frame(query):
+        if query == "broken":
+            raise ValueError("framing failed")
+        return CollectionQuery(query=f"framed {query}", is_specific="any" not in query)
+
+    async def search_batch(queries, catalog_url=None, concurrency=8):
+        batches.append((catalog_url, queries))
+        return [
+            [CollectionWithExplanation(collection_id=query, explanation="")]
+            for query in queries
+        ]
+
+    async def item_search(ctx, collections=None):
+        return ItemSearchResult(explanation=ctx.query, items=[await collections()])
+
+    monkeypatch.setattr(items_search, "_run_collection_query_framing_agent", frame)
+    monkeypatch.setattr(items_search, "collection_search_batch", search_batch)
+    monkeypatch.setattr(items_search, "item_search", item_search)
+    return batches
+
+
+def test_item_search_batch_batches_the_collection_stage(batched_collections):
+    contexts = [
+        Context("sentinel-2 over Paris"),
+        Context("any imagery of Rome"),
+        Context("landsat over Lima"),
+        Context("sentinel-2 over Paris"),
+        Context("landsat over Lima", catalog_url="https://example.com/stac"),
+    ]
+    results = asyncio.run(item_search_batch(contexts))
+
+    assert dict(batched_collections) == {
+        items_search.STAC_CATALOG_URL: [
+            "framed sentinel-2 over Paris",
+            "framed landsat over Lima",
+        ],
+        "https://example.com/stac": ["framed landsat over Lima"],
+    }
+    assert [r.explanation for r in results] == [ctx.query for ctx in contexts]
+    (collections,) = results[0].items
+    assert collections == CollectionSearchResult(
+        [
+            CollectionWithExplanation(
+                collection_id="framed sentinel-2 over Paris", explanation=""
+            )
+        ]
+    )
+    # non specific queries search the default collections
+    assert results[1].items == [None]
+    assert results[3] is results[0]
+
+
+def test_item_search_batch_isolates_failures(batched_collections):
+    results = asyncio.run(item_search_batch([Context("broken"), Context("landsat")]))
+    assert isinstance(results[0], ValueError)
+    assert isinstance(results[1], ItemSearchResult)
+    assert batched_collections == [(items_search.STAC_CATALOG_URL, ["framed landsat"])]
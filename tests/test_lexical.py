@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pytest
+
+from stac_search.agents import collections_search
+from stac_search.agents.collections_search import (
+    CollectionWithExplanation,
+    RankedCollections,
+    collection_search,
+)
+from stac_search.lexical import BM25Index, reciprocal_rank_fusion
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures")
+
+
+@pytest.fixture(scope="module")
+def documents():
+    with open(os.path.join(FIXTURES, "collections.json")) as f:
+        collections = json.load(f)
+    return [
+        {
+            "collection_id": c["id"],
+            "title": c.get("title", ""),
+            "description": c.get("description", ""),
+            "keywords": c.get("keywords", []),
+        }
+        for c in collections
+    ]
+
+
+@pytest.fixture(scope="module")
+def index(documents):
+    return BM25Index(documents)
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("NAIP imagery over California", ["naip"]),
+        ("HLS over Kenya", ["hls2-l30", "hls2-s30"]),
+        ("Sentinel-1-GRD scenes", ["sentinel-1-grd"]),
+        ("cop-dem-glo-30 tiles", ["cop-dem-glo-30"]),
+        # acronyms only match in upper case
+        ("naip imagery", []),
+        # and never when they are plain words of the catalog
+        ("polar ice cap imagery", []),
+        ("POLAR ICE CAP IMAGERY", []),
+        ("land cover v2", []),
+        ("a gap in the coverage", []),
+    ],
+)
+def test_exact_matches(index, query, expected):
+    assert index.exact_matches(query) == expected
+
+
+def test_reciprocal_rank_fusion_weights():
+    rankings = [["a", "b"], ["b", "a"]]
+    assert reciprocal_rank_fusion(rankings, weights=[2.0, 1.0]) == ["a", "b"]
+    assert reciprocal_rank_fusion(rankings, weights=[1.0, 2.0]) == ["b", "a"]
+
+
+class FakeCollection:
+    """A Chroma collection that always returns the same candidates"""
+
+    def __init__(self, documents, ranked_ids):
+        self.by_id = {d["collection_id"]: d for d in documents}
+        self.ranked_ids = ranked_ids
+
+    def query(self, query_embeddings, n_results):
+        ids = self.ranked_ids[:n_results]
+        return {
+            "metadatas": [[self.by_id[i] for i in ids]],
+            "distances": [[0.1 * rank for rank in range(len(ids))]],
+        }
+
+    def get(self, where, include):
+        ids = where["collection_id"]["$in"]
+        return {
+            "metadatas": [self.by_id[i] for i in ids],
+            "embeddings": [np.zeros(3) for _ in ids],
+        }
+
+
+@pytest.fixture
+def fake_catalog(monkeypatch, documents, index):
+    ranked_ids = ["modis-13Q1-061", "sentinel-2-l2a", "landsat-c2-l2", "usda-cdl"]
+    collection = FakeCollection(documents, ranked_ids)
+
+    async def open_catalog(catalog_url, model_name, data_path):
+        return None, collection, index
+
+    async def generate_query_embedding(catalog_manager, query):
+        return np.zeros((1, 3))
+
+    prompts = []
+
+    async def run_rerank_agent(user_prompt):
+        prompts.append(user_prompt)
+        return RankedCollections(
+            results=[
+                CollectionWithExplanation(collection_id="usda-cdl", explanation="Crops")
+            ]
+        )
+
+    monkeypatch.setattr(collections_search, "_open_catalog", open_catalog)
+    monkeypatch.setattr(
+        collections_search, "_generate_query_embedding", generate_query_embedding
+    )
+    monkeypatch.setattr(collections_search, "_run_rerank_agent", run_rerank_agent)
+    monkeypatch.setattr(collections_search.rerank_semantic_cache, "enabled", False)
+    return prompts
+
+
+def test_exact_matches_still_go_through_llm_rerank(fake_catalog):
+    results = asyncio.run(
+        collection_search("NDVI time series for farms in Iowa", rerank="llm")
+    )
+    assert [r.collection_id for r in results] == ["usda-cdl"]
+    assert len(fake_catalog) == 1
+    # the other candidates are still retrieved next to the exact match
+    assert "Collection ID: modis-13Q1-061" in fake_catalog[0]
+    assert "Collection ID: sentinel-2-l2a" in fake_catalog[0]
+
+
+def test_exact_matches_are_boosted_in_the_fusion(fake_catalog):
+    results = asyncio.run(collection_search("NAIP crops", rerank="fusion", top_k=10))
+    ids = [r.collection_id for r in results]
+    assert "naip" in ids
+    assert len(ids) > 1
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("naip", "naip"),
+        ("NAIP", "naip"),
+        ("sentinel-1-grd", "sentinel-1-grd"),
+        ("Sentinel-1-GRD", "sentinel-1-grd"),
+        # ambiguous acronyms and longer queries are searched
+        ("HLS", None),
+        ("NAIP crops", None),
+        ("cap", None),
+    ],
+)
+def test_named_collection(index, query, expected):
+    assert index.named_collection(query) == expected
+
+
+def test_named_collections_skip_retrieval_and_rerank(fake_catalog, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("named collections are not searched")
+
+    monkeypatch.setattr(collections_search, "_generate_query_embedding", fail)
+    monkeypatch.setattr(collections_search, "_vector_search", fail)
+    monkeypatch.setattr(collections_search, "fusion_rerank", fail)
+    for query, collection_id in [
+        ("naip", "naip"),
+        ("sentinel-1-grd", "sentinel-1-grd"),
+    ]:
+        results = asyncio.run(collection_search(query, rerank="fusion"))
+        assert [r.collection_id for r in results] == [collection_id]
+
+
+def test_named_collections_still_go_through_llm_rerank(fake_catalog):
+    results = asyncio.run(collection_search("naip", rerank="llm"))
+    assert [r.collection_id for r in results] == ["usda-cdl"]
+    assert len(fake_catalog) == 1
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+from stac_search.pipeline import Pipeline
+
+
+def stage(events, name, delay=0.0, result=None, error=None):
+    """A stage that records when it starts and ends, and the inputs it got"""
+
+    async def run(*inputs):
+        events.append(("start", name, inputs))
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            events.append(("cancelled", name, inputs))
+            raise
+        if error:
+            raise error
+        events.append(("end", name, inputs))
+        return result if result is not None else name
+
+    return run
+
+
+def test_stages_run_after_their_dependencies():
+    events = []
+    pipeline = Pipeline()
+    pipeline.stage("a", stage(events, "a", 0.01))
+    pipeline.stage("b", stage(events, "b"), "a")
+    pipeline.stage("c", stage(events, "c"), "b", "a")
+    assert asyncio.run(pipeline.run("c")) == ["c"]
+    assert events == [
+        ("start", "a", ()),
+        ("end", "a", ()),
+        ("start", "b", ("a",)),
+        ("end", "b", ("a",)),
+        ("start", "c", ("b", "a")),
+        ("end", "c", ("b", "a")),
+    ]
+
+
+def test_independent_stages_run_in_parallel():
+    events = []
+    pipeline = Pipeline()
+    pipeline.stage("a", stage(events, "a", 0.1))
+    pipeline.stage("b", stage(events, "b", 0.1))
+    pipeline.stage("c", stage(events, "c"), "a", "b")
+    start = time.perf_counter()
+    asyncio.run(pipeline.run("c"))
+    assert time.perf_counter() - start < 0.18
+    a, b = pipeline.timings["a"], pipeline.timings["b"]
+    assert b.start < a.end and a.start < b.end
+
+
+def test_finished_stages_are_reused():
+    events = []
+    pipeline = Pipeline()
+    pipeline.stage("a", stage(events, "a"))
+
+    async def main():
+        await pipeline.run("a")
+        pipeline.stage("b", stage(events, "b"), "a")
+        return await pipeline.run("a", "b")
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert [e[:2] for e in events].count(("start", "a")) == 1
+
+
+def test_a_failed_stage_cancels_its_siblings():
+    events = []
+    pipeline = Pipeline()
+    pipeline.stage("slow", stage(events, "slow", 5))
+    pipeline.stage("broken", stage(events, "broken", error=ValueError("broken")))
+    pipeline.stage("after", stage(events, "after"), "slow")
+
+    async def main():
+        with pytest.raises(ValueError, match="broken"):
+            await asyncio.wait_for(pipeline.run("after", "broken"), timeout=1)
+        # let the cancellations land
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert ("cancelled", "slow", ()) in events
+    assert not any(name == "after" for _, name, _ in events)
+
+
+def test_unknown_dependencies_and_cycles_are_rejected():
+    pipeline = Pipeline()
+    with pytest.raises(ValueError, match="unknown stage 'a'"):
+        pipeline.stage("b", stage([], "b"), "a")
+    pipeline.stage("a", stage([], "a"))
+    pipeline.stage("b", stage([], "b"), "a")
+    # redefining a stage is the only way to close a cycle
+    with pytest.raises(ValueError, match="already defined"):
+        pipeline.stage("a", stage([], "a"), "b")
+
+
+def test_timings_and_critical_path():
+    events = []
+    pipeline = Pipeline()
+    pipeline.stage("fast", stage(events, "fast", 0.01))
+    pipeline.stage("slow", stage(events, "slow", 0.05))
+    pipeline.stage("mid", stage(events, "mid", 0.01), "fast")
+    pipeline.stage("end", stage(events, "end"), "mid", "slow")
+    asyncio.run(pipeline.run("end"))
+
+    assert [t.name for t in pipeline.ordered_timings()][-1] == "end"
+    assert set(pipeline.timings) == {"fast", "slow", "mid", "end"}
+    assert pipeline.timings["slow"].duration >= 0.05
+    assert pipeline.timings["end"].start >= pipeline.timings["slow"].end
+    assert [t.name for t in pipeline.critical_path("end")] == ["slow", "end"]
+    assert [t.name for t in pipeline.critical_path("mid")] == ["fast", "mid"]
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from stac_search.agents import items_search
+from stac_search.agents.items_search import TemporalRangeResult
+from stac_search.query_parser import parse_cloud_filter, parse_temporal_range
+
+CORPUS = os.path.join(
+    os.path.dirname(__file__), "..", "benchmarks", "fixtures", "query_fast_path.json"
+)
+
+
+def load_corpus():
+    with open(CORPUS) as f:
+        return json.load(f)
+
+
+CORPUS_DATA = load_corpus()
+TODAY = date.fromisoformat(CORPUS_DATA["today"])
+QUERIES = [entry["query"] for entry in CORPUS_DATA["queries"]]
+
+
+@pytest.mark.parametrize("entry", CORPUS_DATA["queries"], ids=QUERIES)
+def test_corpus_has_no_wrong_answers(entry):
+    """The rules may leave a query to the agents, but never parse it wrongly"""
+    for (parsed, value), label in [
+        (parse_temporal_range(entry["query"], TODAY), entry["datetime"]),
+        (parse_cloud_filter(entry["query"]), entry["filter"]),
+    ]:
+        if parsed and value is not None:
+            assert value == label
+
+
+def test_corpus_skip_rate():
+    parsed = [
+        parse_temporal_range(query, TODAY)[1] is not None
+        or parse_cloud_filter(query)[1] is not None
+        for query in QUERIES
+    ]
+    assert sum(parsed) >= len(QUERIES) / 2
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "landsat 8 over 2000 km",
+        "DEM of mountains above 2000 m",
+        "sentinel-2 tiles of more than 2000 square km",
+        "esa-worldcover-2021 over Kenya",
+    ],
+)
+def test_quantities_are_not_years(query):
+    assert parse_temporal_range(query, TODAY)[1] is None
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "images from 12/2020",
+        "imagery on 05/12/2021",
+        "imagery in 2023-06",
+        "images from 03-2021",
+        "imagery from 2021.06",
+        "imagery from 5 Jan 2021",
+    ],
+)
+def test_numeric_dates_are_left_to_the_agent(query):
+    assert parse_temporal_range(query, TODAY)[1] is None
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["imagery over 30 cloudy days", "between 10 and 20 cloudy days in Kerala"],
+)
+def test_counts_are_not_cloud_cover(query):
+    assert parse_cloud_filter(query)[1] is None
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("imagery in 2023", "2023-01-01/2023-12-31"),
+        ("imagery of Paris in 2000", "2000-01-01/2000-12-31"),
+        ("from 2019 to 2021", "2019-01-01/2021-12-31"),
+        ("imagery from 2019-2021", "2019-01-01/2021-12-31"),
+        ("landsat 8 in 2021", "2021-01-01/2021-12-31"),
+    ],
+)
+def test_years(query, expected):
+    assert parse_temporal_range(query, TODAY) == (True, expected)
+
+
+@pytest.mark.parametrize(
+    "query, op, value",
+    [
+        ("less than 10% cloudy", "lte", 10),
+        ("less than 20 percent clouds", "lte", 20),
+        ("over 30% cloud cover", "gte", 30),
+    ],
+)
+def test_cloud_cover(query, op, value):
+    parsed, cql2_filter = parse_cloud_filter(query)
+    assert parsed
+    assert cql2_filter == {"op": op, "args": [{"property": "eo:cloud_cover"}, value]}
+
+
+def context(query):
+    return SimpleNamespace(deps=SimpleNamespace(query=query))
+
+
+def test_temporal_tool_falls_back_when_the_rules_find_nothing(monkeypatch):
+    calls = []
+
+    async def run_agent(query):
+        calls.append(query)
+        return TemporalRangeResult(datetime="2020-03-01/2020-05-31")
+
+    monkeypatch.setattr(items_search, "_run_temporal_range_agent", run_agent)
+    query = "imagery of Wuhan at the start of the pandemic"
+    result = asyncio.run(items_search.set_temporal_range(context(query)))
+    assert result.datetime == "2020-03-01/2020-05-31"
+    assert calls == [query]
+
+
+def test_temporal_tool_skips_the_agent_for_parsed_dates(monkeypatch):
+    async def run_agent(query):
+        raise AssertionError("the agent should not run")
+
+    monkeypatch.setattr(items_search, "_run_temporal_range_agent", run_agent)
+    result = asyncio.run(items_search.set_temporal_range(context("imagery in 2023")))
+    assert result.datetime == "2023-01-01/2023-12-31"
+
+
+def test_filter_tool_falls_back_when_the_rules_find_nothing(monkeypatch):
+    calls = []
+
+    async def run_agent(query):
+        calls.append(query)
+        return None
+
+    monkeypatch.setattr(items_search, "_run_cql2_filter_agent", run_agent)
+    query = "crystal clear images of Lisbon"
+    assert asyncio.run(items_search.construct_cql2_filter(context(query))) is None
+    assert calls == [query]